@@ -98,7 +98,8 @@ then
 
 	eval "$( python -m dryads-research.experiments.utilities.pipeline_setup \
 		$OUTDIR $time_max --merge_max=$merge_max \
-		--task_size=2.67 --merge_size=17 --samp_exp=0.43 )"
+		--task_size=2.67 --merge_size=17 --samp_exp=0.43 \
+		--classif=$classif --cost_dir=$DATADIR/dryads-research/AML_scRNA_analysis )"
 fi
 
 # if we are only enumerating, quit before classification jobs are launched
@@ -123,5 +124,8 @@ dvc run -d setup/muts-list.p -d $RUNDIR/fit_analysis.py -O out-conf.p.gz \
 	--config search='"$search_params"' mut_levels='"$mut_lvls"' \
 	classif='"$classif"' time_max='"$run_time"' merge_max='"$merge_time"
 
+# final cleanup duties
+rm -f $OUTDIR/setup/cohort-expr.npy $OUTDIR/setup/cohort-expr__labels.p \
+	$OUTDIR/setup/cohort-muts.p
 cp output.dvc $FINALDIR/output__${param_tag}.dvc
 
@@ -1,7 +1,7 @@
 
 from .utils import load_SMMART_expr
-from ..utilities.handle_input import safe_load
-from ..utilities.pipeline_setup import get_task_count
+from ..utilities.handle_input import load_setup_cohort
+from ..utilities.pipeline_setup import get_task_assignment
 from ..utilities.classifiers import *
 
 import os
@@ -28,7 +28,6 @@ def main():
 
     args = parser.parse_args()
     setup_dir = os.path.join(args.use_dir, 'setup')
-    task_count = get_task_count(args.use_dir)
 
     # load list of mutations to test and the expression gene features to
     # use during classifier training
@@ -37,8 +36,7 @@ def main():
     with open(os.path.join(setup_dir, "feat-list.p"), 'rb') as fl:
         feat_list = pickle.load(fl)
 
-    coh_path = os.path.join(setup_dir, "cohort-data.p.gz")
-    cdata = safe_load(coh_path, retry_pause=41)
+    cdata = load_setup_cohort(setup_dir, retry_pause=41)
     sc_expr = load_SMMART_expr()[feat_list]
     clf = eval(args.classif)
     mut_clf = clf()
@@ -59,12 +57,13 @@ def main():
     out_coef = {mtype: dict() for mtype in mtype_list}
     out_smmart = {mtype: dict() for mtype in mtype_list}
 
+    task_dict = get_task_assignment(args.use_dir, mtype_list)
     random.seed(10301)
     random.shuffle(mtype_list)
 
     # for each subtype, check if it has been assigned to this task
-    for i, mtype in enumerate(mtype_list):
-        if (i % task_count) == args.task_id:
+    for mtype in mtype_list:
+        if task_dict[mtype] == args.task_id:
             print("Testing {} ...".format(mtype))
 
             use_gene = tuple(mtype.label_iter())[0]
@@ -1,5 +1,5 @@
 
-from ..utilities.pipeline_setup import get_task_count
+from ..utilities.pipeline_setup import get_task_count, get_task_assignment
 from ..utilities.misc import compare_muts
 from ..subgrouping_test.gather_test import calculate_auc
 from .utils import load_SMMART_expr
@@ -79,11 +79,11 @@ def main():
     out_clf = None
     out_tune = None
 
+    task_dict = get_task_assignment(args.use_dir, muts_list)
     random.seed(10301)
     random.shuffle(muts_list)
 
-    use_muts = [mut for i, mut in enumerate(muts_list)
-                if i % task_count in use_tasks]
+    use_muts = [mut for mut in muts_list if task_dict[mut] in use_tasks]
 
     for cv_id, out_fls in file_sets.items():
         out_list = []
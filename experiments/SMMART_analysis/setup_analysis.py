@@ -4,12 +4,12 @@ from dryadic.features.mutations import MuType
 
 from .param_list import params, mut_lvls
 from .utils import load_SMMART_expr
+from ..utilities.handle_input import save_data, write_shared_cohort
 from ..utilities.data_dirs import vep_cache_dir, expr_sources
-from ...features.cohorts.utils import get_cohort_data
+from ...features.cohorts.utils import get_cached_cohort
 
 import os
 import argparse
-import bz2
 import dill as pickle
 from itertools import product
 
@@ -37,10 +37,10 @@ def main():
     search_dict = params[args.search_params]
 
     # load beatAML expression and mutation datasets
-    cdata = get_cohort_data(args.cohort, args.expr_source, lvl_lists,
-                            vep_cache_dir, out_path, use_copies=False)
-    with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
-        pickle.dump(cdata, f, protocol=-1)
+    cdata = get_cached_cohort(args.cohort, args.expr_source, lvl_lists,
+                              vep_cache_dir, out_path, use_copies=False)
+    save_data(cdata, os.path.join(out_path, "cohort-data.p.gz"), codec='bz2')
+    write_shared_cohort(cdata, out_path)
 
     # load single-cell expression data; figure out which expression features
     # overlap with those available for beatAML
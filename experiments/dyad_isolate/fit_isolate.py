@@ -1,8 +1,8 @@
 
 from .classifiers import *
-from ..utilities.handle_input import safe_load
+from ..utilities.handle_input import load_setup_cohort
 from ..utilities.mutations import pnt_mtype, shal_mtype, deep_mtype, ExMcomb
-from ..utilities.pipeline_setup import get_task_count
+from ..utilities.pipeline_setup import get_task_assignment
 from dryadic.features.mutations import MuType
 
 import os
@@ -32,15 +32,13 @@ def main():
 
     args = parser.parse_args()
     setup_dir = os.path.join(args.use_dir, 'setup')
-    task_count = get_task_count(args.use_dir)
 
     # load mutation subgroupings previously enumerated for testing
     with open(os.path.join(setup_dir, "muts-list.p"), 'rb') as muts_f:
         muts_list = pickle.load(muts_f)
 
     # load tumour cohort paired expression and mutation data
-    cdata = safe_load(os.path.join(setup_dir, "cohort-data.p.gz"),
-                      retry_pause=31)
+    cdata = load_setup_cohort(setup_dir, retry_pause=31)
 
     base_tree = tuple(cdata.mtrees.values())[0]
     clf = eval(args.classif)
@@ -64,12 +62,13 @@ def main():
     out_pred = {mut: {smps: None for smps in ['All', 'Iso', 'IsoShal']}
                 for mut in muts_list}
 
+    task_dict = get_task_assignment(args.use_dir, muts_list)
     random.seed(10301)
     random.shuffle(muts_list)
 
     # for each subgrouping, check if it has been assigned to this task
-    for i, mut in enumerate(muts_list):
-        if (i % task_count) == args.task_id:
+    for mut in muts_list:
+        if task_dict[mut] == args.task_id:
             print("Isolating {} ...".format(mut))
 
             cur_genes = tuple(mut.label_iter())
@@ -4,7 +4,7 @@ isolation experiment to facilitate further analyses.
 """
 
 from ..utilities.mutations import pnt_mtype, shal_mtype, deep_mtype, ExMcomb
-from ..utilities.pipeline_setup import get_task_count
+from ..utilities.pipeline_setup import get_task_count, get_task_assignment
 from ..gene_isolate.utils import calculate_auc
 from ..utilities.misc import compare_muts
 from dryadic.features.mutations import MuType
@@ -103,10 +103,10 @@ def main():
 
     # figure out which of the experiment's tested mutations were assigned to
     # one of the tasks that will be consolidated here
+    task_dict = get_task_assignment(args.use_dir, muts_list)
     random.seed(10301)
     random.shuffle(muts_list)
-    use_muts = [mut for i, mut in enumerate(muts_list)
-                if i % task_count in use_tasks]
+    use_muts = [mut for mut in muts_list if task_dict[mut] in use_tasks]
 
     pred_lists = {
         ex_lbl: [
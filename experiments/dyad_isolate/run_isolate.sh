@@ -100,7 +100,8 @@ then
 
 	eval "$( python -m dryads-research.experiments.utilities.pipeline_setup \
 		$OUTDIR $time_max --merge_max=$merge_max \
-		--task_size=$task_size --samp_exp=$samp_exp --merge_size=3.41 )"
+		--task_size=$task_size --samp_exp=$samp_exp --merge_size=3.41 \
+		--classif=$classif --cost_dir=$DATADIR/dryads-research/dyad_isolate )"
 fi
 
 # if we are only enumerating, we quit before classification jobs are launched
@@ -125,5 +126,8 @@ dvc run -d setup/muts-list.p -d $RUNDIR/fit_isolate.py -O out-conf.p.gz \
 	search='"$search"' mut_lvls='"$mut_lvls"' classif='"$classif"' \
 	time_max='"$run_time"' merge_max='"$merge_time"
 
+# final cleanup duties
+rm -f $OUTDIR/setup/cohort-expr.npy $OUTDIR/setup/cohort-expr__labels.p \
+	$OUTDIR/setup/cohort-muts.p
 cp output.dvc $FINALDIR/output_${out_tag}.dvc
 
@@ -1,6 +1,6 @@
 
 from ..utilities.mutations import pnt_mtype, shal_mtype, ExMcomb
-from ..utilities.pipeline_setup import get_task_count
+from ..utilities.pipeline_setup import get_task_count, get_task_assignment
 from .utils import calculate_auc
 from ..utilities.misc import compare_muts
 
@@ -87,11 +87,11 @@ def main():
     out_clf = None
     out_tune = None
 
+    task_dict = get_task_assignment(args.use_dir, muts_list)
     random.seed(10301)
     random.shuffle(muts_list)
 
-    use_muts = [mut for i, mut in enumerate(muts_list)
-                if i % task_count in use_tasks]
+    use_muts = [mut for mut in muts_list if task_dict[mut] in use_tasks]
     mut_samps = {mut: mut.get_samples(*cdata.mtrees.values())
                  for mut in use_muts}
 
@@ -83,7 +83,8 @@ then
 
 	eval "$( python -m dryads-research.experiments.utilities.pipeline_setup \
 		$OUTDIR $time_max --merge_max=$merge_max \
-		--task_size=0.43 --samp_exp=1 --merge_size=1.91 )"
+		--task_size=0.43 --samp_exp=1 --merge_size=1.91 \
+		--classif=$classif --cost_dir=$DATADIR/dryads-research/gene_isolate )"
 fi
 
 # if we are only enumerating, we quit before classification jobs are launched
@@ -108,5 +109,8 @@ dvc run -d setup/muts-list.p -d $RUNDIR/fit_isolate.py -O out-conf.p.gz \
 	search='"$search"' classif='"$classif"' \
 	time_max='"$run_time"' merge_max='"$merge_time"
 
+# final cleanup duties
+rm -f $OUTDIR/setup/cohort-expr.npy $OUTDIR/setup/cohort-expr__labels.p \
+	$OUTDIR/setup/cohort-muts.p
 cp output.dvc $FINALDIR/output__${out_tag}.dvc
 
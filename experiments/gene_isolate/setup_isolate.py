@@ -1,5 +1,6 @@
 
 from .param_lists import search_params, mut_lvls
+from ..utilities.handle_input import save_data, write_shared_cohort
 from ..utilities.data_dirs import choose_source, vep_cache_dir
 from ...features.cohorts.utils import get_cohort_data
 
@@ -10,7 +11,6 @@ from dryadic.features.mutations import MuType
 
 import os
 import argparse
-import bz2
 import dill as pickle
 
 import numpy as np
@@ -43,8 +43,8 @@ def main():
 
     cdata = get_cohort_data(args.cohort, choose_source(args.cohort),
                             lvl_lists, vep_cache_dir, out_path, {args.gene})
-    with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
-        pickle.dump(cdata, f, protocol=-1)
+    save_data(cdata, os.path.join(out_path, "cohort-data.p.gz"), codec='bz2')
+    write_shared_cohort(cdata, out_path)
 
     assert sorted(cdata.mtrees.keys()) == sorted(lvl_lists), (
         "Level combination mutation trees incorrectly instantiated!")
@@ -1,6 +1,7 @@
 
 import numpy as np
 from ..utilities.mutations import ExMcomb
+from ..utilities.metrics import calc_auc
 from itertools import product
 from functools import reduce
 from operator import and_
@@ -32,28 +33,16 @@ def calculate_auc(phn_vec, pred_vals, cv_indx=None, use_mean=False):
             raise TypeError("`cv_indx` must be a list, an integer value, "
                             "or left as None to use all CV iterations!")
 
-        mut_vals = pred_mat[use_phn].T[cv_indx]
-        wt_vals = pred_mat[~use_phn].T[cv_indx]
-
-        assert (mut_vals.shape[0] == wt_vals.shape[0]
-                == len(cv_indx)), ("Wrong number of CV iterations in "
-                                   "classifier output, must be {}!".format(
-                                       len(cv_indx)))
-
-        assert mut_vals.shape[1] == use_phn.sum(), (
-            "Wrong number of mutated samples in classifier output, must "
-            "be {} instead of {}!".format(use_phn.sum(), mut_vals.shape[1])
-            )
-        assert wt_vals.shape[1] == (~use_phn).sum(), (
-            "Wrong number of wild-type samples in classifier output, must "
-            "be {} instead of {}!".format((~use_phn).sum(), wt_vals.shape[1])
+        pred_mat = pred_mat[:, cv_indx]
+        assert pred_mat.shape == (len(use_phn), len(cv_indx)), (
+            "Wrong number of CV iterations in classifier output, must "
+            "be {}!".format(len(cv_indx))
             )
 
         if use_mean:
-            mut_vals, wt_vals = mut_vals.mean(axis=0), wt_vals.mean(axis=0)
+            pred_mat = pred_mat.mean(axis=1)
 
-        auc_val = np.greater.outer(mut_vals, wt_vals).mean()
-        auc_val += 0.5 * np.equal.outer(mut_vals, wt_vals).mean()
+        auc_val = calc_auc(pred_mat, use_phn)
 
     return auc_val
 
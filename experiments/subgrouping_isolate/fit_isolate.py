@@ -1,8 +1,9 @@
 
 from .classifiers import *
-from ..utilities.handle_input import safe_load
+from ..utilities.classifiers import BatchLinear
+from ..utilities.handle_input import load_setup_cohort
 from ..utilities.mutations import pnt_mtype, shal_mtype, ExMcomb
-from ..utilities.pipeline_setup import get_task_count
+from ..utilities.pipeline_setup import get_task_assignment
 
 import os
 import argparse
@@ -25,22 +26,28 @@ def main():
                         help='the subset of subtypes to assign to this task')
     parser.add_argument('--cv_id', type=int, default=0,
                         help='the subset of subtypes to assign to this task')
+    parser.add_argument(
+        '--batch', action='store_true',
+        help="share transformed features across subgroupings of each gene"
+        )
 
     # collect command line arguments, get directory where input has been saved
     args = parser.parse_args()
     setup_dir = os.path.join(args.use_dir, 'setup')
-    task_count = get_task_count(args.use_dir)
 
     # load the list of mutation types to test and the cohort -omic data
     with open(os.path.join(setup_dir, "muts-list.p"), 'rb') as muts_f:
         muts_list = pickle.load(muts_f)
-    cdata = safe_load(os.path.join(setup_dir, "cohort-data.p.gz"),
-                      retry_pause=31)
+    cdata = load_setup_cohort(setup_dir, retry_pause=31)
 
     use_mtree = tuple(cdata.mtrees.values())[0]
     clf = eval(args.classif)
     mut_clf = clf()
 
+    if args.batch and not isinstance(mut_clf, BatchLinear):
+        parser.error("Classifier `{}` cannot be fit in batches!".format(
+            args.classif))
+
     use_seed = 13101 + 103 * args.cv_id
     cdata_samps = sorted(cdata.get_samples())
     random.seed((args.cv_id // 4) * 3901 + 23)
@@ -58,15 +65,46 @@ def main():
     out_pred = {mut: {smps: None for smps in ['All', 'Iso', 'IsoShal']}
                 for mut in muts_list}
 
+    task_dict = get_task_assignment(args.use_dir, muts_list)
     random.seed(10301)
     random.shuffle(muts_list)
 
+    task_genes = dict()
+
     # for each subtype, check if it has been assigned to this task
-    for i, mut in enumerate(muts_list):
-        if (i % task_count) == args.task_id:
+    for mut in muts_list:
+        if task_dict[mut] == args.task_id:
+            task_genes[mut] = tuple(mut.label_iter())[0]
+
+        else:
+            del(out_pars[mut])
+            del(out_time[mut])
+            del(out_acc[mut])
+            del(out_pred[mut])
+
+    # subgroupings of the same gene exclude the same features and can thus
+    # share transformed -omic data when fitting in batches; the samples each
+    # isolation leaves out are then removed from the shared data, which was
+    # transformed using all of the training samples
+    if args.batch:
+        gene_batches = dict()
+        for mut, cur_gene in task_genes.items():
+            gene_batches[cur_gene] = gene_batches.get(cur_gene, []) + [mut]
+
+    else:
+        gene_batches = {None: list(task_genes)}
+
+    for batch_gene, batch_muts in gene_batches.items():
+        if args.batch:
+            print("Preparing features for {} ...".format(batch_gene))
+
+            ex_genes = cdata.get_cis_genes('Chrm', cur_genes=[batch_gene])
+            prep_data = mut_clf.prep_batch(cdata, exclude_feats=ex_genes)
+
+        for mut in batch_muts:
             print("Isolating {} ...".format(mut))
 
-            cur_gene = tuple(mut.label_iter())[0]
+            cur_gene = task_genes[mut]
             cur_mtree = use_mtree[cur_gene]
             gene_samps = cur_mtree.get_samples()
             shal_samps = ExMcomb(pnt_mtype, shal_mtype).get_samples(cur_mtree)
@@ -77,11 +115,22 @@ def main():
                        'IsoShal': gene_samps - (mut_samps | shal_samps)}
 
             for ex_lbl, ex_samps in ex_dict.items():
-                mut_clf, cv_output = mut_clf.tune_coh(
-                    cdata, mut, exclude_feats=ex_genes,
-                    exclude_samps=ex_samps, tune_splits=4,
-                    test_count=mut_clf.test_count, parallel_jobs=8
-                    )
+                if args.batch:
+                    ex_indx = prep_data['Samps'].isin(ex_samps)
+                    train_pheno = prep_data['Samps'].isin(mut_samps)
+
+                    fit_est, cv_output = mut_clf.tune_batch(
+                        {**prep_data, 'Train': prep_data['Train'][~ex_indx]},
+                        train_pheno[~ex_indx], tune_splits=4,
+                        parallel_jobs=8, random_state=use_seed
+                        )
+
+                else:
+                    mut_clf, cv_output = mut_clf.tune_coh(
+                        cdata, mut, exclude_feats=ex_genes,
+                        exclude_samps=ex_samps, tune_splits=4,
+                        test_count=mut_clf.test_count, parallel_jobs=8
+                        )
 
                 # save the tuned values of the hyper-parameters
                 clf_params = mut_clf.get_params()
@@ -94,29 +143,40 @@ def main():
                 out_acc[mut][ex_lbl]['std'] = cv_output['std_test_score']
                 out_acc[mut][ex_lbl]['par'] = cv_output['params']
 
-                mut_clf.fit_coh(cdata, mut, exclude_feats=ex_genes,
-                                exclude_samps=ex_samps)
-
-                out_pred[mut][ex_lbl] = {
-                    'test': np.round(mut_clf.parse_preds(
-                        mut_clf.predict_test(cdata, lbl_type='raw',
-                                             exclude_feats=ex_genes)
-                        ), 7)
-                    }
-
-                if ex_samps & set(cdata.get_train_samples()):
-                    out_pred[mut][ex_lbl]['train'] = np.round(
-                        mut_clf.parse_preds(mut_clf.predict_train(
-                            cdata, lbl_type='raw',
-                            exclude_feats=ex_genes, include_samps=ex_samps
-                            )),
-                        7)
-
-        else:
-            del(out_pars[mut])
-            del(out_time[mut])
-            del(out_acc[mut])
-            del(out_pred[mut])
+                # the classifiers fit in batches were already trained on the
+                # training samples they use during tuning, and are applied
+                # to the training samples left out using the shared data
+                if args.batch:
+                    out_pred[mut][ex_lbl] = {
+                        'test': np.round(
+                            mut_clf.predict_batch(prep_data, fit_est), 7)
+                        }
+
+                    if ex_indx.any():
+                        out_pred[mut][ex_lbl]['train'] = np.round(
+                            fit_est.decision_function(
+                                prep_data['Train'][ex_indx]),
+                            7)
+
+                else:
+                    mut_clf.fit_coh(cdata, mut, exclude_feats=ex_genes,
+                                    exclude_samps=ex_samps)
+
+                    out_pred[mut][ex_lbl] = {
+                        'test': np.round(mut_clf.parse_preds(
+                            mut_clf.predict_test(cdata, lbl_type='raw',
+                                                 exclude_feats=ex_genes)
+                            ), 7)
+                        }
+
+                    if ex_samps & set(cdata.get_train_samples()):
+                        out_pred[mut][ex_lbl]['train'] = np.round(
+                            mut_clf.parse_preds(mut_clf.predict_train(
+                                cdata, lbl_type='raw',
+                                exclude_feats=ex_genes,
+                                include_samps=ex_samps
+                                )),
+                            7)
 
     with open(os.path.join(args.use_dir, 'output',
                            "out__cv-{}_task-{}.p".format(
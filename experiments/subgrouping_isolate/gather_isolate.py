@@ -1,8 +1,10 @@
 
 from ..utilities.mutations import pnt_mtype, shal_mtype, ExMcomb
-from ..utilities.pipeline_setup import get_task_count
+from ..utilities.pipeline_setup import get_task_count, get_task_assignment
 from ..utilities.misc import compare_muts
-from ..gene_isolate.utils import calculate_auc
+from ..utilities.metrics import calc_auc_dict
+from ..utilities.bootstrap import get_sub_inds, calc_conf_aucs
+from ..utilities.sample_sets import load_pheno_index
 
 import os
 import argparse
@@ -12,23 +14,28 @@ import dill as pickle
 
 import numpy as np
 import pandas as pd
-from joblib import Parallel, delayed
 import random
 
-from itertools import cycle
-from functools import reduce
-from operator import add
 
+def calculate_siml(base_mtype, phn_dict, ex_k, pred_mat):
+    """Scores the similarities of a subgrouping to those of the same gene.
 
-def calculate_siml(base_mtype, phn_dict, ex_k, pred_vals):
+    Args:
+        base_mtype (MuType): The subgrouping whose classifier is used.
+        phn_dict (dict): The ground truth labels for each subgrouping.
+        ex_k: The subgrouping whose wild-type samples form the baseline.
+        pred_mat (np.array)
+            A samples x cv-folds matrix of the classifier's scores, with
+            missing values for folds in which a sample was not scored.
+
+    """
     cur_genes = set(base_mtype.label_iter())
 
-    none_mean = np.concatenate(pred_vals[~phn_dict[ex_k]].values).mean()
-    base_mean = np.concatenate(pred_vals[phn_dict[base_mtype]].values).mean()
+    none_mean = np.nanmean(pred_mat[~phn_dict[ex_k]])
+    base_mean = np.nanmean(pred_mat[phn_dict[base_mtype]])
     cur_diff = base_mean - none_mean
 
-    return {othr_mtype: (np.concatenate(pred_vals[phn].values).mean()
-                         - none_mean) / cur_diff
+    return {othr_mtype: (np.nanmean(pred_mat[phn]) - none_mean) / cur_diff
             for othr_mtype, phn in phn_dict.items()
             if (isinstance(othr_mtype, ExMcomb)
                 and set(othr_mtype.get_labels()) == cur_genes)}
@@ -102,21 +109,20 @@ def main():
     out_clf = None
     out_tune = None
 
+    task_dict = get_task_assignment(args.use_dir, muts_list)
     random.seed(10301)
     random.shuffle(muts_list)
 
-    use_muts = [mut for i, mut in enumerate(muts_list)
-                if i % task_count in use_tasks]
+    use_muts = [mut for mut in muts_list if task_dict[mut] in use_tasks]
 
-    # initialize object that will store collated classifier scores
-    pred_lists = {
-        ex_lbl: [
-            pd.DataFrame(index=use_muts,
-                         columns=cdata.get_samples()).applymap(lambda x: [])
-            for cv_id in range(40)
-            ]
-        for ex_lbl in args.ex_lbls
-        }
+    # initialize arrays that will store collated classifier scores, with
+    # each sample's score in each cross-validation fold it was scored in
+    mut_indx = {mut: i for i, mut in enumerate(use_muts)}
+    samp_list = sorted(cdata.get_samples())
+    samp_indx = {samp: j for j, samp in enumerate(samp_list)}
+
+    pred_arrs = {ex_lbl: np.full((len(use_muts), len(samp_list), 40), np.nan)
+                 for ex_lbl in args.ex_lbls}
 
     if 'Iso' in args.ex_lbls or 'IsoShal' in args.ex_lbls:
         mut_samps = {mut: mut.get_samples(use_mtree) for mut in use_muts}
@@ -174,12 +180,11 @@ def main():
                 "match those enumerated during setup!".format(ex_lbl, cv_id)
                 )
 
-            test_mat = np.vstack(out_preds.test.values).transpose()
-            pred_lists[ex_lbl][cv_id].loc[out_preds.index] = pred_lists[
-                ex_lbl][cv_id].loc[out_preds.index].assign(
-                **{samp: [[x] for x in test_mat[i]]
-                   for i, samp in enumerate(samps_dict['test'])}
-                )
+            pred_arrs[ex_lbl][np.ix_(
+                [mut_indx[mut] for mut in out_preds.index],
+                [samp_indx[samp] for samp in samps_dict['test']],
+                [cv_id]
+                )] = np.vstack(out_preds.test.values)[..., np.newaxis]
 
             if 'train' in out_preds:
                 train_mat = out_preds.train[~out_preds.train.isnull()]
@@ -190,8 +195,10 @@ def main():
                         use_samps -= shal_samps[mut_genes[mut]]
 
                     out_samps = sorted(use_samps & set(samps_dict['train']))
-                    pred_lists[ex_lbl][cv_id].loc[mut][out_samps] = [
-                        [x] for x in train_preds]
+                    pred_arrs[ex_lbl][
+                        mut_indx[mut], [samp_indx[samp] for samp in out_samps],
+                        cv_id
+                        ] = train_preds
 
         for k in out_dfs:
             for ex_lbl in args.ex_lbls:
@@ -200,36 +207,35 @@ def main():
                     for mut, out_vals in out_dicts[k].items()
                     }).transpose()
 
-    pred_dfs = {ex_lbl: reduce(add, pred_mats)
-                for ex_lbl, pred_mats in pred_lists.items()}
-
-    if 'All' in args.ex_lbls:
-        assert (pred_dfs['All'].applymap(len) == 10).values.all(), (
-            "Incorrect number of testing CV scores!")
+    # finds how many scores each sample has; samples held out of training
+    # are scored in every fold, all others in one fold out of every four
+    pred_cnts = {ex_lbl: (~np.isnan(pred_arr)).sum(axis=2)
+                 for ex_lbl, pred_arr in pred_arrs.items()}
+    hld_stats = {ex_lbl: np.zeros((len(use_muts), len(samp_list)),
+                                  dtype=bool)
+                 for ex_lbl in args.ex_lbls}
 
-    if 'Iso' in args.ex_lbls or 'IsoShal' in args.ex_lbls:
-        for mut in pred_dfs[args.ex_lbls[0]].index:
+    for ex_lbl in set(args.ex_lbls) & {'Iso', 'IsoShal'}:
+        for mut, i in mut_indx.items():
             hld_samps = gene_samps[mut_genes[mut]] - mut_samps[mut]
-
-            if 'Iso' in args.ex_lbls:
-                assert (pred_dfs['Iso'].loc[
-                    mut, set(cdata.get_samples()) - hld_samps].apply(len)
-                    == 10).all(), ("Incorrect number of testing CV scores!")
-
-                assert (pred_dfs['Iso'].loc[
-                    mut, hld_samps].apply(len) == 40).all(), (
-                        "Incorrect number of testing CV scores!")
-
-            if 'IsoShal' in args.ex_lbls:
+            if ex_lbl == 'IsoShal':
                 hld_samps -= shal_samps[mut_genes[mut]]
 
-                assert (pred_dfs['IsoShal'].loc[
-                    mut, set(cdata.get_samples()) - hld_samps].apply(len)
-                    == 10).all(), ("Incorrect number of testing CV scores!")
+            hld_stats[ex_lbl][i, [samp_indx[samp]
+                                  for samp in hld_samps]] = True
 
-                assert (pred_dfs['IsoShal'].loc[
-                    mut, hld_samps].apply(len) == 40).all(), (
-                        "Incorrect number of testing CV scores!")
+    for ex_lbl, pred_cnt in pred_cnts.items():
+        assert (pred_cnt == np.where(hld_stats[ex_lbl], 40, 10)).all(), (
+            "Incorrect number of testing CV scores!")
+
+    pred_dfs = {
+        ex_lbl: pd.DataFrame({
+            mut: pd.Series([vals[~np.isnan(vals)].tolist()
+                            for vals in pred_arr[i]], index=samp_list)
+            for mut, i in mut_indx.items()
+            }).transpose()
+        for ex_lbl, pred_arr in pred_arrs.items()
+        }
 
     pars_dfs = {ex_lbl: pd.concat(out_dfs['Pars'][ex_lbl], axis=1, sort=True)
                 for ex_lbl in args.ex_lbls}
@@ -277,92 +283,65 @@ def main():
 
     cdata.update_split(test_prop=0)
     train_samps = np.array(cdata.get_train_samples())
-    pheno_dict = {mut: np.array(cdata.train_pheno(mut)) for mut in use_muts}
+
+    # uses the mutation statuses found during setup where available
+    pheno_indx = load_pheno_index(os.path.join(args.use_dir, 'setup'))
+    if pheno_indx is None:
+        pheno_dict = {mut: np.array(cdata.train_pheno(mut))
+                      for mut in use_muts}
+    else:
+        pheno_dict = {mut: pheno_indx.get_pheno(mut, train_samps)
+                      for mut in use_muts}
 
     with bz2.BZ2File(os.path.join(args.use_dir, 'merge',
                                   "out-pheno{}.p.gz".format(out_tag)),
                      'w') as fl:
         pickle.dump(pheno_dict, fl, protocol=-1)
 
+    # collapses the scores of the samples not held out of training into the
+    # ten CV runs, in each of which they were tested exactly once
+    train_indx = [samp_indx[samp] for samp in train_samps]
+    test_stats = {ex_lbl: ~hld_stat[:, train_indx]
+                  for ex_lbl, hld_stat in hld_stats.items()}
+    cv_arrs = {ex_lbl: np.nansum(pred_arr[:, train_indx].reshape(
+        len(use_muts), len(train_indx), 10, 4), axis=3)
+               for ex_lbl, pred_arr in pred_arrs.items()}
+
     # calculates AUCs for prediction tasks using scores from all
-    # cross-validations concatenated together...
+    # cross-validations concatenated together, for each cross-validation run
+    # considered separately, and using the average of predicted scores for
+    # each sample across CV runs, leaving out the held-out samples
     auc_dicts = {
-        ex_lbl: {
-            'all': pd.Series(dict(zip(use_muts, Parallel(
-                n_jobs=12, prefer='threads', pre_dispatch=120)(
-                    delayed(calculate_auc)(
-                        pheno_dict[mut],
-                        pred_dfs[ex_lbl].loc[mut][train_samps],
-                        )
-                    for mut in use_muts
-                    )
-                ))),
-
-            # ...and for each cross-validation run considered separately...
-            'CV': pd.DataFrame.from_records(
-                tuple(zip(cycle(use_muts), Parallel(
-                    n_jobs=12, prefer='threads', pre_dispatch=120)(
-                        delayed(calculate_auc)(
-                            pheno_dict[mut],
-                            pred_dfs[ex_lbl].loc[mut][train_samps],
-                            cv_indx=cv_id
-                            )
-                        for cv_id in range(10) for mut in use_muts
-                        )
-                    ))
-                ).pivot_table(index=0, values=1, aggfunc=list).iloc[:, 0],
-
-            # ...and finally using the average of predicted scores for each
-            # sample across CV runs
-            'mean': pd.Series(dict(zip(use_muts, Parallel(
-                n_jobs=12, prefer='threads', pre_dispatch=120)(
-                    delayed(calculate_auc)(
-                        pheno_dict[mut],
-                        pred_dfs[ex_lbl].loc[mut][train_samps],
-                        use_mean=True
-                        )
-                    for mut in use_muts
-                    )
-                )))
-            }
+        ex_lbl: calc_auc_dict(
+            {mut: cv_arrs[ex_lbl][i, test_stats[ex_lbl][i]]
+             for mut, i in mut_indx.items()},
+            {mut: pheno_dict[mut][test_stats[ex_lbl][i]]
+             for mut, i in mut_indx.items()}
+            )
         for ex_lbl in args.ex_lbls
         }
 
-    for ex_lbl in args.ex_lbls:
-        auc_dicts[ex_lbl]['CV'].name = None
-        auc_dicts[ex_lbl]['CV'].index.name = None
-
     with bz2.BZ2File(os.path.join(args.use_dir, 'merge',
                                   "out-aucs{}.p.gz".format(out_tag)),
                      'w') as fl:
         pickle.dump(auc_dicts, fl, protocol=-1)
 
-    random.seed(9903)
-    sub_inds = [random.choices([False, True], k=len(cdata.get_samples()))
-                for _ in range(500)]
-
+    # creates down-sampled sets of cohort tumour samples and calculates
+    # down-sampled AUCs using samples' average scores, leaving out the
+    # samples held out from training which were scored by all 40 CV runs
+    sub_inds = get_sub_inds(len(cdata.get_samples()), 500, seed=9903)
     conf_lists = {
         ex_lbl: {
-            'mean': pd.DataFrame.from_records(
-                tuple(zip(cycle(use_muts), Parallel(
-                    n_jobs=12, prefer='threads', pre_dispatch=120)(
-                        delayed(calculate_auc)(
-                            pheno_dict[mut][sub_indx],
-                            pred_dfs[ex_lbl].loc[mut][train_samps[sub_indx]],
-                            use_mean=True
-                            )
-                        for sub_indx in sub_inds for mut in use_muts
-                        )
-                    ))
-                ).pivot_table(index=0, values=1, aggfunc=list).iloc[:, 0]
+            'mean': calc_conf_aucs(
+                {mut: np.where(test_stats[ex_lbl][i],
+                               cv_arrs[ex_lbl][i].mean(axis=1), np.nan)
+                 for mut, i in mut_indx.items()},
+                pheno_dict, sub_inds
+                )
             }
         for ex_lbl in args.ex_lbls
         }
 
-    for ex_lbl in args.ex_lbls:
-        conf_lists[ex_lbl]['mean'].name = None
-        conf_lists[ex_lbl]['mean'].index.name = None
-
     with bz2.BZ2File(os.path.join(args.use_dir, 'merge',
                                   "out-conf{}.p.gz".format(out_tag)),
                      'w') as fl:
@@ -20,19 +20,24 @@ Example usages:
 """
 
 from .param_list import params
+from ..utilities.handle_input import save_data, write_shared_cohort
 from ..utilities.data_dirs import vep_cache_dir
 from ...features.data.oncoKB import get_gene_list
-from ...features.cohorts.utils import get_cohort_data
+from ...features.cohorts.utils import get_cached_cohort
 
 from ..utilities.mutations import (pnt_mtype, copy_mtype, shal_mtype,
                                    dup_mtype, gains_mtype, loss_mtype,
                                    dels_mtype, Mcomb, ExMcomb)
+from ..utilities.sample_sets import (SampleIndex, count_samples,
+                                     equal_samples, superset_samples,
+                                     write_pheno_index)
 from dryadic.features.mutations import MuType
 
 import os
 import argparse
-import bz2
 import dill as pickle
+
+import numpy as np
 from itertools import combinations as combn
 
 
@@ -62,14 +67,15 @@ def main():
     use_genes = get_gene_list(min_sources=2)
 
     # load and process the -omic datasets for this cohort
-    cdata = get_cohort_data(args.cohort, args.expr_source, lvl_list,
-                            vep_cache_dir, out_path, use_genes)
-    with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
-        pickle.dump(cdata, f, protocol=-1)
+    cdata = get_cached_cohort(args.cohort, args.expr_source, lvl_list,
+                              vep_cache_dir, out_path, use_genes)
+    save_data(cdata, os.path.join(out_path, "cohort-data.p.gz"), codec='bz2')
+    write_shared_cohort(cdata, out_path)
 
     # get the maximum number of samples allowed per subgrouping, initialize
     # the list of enumerated subgroupings
     max_samps = len(cdata.get_samples()) - search_dict['samp_cutoff']
+    samp_indx = SampleIndex(cdata.get_samples())
     test_muts = set()
 
     # for each gene with enough point mutations, find all of the combinations
@@ -85,22 +91,31 @@ def main():
 
             # get the samples mutated for each subtype combination in this
             # cohort; remove subtypes that span all of the gene's mutations
-            samp_dict = {mtype: mtype.get_samples(mtree)
+            samp_dict = {mtype: samp_indx.get_bits(mtype, mtree)
                          for mtype in comb_types}
-            samp_dict[pnt_mtype] = mtree['Point'].get_samples()
-            pnt_types = {mtype for mtype in comb_types
-                         if samp_dict[mtype] != samp_dict[pnt_mtype]}
+            samp_dict[pnt_mtype] = samp_indx.pack(
+                mtree['Point'].get_samples())
+            pnt_types = {
+                mtype for mtype in comb_types
+                if not np.array_equal(samp_dict[mtype], samp_dict[pnt_mtype])
+                }
 
             # remove subtypes that are mutated in the same set of samples as
             # another subtype and are less granular in their definition
+            pnt_list = sorted(pnt_types)
+            same_samps = equal_samples(
+                np.array([samp_dict[mtype] for mtype in pnt_list]))
+            np.fill_diagonal(same_samps, False)
             rmv_mtypes = set()
-            for rmv_mtype in sorted(pnt_types):
-                rmv_lvls = rmv_mtype.get_levels()
+
+            for i, rmv_mtype in enumerate(pnt_list):
 
                 # e.g. remove `Missense` in favour of `Missense->5th Exon` if
                 # all of this gene's missense mutations are on the fifth exon
-                for cmp_mtype in pnt_types - {rmv_mtype} - rmv_mtypes:
-                    if (samp_dict[rmv_mtype] == samp_dict[cmp_mtype]
+                for j in np.flatnonzero(same_samps[i]):
+                    cmp_mtype = pnt_list[j]
+
+                    if (cmp_mtype not in rmv_mtypes
                             and ((len(rmv_mtype.leaves())
                                   > len(cmp_mtype.leaves()))
                                  or rmv_mtype.is_supertype(cmp_mtype))):
@@ -129,17 +144,23 @@ def main():
             # combined with CNAs to produce a novel set of mutated samples
             copy_dyads = set()
             for copy_type in copy_types:
-                samp_dict[copy_type] = copy_type.get_samples(mtree)
+                samp_dict[copy_type] = samp_indx.get_bits(copy_type, mtree)
 
-                if len(samp_dict[copy_type]) >= 5:
+                # the samples of a dyad are those of its point mutation and
+                # CNA subgroupings, which must not contain one another
+                if count_samples(samp_dict[copy_type]) >= 5:
                     for pnt_type in pnt_types:
-                        new_dyad = pnt_type | copy_type
-                        dyad_samps = new_dyad.get_samples(mtree)
-
-                        if (dyad_samps > samp_dict[pnt_type]
-                                and dyad_samps > samp_dict[copy_type]):
+                        if ((samp_dict[copy_type]
+                             & ~samp_dict[pnt_type]).any()
+                                and (samp_dict[pnt_type]
+                                     & ~samp_dict[copy_type]).any()):
+                            new_dyad = pnt_type | copy_type
                             copy_dyads |= {new_dyad}
-                            samp_dict[new_dyad] = dyad_samps
+
+                            samp_dict[new_dyad] = (samp_dict[pnt_type]
+                                                   | samp_dict[copy_type])
+                            samp_indx.set_bits(new_dyad, mtree,
+                                               samp_dict[new_dyad])
 
             # add the CNA-only subgroupings if we are using "base" attributes
             test_types = pnt_types | copy_dyads
@@ -151,7 +172,8 @@ def main():
             test_muts |= {MuType({('Gene', gene): mtype})
                           for mtype in test_types
                           if (search_dict['samp_cutoff']
-                              <= len(samp_dict[mtype]) <= max_samps)}
+                              <= count_samples(samp_dict[mtype])
+                              <= max_samps)}
 
             # get the list of all possible mutations for this gene, with and
             # without the shallow CNAs
@@ -159,16 +181,18 @@ def main():
             ex_mtypes = [MuType({}), shal_mtype]
             mtype_lvls = {mtype: mtype.get_levels() - {'Scale'}
                           for mtype in pnt_types | copy_types}
+            sub_samps = superset_samples(
+                np.array([samp_dict[mtype] for mtype in mtype_lvls]))
 
             # get all of the disjoint pairs of subgroupings for this gene
             use_pairs = {(mtype2, mtype1)
                          if 'Copy' in lvls1 else (mtype1, mtype2)
-                         for (mtype1, lvls1), (mtype2, lvls2)
-                         in combn(mtype_lvls.items(), 2)
+                         for ((i, (mtype1, lvls1)), (j, (mtype2, lvls2)))
+                         in combn(enumerate(mtype_lvls.items()), 2)
                          if (('Copy' not in lvls1 or 'Copy' not in lvls2)
-                             and (mtype1 & mtype2).is_empty()
-                             and not samp_dict[mtype1] >= samp_dict[mtype2]
-                             and not samp_dict[mtype2] >= samp_dict[mtype1])}
+                             and not sub_samps[i, j]
+                             and not sub_samps[j, i]
+                             and (mtype1 & mtype2).is_empty())}
 
             # create subgroupings using these pairs that do and do not exclude
             # the presence of the remaining mutations of the gene
@@ -195,7 +219,8 @@ def main():
                 for mcomb in use_mcombs
                 if (isinstance(mcomb, (Mcomb, ExMcomb))
                     and (search_dict['samp_cutoff']
-                         <= len(mcomb.get_samples(mtree)) <= max_samps))
+                         <= count_samples(samp_indx.get_bits(mcomb, mtree))
+                         <= max_samps))
                 }
 
     # save enumerated subgroupings and number of subgroupings to file
@@ -204,6 +229,11 @@ def main():
     with open(os.path.join(out_path, "muts-count.txt"), 'w') as fl:
         fl.write(str(len(test_muts)))
 
+    # save the mutation status of each subgrouping in the cohort's samples
+    # so that later stages don't have to find them again
+    cdata.update_split(test_prop=0)
+    write_pheno_index(out_path, cdata, sorted(test_muts))
+
 
 if __name__ == '__main__':
     main()
@@ -1,5 +1,6 @@
 
-from ..utilities.classifiers import Ridge, RidgeMoreTune, SVCrbf, Forests
+from ..utilities.classifiers import (Ridge, RidgeMoreTune, RidgePath,
+                                    RidgeMoreTunePath, SVCrbf, Forests)
 from dryadic.learning.classifiers import Base, LinearPipe, Kernel, Trees
 from dryadic.learning.pipelines.base import PipelineError
 
@@ -7,6 +8,11 @@ from dryadic.learning.pipelines.base import PipelineError
 import numpy as np
 from sklearn.linear_model import LogisticRegression, SGDClassifier
 
+# the classifiers that can be used in this experiment, including those that
+# are only imported here so that `fit_test` can find them by name
+__all__ = ['Ridge', 'RidgeMoreTune', 'RidgePath', 'RidgeMoreTunePath',
+           'SVCrbf', 'Forests', 'Elastic']
+
 
 class Elastic(Base, LinearPipe):
 
@@ -13,15 +13,19 @@ Example usage:
 """
 
 from .classifiers import *
-from ..utilities.handle_input import safe_load
+from ..utilities.classifiers import BatchLinear
+from ..utilities.handle_input import load_setup_cohort
 from ..utilities.mutations import RandomType
-from ..utilities.pipeline_setup import get_task_count
-from ..utilities.misc import transfer_model
+from ..utilities.pipeline_setup import get_task_assignment
+from ..utilities.misc import transfer_model, load_transfer_expr
+from ..utilities.sample_sets import load_pheno_index
+from ..utilities.checkpoints import TaskCheckpoint
 
 import os
 import argparse
 import dill as pickle
 import random
+import numpy as np
 from pathlib import Path
 
 
@@ -39,12 +43,15 @@ def main():
                         help='the subset of subtypes to assign to this job')
     parser.add_argument('--cv_id', type=int, default=0,
                         help='the subset of cv-folds to assign to this job')
+    parser.add_argument(
+        '--batch', action='store_true',
+        help="share transformed features across subgroupings of each gene"
+        )
 
     # collect command line arguments, get directory where enumeration output
     # was stored, get the number of experiment tasks from task manifest
     args = parser.parse_args()
     setup_dir = os.path.join(args.use_dir, 'setup')
-    task_count = get_task_count(args.use_dir)
 
     # load list of mutations to test and the expression gene features to
     # use during classifier training
@@ -54,11 +61,15 @@ def main():
         feat_list = pickle.load(fl)
 
     # load cohort expression and mutation data and the mutation classifier
-    coh_path = os.path.join(setup_dir, "cohort-data.p.gz")
-    cdata = safe_load(coh_path, retry_pause=41)
+    cdata = load_setup_cohort(setup_dir, retry_pause=41)
+    pheno_indx = load_pheno_index(setup_dir)
     clf = eval(args.classif)
     mut_clf = clf()
 
+    if args.batch and not isinstance(mut_clf, BatchLinear):
+        parser.error("Classifier `{}` cannot be fit in batches!".format(
+            args.classif))
+
     # figure out which cohort samples will be used for tuning and training the
     # classifier and which samples will be used for testing
     use_seed = 9073 + 97 * args.cv_id
@@ -84,35 +95,98 @@ def main():
     out_trnsf = {mtype: {coh: None for coh in coh_dict}
                  for mtype in mtype_list}
 
+    task_dict = get_task_assignment(args.use_dir, mtype_list)
     random.seed(10301)
     random.shuffle(mtype_list)
 
+    task_genes = dict()
+
     # for each subgrouping, check if it has been assigned to this task
-    for i, mtype in enumerate(mtype_list):
-        if (i % task_count) == args.task_id:
-            print("Testing {} ...".format(mtype))
+    for mtype in mtype_list:
+        if task_dict[mtype] == args.task_id:
 
             # get the gene associated with this subgrouping...
             if not isinstance(mtype, RandomType):
-                use_gene = mtype_genes[mtype]
+                task_genes[mtype] = mtype_genes[mtype]
             elif mtype.base_mtype is not None:
-                use_gene = tuple(mtype.label_iter())[0]
+                task_genes[mtype] = tuple(mtype.label_iter())[0]
 
             # picking one at random from those associated with non-random
             # subgroupings for random subgroupings not associated with a gene
             else:
-                use_gene = random.choice(list(mtype_genes.values()))
+                task_genes[mtype] = random.choice(list(mtype_genes.values()))
+
+        else:
+            del(out_pars[mtype])
+            del(out_time[mtype])
+            del(out_acc[mtype])
+            del(out_pred[mtype])
+            del(out_coef[mtype])
+            del(out_trnsf[mtype])
+
+    # recover the output of the subgroupings finished by earlier attempts at
+    # running this task, which can then be skipped
+    out_dicts = {'Pred': out_pred, 'Pars': out_pars, 'Time': out_time,
+                 'Acc': out_acc, 'Coef': out_coef, 'Transfer': out_trnsf}
+    task_ckpt = TaskCheckpoint(
+        os.path.join(args.use_dir, 'output', "out__cv-{}_task-{}.ckpt".format(
+            args.cv_id, args.task_id)),
+        (args.classif, args.batch, sorted(task_genes))
+        )
+
+    for mtype in task_genes:
+        if mtype in task_ckpt:
+            for k, out_val in task_ckpt[mtype].items():
+                out_dicts[k][mtype] = out_val
+
+    fit_genes = {mtype: use_gene for mtype, use_gene in task_genes.items()
+                 if mtype not in task_ckpt}
+
+    # subgroupings associated with the same gene exclude the same features and
+    # can thus share transformed -omic data when fitting in batches
+    if args.batch:
+        gene_batches = dict()
+        for mtype, use_gene in fit_genes.items():
+            gene_batches[use_gene] = gene_batches.get(use_gene, []) + [mtype]
+
+    else:
+        gene_batches = {None: list(fit_genes)}
+
+    for batch_gene, batch_mtypes in gene_batches.items():
+        if args.batch:
+            print("Preparing features for {} ...".format(batch_gene))
+
+            ex_genes = cdata.get_cis_genes('Chrm', cur_genes=[batch_gene])
+            prep_data = mut_clf.prep_batch(
+                cdata, include_feats=feat_list - ex_genes)
+            train_samps = cdata.get_train_samples()
+
+        for mtype in batch_mtypes:
+            print("Testing {} ...".format(mtype))
+
+            # tune the hyper-parameters of the classifier
+            if args.batch:
+                if pheno_indx is not None and mtype in pheno_indx:
+                    train_pheno = pheno_indx.get_pheno(mtype, train_samps)
+                else:
+                    train_pheno = np.array(cdata.train_pheno(mtype))
+
+                fit_est, cv_output = mut_clf.tune_batch(
+                    prep_data, train_pheno,
+                    tune_splits=4, parallel_jobs=8, random_state=use_seed
+                    )
 
             # get the expression features on the same chromosome as the gene
             # of the mutation, remove them from features used in classifying
-            ex_genes = cdata.get_cis_genes('Chrm', cur_genes=[use_gene])
-            use_feats = feat_list - ex_genes
+            else:
+                ex_genes = cdata.get_cis_genes('Chrm',
+                                               cur_genes=[task_genes[mtype]])
+                use_feats = feat_list - ex_genes
 
-            # tune the hyper-parameters of the classifier
-            mut_clf, cv_output = mut_clf.tune_coh(
-                cdata, mtype, include_feats=use_feats,
-                tune_splits=4, test_count=mut_clf.test_count, parallel_jobs=8
-                )
+                mut_clf, cv_output = mut_clf.tune_coh(
+                    cdata, mtype, include_feats=use_feats, tune_splits=4,
+                    test_count=mut_clf.test_count, parallel_jobs=8
+                    )
 
             # save the tuned values of the hyper-parameters
             clf_params = mut_clf.get_params()
@@ -125,41 +199,52 @@ def main():
             out_acc[mtype]['std'] = cv_output['std_test_score']
             out_acc[mtype]['par'] = cv_output['params']
 
-            # train the classifier on the entire training subcohort and apply
-            # the fit model to the testing subcohort
-            mut_clf.fit_coh(cdata, mtype, include_feats=use_feats)
-            out_coef[mtype] = mut_clf.get_coef()
+            # the classifiers fit in batches were already trained on the
+            # entire training subcohort during tuning, and are applied to the
+            # testing subcohort and each other cohort using the shared data
+            if args.batch:
+                out_coef[mtype] = mut_clf.get_batch_coef(prep_data, fit_est)
+                out_pred[mtype] = np.round(
+                    mut_clf.predict_batch(prep_data, fit_est), 7)
+
+                out_trnsf[mtype] = {
+                    coh: np.round(mut_clf.predict_batch(
+                        prep_data, fit_est,
+                        load_transfer_expr(trnsf_fl, feat_list)
+                        ), 7)
+                    for coh, trnsf_fl in coh_dict.items()
+                    }
+
+            # otherwise, train the classifier on the entire training
+            # subcohort and apply the fit model to the testing subcohort
+            else:
+                mut_clf.fit_coh(cdata, mtype, include_feats=use_feats)
+                out_coef[mtype] = mut_clf.get_coef()
 
-            # apply the model to the testing subcohort to get predicted labels
-            out_pred[mtype] = np.round(mut_clf.parse_preds(
-                mut_clf.predict_test(cdata, lbl_type='raw',
-                                     include_feats=use_feats)
-                ), 7)
+                out_pred[mtype] = np.round(mut_clf.parse_preds(
+                    mut_clf.predict_test(cdata, lbl_type='raw',
+                                         include_feats=use_feats)
+                    ), 7)
 
-            # apply the fit model to the entirety of each other cohort
-            out_trnsf[mtype] = {
-                coh: np.round(mut_clf.parse_preds(
-                    transfer_model(trnsf_fl, mut_clf, use_feats)), 7)
-                for coh, trnsf_fl in coh_dict.items()
-                }
+                # apply the fit model to the entirety of each other cohort
+                out_trnsf[mtype] = {
+                    coh: np.round(mut_clf.parse_preds(
+                        transfer_model(trnsf_fl, mut_clf, use_feats,
+                                       feat_list)), 7)
+                    for coh, trnsf_fl in coh_dict.items()
+                    }
 
-        else:
-            del(out_pars[mtype])
-            del(out_time[mtype])
-            del(out_acc[mtype])
-            del(out_pred[mtype])
-            del(out_coef[mtype])
-            del(out_trnsf[mtype])
+            task_ckpt.add(mtype, {k: out_dict[mtype]
+                                  for k, out_dict in out_dicts.items()})
 
     # save experiment results to file
     with open(os.path.join(args.use_dir, 'output',
                            "out__cv-{}_task-{}.p".format(
                                args.cv_id, args.task_id)),
               'wb') as fl:
-        pickle.dump({'Pred': out_pred, 'Pars': out_pars, 'Time': out_time,
-                     'Acc': out_acc, 'Coef': out_coef, 'Transfer': out_trnsf,
-                     'Clf': mut_clf.__class__},
-                    fl, protocol=-1)
+        pickle.dump({**out_dicts, 'Clf': mut_clf.__class__}, fl, protocol=-1)
+
+    task_ckpt.close(remove=True)
 
 
 if __name__ == "__main__":
@@ -12,9 +12,11 @@ Example usage:
 """
 
 from ..utilities.mutations import copy_mtype, RandomType
-from ..utilities.pipeline_setup import get_task_count
+from ..utilities.pipeline_setup import get_task_count, get_task_assignment
 from ..utilities.misc import compare_muts
-from ..utilities.metrics import calc_auc
+from ..utilities.metrics import calc_auc_dict
+from ..utilities.bootstrap import get_sub_inds, calc_conf_aucs
+from ..utilities.sample_sets import load_pheno_index
 from ...features.cohorts.utils import get_cohort_subtypes
 
 import os
@@ -26,18 +28,19 @@ import dill as pickle
 import numpy as np
 import pandas as pd
 
-from joblib import Parallel, delayed
 import random
-from itertools import cycle
 
 
-def transfer_signatures(trnsf_cdata, orig_samps,
-                        pred_df, mtype_list, subt_smps=None):
+def transfer_signatures(trnsf_cdata, orig_samps, pred_df, mtype_list,
+                        subt_smps=None, pheno_indx=None):
     """
     Utility function for getting phenotypic data and calculating AUCs for a
     "transfer" cohort to which trained subgrouping classifiers were applied
     after being trained on the primary cohort used in this experiment.
 
+    Mutation statuses are read from the cohort's phenotype index saved during
+    setup if one is given, and otherwise found using the cohort itself.
+
     """
     use_muts = {mtype for mtype in mtype_list
                 if not isinstance(mtype, RandomType)}
@@ -60,48 +63,28 @@ def transfer_signatures(trnsf_cdata, orig_samps,
 
     # gets the phenotypic data for the subgroupings enumerated for this
     # experiment in the context of the transfer cohort
-    pheno_dict = {mtype: np.array(trnsf_cdata.train_pheno(mtype))[~sub_stat]
-                  for mtype in use_muts}
+    if pheno_indx is None:
+        pheno_dict = {mtype: np.array(trnsf_cdata.train_pheno(mtype))
+                      for mtype in use_muts}
+
+    else:
+        pheno_dict = {
+            mtype: pheno_indx.get_pheno(mtype,
+                                        trnsf_cdata.get_train_samples())
+            for mtype in use_muts
+            }
+
+    pheno_dict = {mtype: phn[~sub_stat] for mtype, phn in pheno_dict.items()}
     use_muts = {mtype for mtype in use_muts if pheno_dict[mtype].sum() >= 20}
     auc_dict = dict()
 
     # if any of this experiment's subgroupings are mutated in enough samples
     # in the transfer cohort, calculate transfer AUCs
     if use_muts:
-        auc_dict = {
-            'all': pd.Series(dict(zip(use_muts, Parallel(
-                n_jobs=12, prefer='threads', pre_dispatch=120)(
-                    delayed(calc_auc)(pred_df.loc[mtype].T[~sub_stat],
-                                      pheno_dict[mtype])
-                    for mtype in use_muts
-                    )
-                ))),
-
-            'CV': pd.DataFrame.from_records(
-                tuple(zip(cycle(use_muts), Parallel(
-                    n_jobs=12, prefer='threads', pre_dispatch=120)(
-                        delayed(calc_auc)(
-                            pred_df.loc[mtype].T[~sub_stat, cv_id],
-                            pheno_dict[mtype]
-                            )
-                        for cv_id in range(40) for mtype in use_muts
-                        )
-                    ))
-                ).pivot_table(index=0, values=1, aggfunc=list).iloc[:, 0],
-
-            'mean': pd.Series(dict(zip(use_muts, Parallel(
-                n_jobs=12, prefer='threads', pre_dispatch=120)(
-                    delayed(calc_auc)(
-                        pred_df.loc[mtype].T[~sub_stat].mean(axis=1),
-                        pheno_dict[mtype]
-                        )
-                    for mtype in use_muts
-                    )
-                )))
-            }
-
-        auc_dict['CV'].name = None
-        auc_dict['CV'].index.name = None
+        auc_dict = calc_auc_dict(
+            {mtype: pred_df.loc[mtype].T[~sub_stat] for mtype in use_muts},
+            pheno_dict
+            )
 
     return pheno_dict, auc_dict
 
@@ -166,28 +149,52 @@ def main():
         for cv_id in range(40)
         }
 
-    # initialize object that will store raw experiment output data
-    out_dfs = {k: [None for cv_id in range(40)]
-               for k in ['Pred', 'Pars', 'Time', 'Acc', 'Coef', 'Transfer']}
-    out_clf = None
-    out_tune = None
-
     # figure out which experiment subgroupings were assigned to these tasks
+    task_dict = get_task_assignment(args.use_dir, muts_list)
     random.seed(10301)
     random.shuffle(muts_list)
-    use_muts = [mut for i, mut in enumerate(muts_list)
-                if i % task_count in use_tasks]
+    use_muts = [mut for mut in muts_list if task_dict[mut] in use_tasks]
+
+    # initialize the arrays the output of each cross-validation fold will be
+    # folded into, indexed by subgrouping and by sample or gene feature
+    mut_indx = {mut: i for i, mut in enumerate(use_muts)}
+    cdata_samps = sorted(cdata.get_samples())
+    samp_indx = {samp: j for j, samp in enumerate(cdata_samps)}
+    feat_list = sorted(use_feats)
+    feat_indx = {gene: j for j, gene in enumerate(feat_list)}
+
+    pred_arr = np.full((len(use_muts), len(cdata_samps), 10), np.nan)
+    coef_arr = np.zeros((len(use_muts), len(feat_list), 40))
+    trnsf_arrs = dict()
+
+    # smaller outputs are kept as one data frame per fold
+    out_dfs = {k: [None for cv_id in range(40)]
+               for k in ['Pars', 'Time', 'Acc']}
+    out_clf = None
+    out_tune = None
 
     # for the output files corresponding to each cross-validation ID...
     for cv_id, out_fls in file_sets.items():
-        out_list = []
+        fold_muts = {k: [] for k in ['Pred', 'Pars', 'Time', 'Acc',
+                                     'Coef', 'Transfer']}
+        fold_dfs = {k: [] for k in out_dfs}
+
+        # recover the cohort training/testing data split that was
+        # used to generate the results in this fold
+        cdata_samps = sorted(cdata.get_samples())
+        random.seed((cv_id // 4) * 7712 + 13)
+        random.shuffle(cdata_samps)
+
+        cdata.update_split(9073 + 97 * cv_id,
+                           test_samps=cdata_samps[(cv_id % 4)::4])
+        test_indx = [samp_indx[samp] for samp in cdata.get_test_samples()]
 
-        # ...read in the data from each file
+        # ...read in the data from each file and fold it into the output
+        # arrays before moving on to the next file
         for out_fl in out_fls:
             with open(out_fl, 'rb') as f:
-                out_list += [pickle.load(f)]
+                out_dicts = pickle.load(f)
 
-        for out_dicts in out_list:
             if out_clf is None:
                 out_clf = out_dicts['Clf']
 
@@ -204,45 +211,48 @@ def main():
                     "one set of tuning priors!"
                     )
 
-        out_dfs['Coef'][cv_id] = pd.DataFrame({
-            mut: out_vals for out_dicts in out_list
-            for mut, out_vals in out_dicts['Coef'].items()
-            }).transpose().fillna(0.0)
+            for k in fold_muts:
+                fold_muts[k] += list(out_dicts[k])
 
-        # accounts for gene features which could have been included in a
-        # subgrouping model but were not included in any
-        out_dfs['Coef'][cv_id] = out_dfs['Coef'][cv_id].assign(
-            **{gene: 0
-               for gene in use_feats - set(out_dfs['Coef'][cv_id].columns)}
-            )
+            # each sample is tested exactly once in each set of four folds
+            for mut, pred_vals in out_dicts['Pred'].items():
+                pred_arr[mut_indx[mut], test_indx, cv_id // 4] = pred_vals
+
+            # coefficients of features not enumerated during setup are left
+            # out, while those of features a model did not use stay at zero
+            for mut, coef_vals in out_dicts['Coef'].items():
+                use_coefs = [(feat_indx[gene], coef_val)
+                             for gene, coef_val in coef_vals.items()
+                             if gene in feat_indx]
+
+                if use_coefs:
+                    coef_arr[mut_indx[mut], [j for j, _ in use_coefs],
+                             cv_id] = [coef_val for _, coef_val in use_coefs]
+
+            for mut, trnsf_preds in out_dicts['Transfer'].items():
+                for coh, trnsf_vals in trnsf_preds.items():
+                    if coh not in trnsf_arrs:
+                        trnsf_arrs[coh] = np.full(
+                            (len(use_muts), 40, len(trnsf_vals)), np.nan)
+
+                    trnsf_arrs[coh][mut_indx[mut], cv_id] = trnsf_vals
+
+            for k in fold_dfs:
+                fold_dfs[k] += [pd.DataFrame.from_dict(out_dicts[k],
+                                                       orient='index')]
 
-        for k in out_dfs:
-            if k != 'Coef':
-                out_dfs[k][cv_id] = pd.concat([
-                    pd.DataFrame.from_dict(out_dicts[k], orient='index')
-                    for out_dicts in out_list
-                    ])
+            del out_dicts
 
-            assert sorted(out_dfs[k][cv_id].index) == sorted(use_muts), (
+        for k, muts in fold_muts.items():
+            assert sorted(muts) == sorted(use_muts), (
                 "Mutations with predictions for c-v fold <{}> don't "
                 "match those enumerated during setup!".format(cv_id)
                 )
 
-        # recover the cohort training/testing data split that was
-        # used to generate the results in this file
-        cdata_samps = sorted(cdata.get_samples())
-        random.seed((cv_id // 4) * 7712 + 13)
-        random.shuffle(cdata_samps)
-
-        cdata.update_split(9073 + 97 * cv_id,
-                           test_samps=cdata_samps[(cv_id % 4)::4])
-        test_samps = cdata.get_test_samples()
-        out_dfs['Pred'][cv_id].columns = test_samps
+        for k, dfs in fold_dfs.items():
+            out_dfs[k][cv_id] = pd.concat(dfs)
 
-    pred_df = pd.concat(out_dfs['Pred'], axis=1)
-    assert all(smp in pred_df.columns for smp in cdata.get_samples()), (
-        "Missing mutation scores for some samples in the cohort!")
-    assert (pred_df.columns.value_counts() == 10).all(), (
+    assert not np.isnan(pred_arr).any(), (
         "Inconsistent number of CV scores across cohort samples!")
 
     pars_df = pd.concat(out_dfs['Pars'], axis=1)
@@ -261,15 +271,17 @@ def main():
     assert (acc_df.applymap(len) == out_clf.test_count).values.all(), (
         "Algorithm tuning stats missing for some hyper-parameter values!")
 
-    coef_df = pd.concat(out_dfs['Coef'], axis=1)
-    assert (coef_df.columns.value_counts() == 40).all(), (
-        "Inconsistent number of model coefficients across cv-folds!")
+    # gene features that were not included in a subgrouping's model in a
+    # given fold are assigned coefficients of zero
+    coef_df = pd.concat([pd.DataFrame(coef_arr[..., cv_id], index=use_muts,
+                                      columns=feat_list)
+                         for cv_id in range(40)], axis=1)
 
-    trnsf_df = pd.concat(out_dfs['Transfer'], axis=1)
-    assert (trnsf_df.columns.value_counts() == 40).all(), (
+    assert not any(np.isnan(trnsf_arr).any()
+                   for trnsf_arr in trnsf_arrs.values()), (
         "Inconsistent number of predicted scores across transfer cohorts!")
 
-    for out_df in [pred_df, pars_df, time_df, acc_df, coef_df, trnsf_df]:
+    for out_df in [pars_df, time_df, acc_df, coef_df]:
         assert compare_muts(out_df.index, use_muts), (
             "Mutations for which predictions were made do not match the list "
             "of mutations enumerated during setup!"
@@ -281,8 +293,8 @@ def main():
         pickle.dump(coef_df, fl, protocol=-1)
 
     pred_df = pd.DataFrame({
-        mtype: pred_df.loc[mtype].groupby(level=0).apply(lambda x: x.values)
-         for mtype in use_muts
+        mtype: pd.Series(list(pred_arr[i]), index=sorted(samp_indx))
+        for mtype, i in mut_indx.items()
         }).transpose()
 
     assert (pred_df.applymap(len) == 10).values.all(), (
@@ -300,57 +312,29 @@ def main():
 
     cdata.update_split(test_prop=0)
     train_samps = np.array(cdata.get_train_samples())
-    pheno_dict = {mtype: np.array(cdata.train_pheno(mtype))
-                  for mtype in use_muts}
+
+    # uses the mutation statuses found during setup where available
+    pheno_indx = load_pheno_index(os.path.join(args.use_dir, 'setup'))
+    if pheno_indx is None:
+        pheno_dict = {mtype: np.array(cdata.train_pheno(mtype))
+                      for mtype in use_muts}
+    else:
+        pheno_dict = {mtype: pheno_indx.get_pheno(mtype, train_samps)
+                      for mtype in use_muts}
 
     with bz2.BZ2File(os.path.join(args.use_dir, 'merge',
                                   "out-pheno{}.p.gz".format(out_tag)),
                      'w') as fl:
         pickle.dump(pheno_dict, fl, protocol=-1)
 
-    # calculates AUCs for prediction tasks using scores from all
-    # cross-validations concatenated together...
-    auc_dict = {
-        'all': pd.Series(dict(zip(use_muts, Parallel(
-            n_jobs=12, prefer='threads', pre_dispatch=120)(
-                delayed(calc_auc)(
-                    np.vstack(pred_df.loc[mtype][train_samps].values),
-                    pheno_dict[mtype]
-                    )
-                for mtype in use_muts
-                )
-            ))),
-
-        # ...and for each cross-validation run considered separately...
-        'CV': pd.DataFrame.from_records(
-            tuple(zip(cycle(use_muts), Parallel(
-                n_jobs=12, prefer='threads', pre_dispatch=120)(
-                    delayed(calc_auc)(
-                        np.vstack(pred_df.loc[
-                            mtype][train_samps].values)[:, cv_id],
-                        pheno_dict[mtype]
-                        )
-                    for cv_id in range(10) for mtype in use_muts
-                    )
-                ))
-            ).pivot_table(index=0, values=1, aggfunc=list).iloc[:, 0],
-
-        # ...and finally using the average of predicted scores for each
-        # sample across CV runs
-        'mean': pd.Series(dict(zip(use_muts, Parallel(
-            n_jobs=12, prefer='threads', pre_dispatch=120)(
-                delayed(calc_auc)(
-                    np.vstack(pred_df.loc[
-                        mtype][train_samps].values).mean(axis=1),
-                    pheno_dict[mtype]
-                    )
-                for mtype in use_muts
-                )
-            )))
-        }
+    pred_mats = {mtype: np.vstack(pred_df.loc[mtype][train_samps].values)
+                 for mtype in use_muts}
 
-    auc_dict['CV'].name = None
-    auc_dict['CV'].index.name = None
+    # calculates AUCs for prediction tasks using scores from all
+    # cross-validations concatenated together, for each cross-validation run
+    # considered separately, and using the average of predicted scores for
+    # each sample across CV runs
+    auc_dict = calc_auc_dict(pred_mats, pheno_dict)
 
     with bz2.BZ2File(os.path.join(args.use_dir, 'merge',
                                   "out-aucs{}.p.gz".format(out_tag)),
@@ -358,26 +342,12 @@ def main():
         pickle.dump(auc_dict, fl, protocol=-1)
 
     # creates down-sampled sets of cohort tumor samples
-    random.seed(7609)
-    sub_inds = [random.choices([False, True], k=len(cdata.get_samples()))
-                for _ in range(1000)]
+    sub_inds = get_sub_inds(len(cdata.get_samples()), 1000, seed=7609)
 
     # calculates down-sampled AUCs
-    conf_df = pd.DataFrame.from_records(
-        tuple(zip(cycle(use_muts), Parallel(
-            n_jobs=12, prefer='threads', pre_dispatch=120)(
-                delayed(calc_auc)(
-                    np.vstack(pred_df.loc[
-                        mtype][train_samps[sub_indx]].values).mean(axis=1),
-                    pheno_dict[mtype][sub_indx]
-                    )
-                for sub_indx in sub_inds for mtype in use_muts
-                )
-            ))
-        ).pivot_table(index=0, values=1, aggfunc=list).iloc[:, 0]
-
-    conf_df.name = None
-    conf_df.index.name = None
+    mean_dict = {mtype: pred_mat.mean(axis=1)
+                 for mtype, pred_mat in pred_mats.items()}
+    conf_df = calc_conf_aucs(mean_dict, pheno_dict, sub_inds)
 
     with bz2.BZ2File(os.path.join(args.use_dir, 'merge',
                                   "out-conf{}.p.gz".format(out_tag)),
@@ -386,8 +356,8 @@ def main():
 
     # consolidates predictions made by subgrouping models on other cohorts
     trnsf_df = pd.DataFrame(
-        {coh: {mtype: np.vstack(vals) for mtype, vals in trnsf_mat.iterrows()}
-         for coh, trnsf_mat in trnsf_df.groupby(level=0, axis=1)}
+        {coh: {mtype: trnsf_arrs[coh][i] for mtype, i in mut_indx.items()}
+         for coh in sorted(trnsf_arrs)}
         )
 
     # finds -omic datasets for the other cohorts
@@ -400,6 +370,8 @@ def main():
     for coh, coh_fl in coh_dict.items():
         with open(coh_fl, 'rb') as f:
             trnsf_cdata = pickle.load(f)
+        trnsf_indx = load_pheno_index(os.path.join(args.use_dir, 'setup'),
+                                      coh)
 
         # if this isn't the same cohort as the one the experiment used, and
         # this cohort had any mutations in the genes used in the experiment...
@@ -414,7 +386,8 @@ def main():
                 trnsf_dict[coh].update(
                     zip(['Pheno', 'AUC'],
                         transfer_signatures(trnsf_cdata, cdata_samps,
-                                            trnsf_df[coh], use_muts))
+                                            trnsf_df[coh], use_muts,
+                                            pheno_indx=trnsf_indx))
                     )
 
             # where applicable, get phenotypes and transfer AUCs using the
@@ -431,7 +404,7 @@ def main():
                             ['Pheno', 'AUC'],
                             transfer_signatures(trnsf_cdata, cdata_samps,
                                                 trnsf_df[coh], use_muts,
-                                                subt_smps)
+                                                subt_smps, trnsf_indx)
                             ))
                         }
 
@@ -11,6 +11,8 @@ Example usage:
 
 """
 
+from ..utilities.output_store import write_output_store
+
 import os
 import argparse
 import bz2
@@ -71,6 +73,11 @@ def main():
     with bz2.BZ2File(os.path.join(args.use_dir, "out-pred.p.gz"), 'w') as fl:
         pickle.dump(pred_df, fl, protocol=-1)
 
+    # save predicted labels, coefficients, and statuses in a format allowing
+    # for the output of individual genes' subgroupings to be read separately
+    write_output_store(os.path.join(args.use_dir, "out-store"),
+                       pred_df, coef_df, pheno_dict)
+
     # concatenate subgrouping model tuning performances
     tune_dfs = [pd.DataFrame() for _ in range(3)] + [None]
     for tune_file in Path(args.use_dir, 'merge').glob("out-tune_*.p.gz"):
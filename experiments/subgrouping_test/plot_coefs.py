@@ -8,6 +8,8 @@ from .utils import filter_mtype
 from ..utilities.colour_maps import variant_clrs
 from ..utilities.labels import get_fancy_label
 from ..utilities.label_placement import place_scatter_labels
+from ..utilities.output_store import (
+    load_store_index, load_store_gene, load_store_coefs)
 
 import os
 import argparse
@@ -424,36 +426,54 @@ def main():
         else:
             cdata.merge(new_cdata, use_genes=[args.gene])
 
-        with bz2.BZ2File(os.path.join(base_dir, out_tag,
-                                      "out-pred__{}__{}.p.gz".format(
-                                          lvls, args.classif)),
-                         'r') as f:
-            pred_data = pickle.load(f)
-
-        pred_dict[lvls] = pred_data.loc[[mtype for mtype in pred_data.index
-                                         if filter_mtype(mtype, args.gene)]]
-
-        with bz2.BZ2File(os.path.join(base_dir, out_tag,
-                                      "out-pheno__{}__{}.p.gz".format(
-                                          lvls, args.classif)),
-                         'r') as f:
-            phn_data = pickle.load(f)
-
-        phn_dict.update({mtype: phn for mtype, phn in phn_data.items()
-                         if filter_mtype(mtype, args.gene)})
+        # only read the output of this gene's subgroupings if the output was
+        # also saved in an array store
+        store_dir = os.path.join(base_dir, out_tag, "out-store__{}__{}".format(
+            lvls, args.classif))
 
-        with bz2.BZ2File(os.path.join(base_dir, out_tag,
-                                      "out-coef__{}__{}.p.gz".format(
-                                          lvls, args.classif)),
-                         'r') as f:
-            coef_data = pickle.load(f)
+        if os.path.isdir(store_dir):
+            store_index = load_store_index(store_dir)
+            pred_dict[lvls] = load_store_gene(store_dir, args.gene, 'pred',
+                                              store_index)
+            phn_dict.update(load_store_gene(store_dir, args.gene, 'pheno',
+                                            store_index))
+            coef_data = load_store_coefs(store_dir, args.gene, store_index)
 
-        coef_data = coef_data.iloc[:, [(cdata.gene_annot[gene]['Chr']
-                                        != cdata.gene_annot[args.gene]['Chr'])
-                                       for gene in coef_data.columns]]
+        else:
+            with bz2.BZ2File(os.path.join(base_dir, out_tag,
+                                          "out-pred__{}__{}.p.gz".format(
+                                              lvls, args.classif)),
+                             'r') as f:
+                pred_data = pickle.load(f)
+
+            pred_dict[lvls] = pred_data.loc[[
+                mtype for mtype in pred_data.index
+                if filter_mtype(mtype, args.gene)
+                ]]
+
+            with bz2.BZ2File(os.path.join(base_dir, out_tag,
+                                          "out-pheno__{}__{}.p.gz".format(
+                                              lvls, args.classif)),
+                             'r') as f:
+                phn_data = pickle.load(f)
+
+            phn_dict.update({mtype: phn for mtype, phn in phn_data.items()
+                             if filter_mtype(mtype, args.gene)})
+
+            with bz2.BZ2File(os.path.join(base_dir, out_tag,
+                                          "out-coef__{}__{}.p.gz".format(
+                                              lvls, args.classif)),
+                             'r') as f:
+                coef_data = pickle.load(f)
+
+            coef_data = coef_data.loc[[mtype for mtype in coef_data.index
+                                       if filter_mtype(mtype, args.gene)]]
 
-        coef_dict[lvls] = coef_data.loc[[mtype for mtype in coef_data.index
-                                         if filter_mtype(mtype, args.gene)]]
+        coef_dict[lvls] = coef_data.iloc[
+            :, [(cdata.gene_annot[gene]['Chr']
+                 != cdata.gene_annot[args.gene]['Chr'])
+                for gene in coef_data.columns]
+            ]
 
         with bz2.BZ2File(os.path.join(base_dir, out_tag,
                                       "out-aucs__{}__{}.p.gz".format(
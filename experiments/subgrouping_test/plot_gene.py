@@ -18,6 +18,7 @@ from ..utilities.label_placement import place_scatter_labels
 from ..utilities.colour_maps import auc_cmap
 from ..utilities.metrics import calc_conf
 from ..utilities.misc import get_label, get_subtype
+from ..utilities.output_store import load_store_gene
 
 import os
 import argparse
@@ -510,14 +511,23 @@ def main():
     for (src, coh, lvls, clf), ctf in tuple(out_use.iteritems()):
         out_tag = "{}__{}__samps-{}".format(src, coh, ctf)
 
-        with bz2.BZ2File(os.path.join(base_dir, out_tag,
-                                      "out-pheno__{}__{}.p.gz".format(
-                                          lvls, clf)),
-                         'r') as f:
-            phns = pickle.load(f)
+        # only read the statuses of this gene's subgroupings if the output
+        # was also saved in an array store
+        store_dir = os.path.join(base_dir, out_tag,
+                                 "out-store__{}__{}".format(lvls, clf))
 
-        phn_vals = {mtype: phn for mtype, phn in phns.items()
-                    if filter_mtype(mtype, args.gene)}
+        if os.path.isdir(store_dir):
+            phn_vals = load_store_gene(store_dir, args.gene, 'pheno')
+
+        else:
+            with bz2.BZ2File(os.path.join(base_dir, out_tag,
+                                          "out-pheno__{}__{}.p.gz".format(
+                                              lvls, clf)),
+                             'r') as f:
+                phns = pickle.load(f)
+
+            phn_vals = {mtype: phn for mtype, phn in phns.items()
+                        if filter_mtype(mtype, args.gene)}
 
         if phn_vals:
             if (src, coh) in phn_dict:
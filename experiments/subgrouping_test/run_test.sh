@@ -16,9 +16,10 @@ start_time=$( date +%s )
 source activate research
 rewrite=false
 count_only=false
+batch=false
 
 # collect command line arguments
-while getopts :e:t:s:l:c:m:rn var
+while getopts :e:t:s:l:c:m:rnb var
 do
 	case "$var" in
 		e)  expr_source=$OPTARG;;
@@ -29,6 +30,7 @@ do
 		m)  test_max=$OPTARG;;
 		r)  rewrite=true;;
 		n)  count_only=true;;
+		b)  batch=true;;
 		[?])  echo "Usage: $0 " \
 				"[-e] cohort expression source" \
 				"[-t] tumour cohort" \
@@ -37,7 +39,8 @@ do
 				"[-c] mutation classifier" \
 				"[-m] maximum number of tests per node" \
 				"[-r] rewrite existing results?" \
-				"[-n] only enumerate, don't classify?"
+				"[-n] only enumerate, don't classify?" \
+				"[-b] fit subgroupings of the same gene in batches?"
 			exit 1;;
 	esac
 done
@@ -73,7 +76,8 @@ dvc run -d $COH_DIR -d $GENCODE_DIR -d $ONCOGENE_LIST \
 	-o setup/muts-list.p -m setup/muts-count.txt \
 	-f setup.dvc --overwrite-dvcfile \
 	python -m dryads-research.experiments.subgrouping_test.setup_test \
-	$expr_source $cohort $samp_cutoff $mut_levels $OUTDIR
+	$expr_source $cohort $samp_cutoff $mut_levels $OUTDIR \
+	--cores=${SLURM_CPUS_PER_TASK:-1}
 
 # how long is this pipeline allowed to run for?
 if [ -z ${SBATCH_TIMELIMIT+x} ]
@@ -108,6 +112,10 @@ then
 	then
 		task_size=3.7
 		samp_exp=0.5
+	elif [ $classif == 'RidgePath' ] || [ $classif == 'RidgeMoreTunePath' ]
+	then
+		task_size=1.3
+		samp_exp=0.5
 
 	elif [ $classif == 'SVCrbf' ]
 	then
@@ -122,7 +130,8 @@ then
   # calculate the runtime of a single classification task
 	eval "$( python -m dryads-research.experiments.utilities.pipeline_setup \
 		$OUTDIR $time_max --merge_max=$merge_max \
-		--task_size=$task_size --samp_exp=$samp_exp )"
+		--task_size=$task_size --samp_exp=$samp_exp \
+		--classif=$classif --cost_dir=$DATADIR/dryads-research/subgrouping_test )"
 fi
 
 # if we are only enumerating, we quit before classification jobs are launched
@@ -148,9 +157,12 @@ dvc run -d setup/muts-list.p -d $RUNDIR/fit_test.py -O out-conf.p.gz \
 	--mem-per-cpu {cluster.mem-per-cpu} --exclude=$ex_nodes --no-requeue" \
 	--config expr_source='"$expr_source"' cohort='"$cohort"' \
 	samp_cutoff='"$samp_cutoff"' mut_levels='"$mut_levels"' \
-	classif='"$classif"' time_max='"$run_time"' merge_max='"$merge_time"
+	classif='"$classif"' time_max='"$run_time"' merge_max='"$merge_time"' \
+	batch='"$batch"
 
 # final cleanup duties
-rm $OUTDIR/setup/cohort-data__*
+rm -f $OUTDIR/setup/cohort-data__* $OUTDIR/setup/trnsf-expr__* \
+	$OUTDIR/setup/cohort-expr.npy $OUTDIR/setup/cohort-expr__labels.p \
+	$OUTDIR/setup/cohort-muts.p
 cp output.dvc $FINALDIR/output__${mut_levels}__${classif}.dvc
 
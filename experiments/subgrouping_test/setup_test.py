@@ -21,24 +21,116 @@ Example usages:
 
 from ..utilities.mutations import (pnt_mtype, copy_mtype,
                                    dup_mtype, loss_mtype, RandomType)
+from ..utilities.sample_sets import (SampleIndex, count_samples,
+                                     equal_samples, write_pheno_index)
 from dryadic.features.mutations import MuType
 
+from ..utilities.handle_input import save_data, write_shared_cohort
 from ..utilities.data_dirs import vep_cache_dir, expr_sources
+from ..utilities.run_local import get_resources
 from ...features.data.oncoKB import get_gene_list
-from ...features.cohorts.utils import get_cohort_data, load_cohort
+from ...features.cohorts.utils import get_cached_cohort, load_cohort
 from ...features.cohorts.tcga import list_cohorts
 
 import os
 import argparse
-import bz2
+import shutil
 import dill as pickle
-import subprocess
+from multiprocessing import Pool
 
 import numpy as np
 import random
 from itertools import product
 
 
+def setup_transfer(coh, lvl_list, coh_dir, out_path, use_genes,
+                   trnsf_mtypes):
+    """Prepares a cohort that subgrouping classifiers will be transferred to.
+
+    Cohorts are stored in a directory shared by all runs of the experiment,
+    along with a header listing the mutation levels and the expression
+    features of each cohort. A cohort is only loaded in full and saved again
+    when a run adds mutation levels to it, and is linked into the run's own
+    setup directory instead of being copied there.
+
+    Args:
+        coh (str): The transfer cohort.
+        lvl_list (tuple): The mutation levels used by this run.
+        coh_dir (str): Where transfer cohorts are shared across runs.
+        out_path (str): Where this run's setup output is saved.
+        use_genes (set): The genes whose mutations are loaded.
+        trnsf_mtypes (list): The subgroupings to find the statuses of.
+
+    Returns:
+        coh_feats (set): The expression features of the cohort.
+
+    """
+    coh_base = coh.split('_')[0]
+
+    # choose a default source of expression data
+    if coh_base in {'METABRIC', 'CCLE'}:
+        use_src = 'microarray'
+    elif coh_base in {'beatAML'}:
+        use_src = 'toil__gns'
+    else:
+        use_src = 'Firehose'
+
+    # figure out where to store the cohort's pickled representation, along
+    # with a copy of its mutation data alone and a header describing it
+    coh_tag = "cohort-data__{}__{}.p".format(use_src, coh)
+    coh_path = os.path.join(coh_dir, coh_tag)
+    muts_path = os.path.join(coh_dir, coh_tag.replace('cohort-data__',
+                                                      'cohort-muts__'))
+    head_path = os.path.join(coh_dir, coh_tag.replace('cohort-data__',
+                                                      'cohort-head__'))
+
+    coh_head = None
+    if all(os.path.exists(pth) for pth in [coh_path, muts_path, head_path]):
+        with open(head_path, 'rb') as f:
+            coh_head = pickle.load(f)
+
+    # if the stored cohort already has the mutation levels needed, only its
+    # mutation data is loaded, as that is all the phenotype index uses
+    if coh_head is not None and (
+            coh == 'CCLE' or any(tuple(mtree_lvls[-len(lvl_list):])
+                                 == tuple(lvl_list)
+                                 for mtree_lvls in coh_head['Levels'])):
+        with open(muts_path, 'rb') as f:
+            write_pheno_index(out_path, pickle.load(f), trnsf_mtypes, coh=coh)
+
+    # otherwise, load and process the cohort's -omic datasets and save them
+    # again, writing the header last so that it only lists complete copies
+    else:
+        trnsf_cdata = load_cohort(coh, use_src, lvl_list, vep_cache_dir,
+                                  coh_path, out_path, use_genes)
+        write_pheno_index(out_path, trnsf_cdata, trnsf_mtypes, coh=coh)
+
+        coh_head = {'Levels': sorted(trnsf_cdata.mtrees),
+                    'Feats': set(trnsf_cdata.get_features())}
+        save_data(trnsf_cdata, coh_path, codec='pickle')
+
+        expr_df = trnsf_cdata.omic_data
+        trnsf_cdata.omic_data = expr_df.iloc[:, :0]
+        save_data(trnsf_cdata, muts_path, codec='pickle')
+        trnsf_cdata.omic_data = expr_df
+
+        save_data(coh_head, head_path, codec='pickle')
+
+    # hard-links the stored cohort into this run's setup directory, falling
+    # back to copying it if the two directories are on different devices
+    lnk_path = os.path.join(out_path, coh_tag)
+    tmp_path = "{}.{}.tmp".format(lnk_path, os.getpid())
+
+    try:
+        os.link(coh_path, tmp_path)
+    except OSError:
+        shutil.copyfile(coh_path, tmp_path)
+
+    os.replace(tmp_path, lnk_path)
+
+    return coh_head['Feats']
+
+
 def main():
     parser = argparse.ArgumentParser(
         'setup_test',
@@ -58,6 +150,15 @@ def main():
     parser.add_argument('out_dir', type=str,
                         help="the working directory for this experiment")
 
+    parser.add_argument(
+        "--cores", '-c', type=int, default=1,
+        help="how many transfer cohorts to set up at once"
+        )
+    parser.add_argument(
+        "--coh_mem", type=float, default=16,
+        help="how much memory (GB) setting up each transfer cohort needs"
+        )
+
     # parse command line arguments, figure out where output will be stored,
     # get the mutation attributes and cancer genes that will be used
     args = parser.parse_args()
@@ -66,51 +167,58 @@ def main():
     use_genes = get_gene_list(min_sources=2)
 
     # load and process the -omic datasets for this cohort
-    cdata = get_cohort_data(args.cohort, args.expr_source, lvl_list,
-                            vep_cache_dir, out_path, use_genes)
-    with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
-        pickle.dump(cdata, f, protocol=-1)
+    cdata = get_cached_cohort(args.cohort, args.expr_source, lvl_list,
+                              vep_cache_dir, out_path, use_genes)
+    save_data(cdata, os.path.join(out_path, "cohort-data.p.gz"), codec='bz2')
+    write_shared_cohort(cdata, out_path)
 
     # get the maximum number of samples allowed per subgrouping, initialize
     # the list of enumerated subgroupings
     max_samps = len(cdata.get_samples()) - args.samp_cutoff
+    samp_indx = SampleIndex(cdata.get_samples())
     use_mtypes = set()
 
     # for each gene with enough samples harbouring its point mutations in the
     # cohort, find the subgroupings composed of at most two branches
     for gene, mtree in cdata.mtrees[lvl_list]:
-        if len(pnt_mtype.get_samples(mtree)) >= args.samp_cutoff:
-            pnt_mtypes = {
+        if (count_samples(samp_indx.get_bits(pnt_mtype, mtree))
+                >= args.samp_cutoff):
+            pnt_bits = samp_indx.pack(mtree['Point'].get_samples())
+
+            pnt_mtypes = sorted(
                 mtype for mtype in mtree['Point'].combtypes(
                     comb_sizes=(1, 2), min_type_size=args.samp_cutoff)
                 if (args.samp_cutoff
-                    <= len(mtype.get_samples(mtree)) <= max_samps)
-                }
+                    <= count_samples(samp_indx.get_bits(mtype, mtree))
+                    <= max_samps)
+                )
 
             # remove subgroupings that have only one child subgrouping
             # containing all of their samples
-            pnt_mtypes -= {
-                mtype1 for mtype1, mtype2 in product(pnt_mtypes, repeat=2)
-                if mtype1 != mtype2 and mtype1.is_supertype(mtype2)
-                and mtype1.get_samples(mtree) == mtype2.get_samples(mtree)
+            same_samps = equal_samples(np.array([
+                samp_indx.get_bits(mtype, mtree) for mtype in pnt_mtypes]))
+            np.fill_diagonal(same_samps, False)
+
+            pnt_mtypes = set(pnt_mtypes) - {
+                pnt_mtypes[i] for i, j in zip(*np.nonzero(same_samps))
+                if pnt_mtypes[i].is_supertype(pnt_mtypes[j])
                 }
 
             # remove groupings that contain all of the gene's point mutations
-            pnt_mtypes = {MuType({('Scale', 'Point'): mtype})
-                          for mtype in pnt_mtypes
-                          if (len(mtype.get_samples(mtree['Point']))
-                              < len(mtree['Point'].get_samples()))}
+            pnt_mtypes = {
+                MuType({('Scale', 'Point'): mtype}) for mtype in pnt_mtypes
+                if (count_samples(samp_indx.get_bits(mtype, mtree['Point']))
+                    < count_samples(pnt_bits))
+                }
 
             # check if this gene had at least five samples with deep gains or
             # deletions that weren't all already carrying point mutations
             copy_mtypes = {
                 mtype for mtype in [dup_mtype, loss_mtype]
-                if ((5 <= len(mtype.get_samples(mtree))
+                if ((5 <= count_samples(samp_indx.get_bits(mtype, mtree))
                      <= (len(cdata.get_samples()) - 5))
-                    and not (mtype.get_samples(mtree)
-                             <= mtree['Point'].get_samples())
-                    and not (mtree['Point'].get_samples()
-                             <= mtype.get_samples(mtree)))
+                    and (samp_indx.get_bits(mtype, mtree) & ~pnt_bits).any()
+                    and (pnt_bits & ~samp_indx.get_bits(mtype, mtree)).any())
                 }
 
             # find the enumerated point mutations for this gene that can be
@@ -118,10 +226,10 @@ def main():
             dyad_mtypes = {
                 pt_mtype | cp_mtype
                 for pt_mtype, cp_mtype in product(pnt_mtypes, copy_mtypes)
-                if ((pt_mtype.get_samples(mtree)
-                     - cp_mtype.get_samples(mtree))
-                    and (cp_mtype.get_samples(mtree)
-                         - pt_mtype.get_samples(mtree)))
+                if ((samp_indx.get_bits(pt_mtype, mtree)
+                     & ~samp_indx.get_bits(cp_mtype, mtree)).any()
+                    and (samp_indx.get_bits(cp_mtype, mtree)
+                         & ~samp_indx.get_bits(pt_mtype, mtree)).any())
                 }
 
             # if we are using the base list of mutation attributes, add the
@@ -141,7 +249,8 @@ def main():
                 gene_mtypes |= {
                     pnt_mtype | mtype for mtype in copy_mtypes
                     if (args.samp_cutoff
-                        <= len((pnt_mtype | mtype).get_samples(mtree))
+                        <= count_samples(
+                            pnt_bits | samp_indx.get_bits(mtype, mtree))
                         <= max_samps)
                     }
 
@@ -158,10 +267,12 @@ def main():
     mtype_list = sorted(use_mtypes)
     random.seed((88701 * lvls_seed + 1313) % (2 ** 17))
     random.shuffle(mtype_list)
+    mtype_sizes = {mtype: len(mtype.get_samples(cdata.mtrees[lvl_list]))
+                   for mtype in mtype_list}
 
     # generate random subgroupings chosen from all samples in the cohort
     use_mtypes |= {
-        RandomType(size_dist=len(mtype.get_samples(cdata.mtrees[lvl_list])),
+        RandomType(size_dist=mtype_sizes[mtype],
                    seed=(lvls_seed * (i + 3751) + 19207) % (2 ** 26))
         for i, (mtype, _) in enumerate(product(mtype_list, range(5)))
         if (mtype & copy_mtype).is_empty()
@@ -170,7 +281,7 @@ def main():
     # generate random subgroupings chosen from samples mutated for each gene
     use_mtypes |= {
         RandomType(
-            size_dist=len(mtype.get_samples(cdata.mtrees[lvl_list])),
+            size_dist=mtype_sizes[mtype],
             base_mtype=MuType({
                 ('Gene', tuple(mtype.label_iter())[0]): pnt_mtype}),
             seed=(lvls_seed * (i + 1021) + 7391) % (2 ** 23)
@@ -187,6 +298,13 @@ def main():
     with open(os.path.join(out_path, "muts-count.txt"), 'w') as fl:
         fl.write(str(len(use_mtypes)))
 
+    # save the mutation status of each subgrouping in the cohort's samples
+    # so that later stages don't have to find them again
+    cdata.update_split(test_prop=0)
+    write_pheno_index(out_path, cdata, sorted(use_mtypes))
+    trnsf_mtypes = [mtype for mtype in sorted(use_mtypes)
+                    if not isinstance(mtype, RandomType)]
+
     # get list of available cohorts for transference of classifiers
     coh_list = list_cohorts('Firehose', expr_dir=expr_sources['Firehose'],
                             copy_dir=expr_sources['Firehose'])
@@ -199,34 +317,24 @@ def main():
     use_feats = set(cdata.get_features())
     random.seed()
 
-    # for each cohort used for transferring...
-    for coh in random.sample(coh_list, k=len(coh_list)):
-        coh_base = coh.split('_')[0]
-
-        # ...choose a default source of expression data
-        if coh_base in {'METABRIC', 'CCLE'}:
-            use_src = 'microarray'
-        elif coh_base in {'beatAML'}:
-            use_src = 'toil__gns'
-        else:
-            use_src = 'Firehose'
-
-        # ...figure out where to store its pickled representation
-        coh_tag = "cohort-data__{}__{}.p".format(use_src, coh)
-        coh_path = os.path.join(coh_dir, coh_tag)
-
-        # load and process the cohort's -omic datasets, update the list of
-        # expression features common across all cohorts
-        trnsf_cdata = load_cohort(coh, use_src, lvl_list, vep_cache_dir,
-                                  coh_path, out_path, use_genes)
-        use_feats &= set(trnsf_cdata.get_features())
-
-        with open(coh_path, 'wb') as f:
-            pickle.dump(trnsf_cdata, f, protocol=-1)
+    # set up the transfer cohorts in separate processes, each of which is
+    # replaced after one cohort so that the memory it used is freed, and of
+    # which no more are run at once than the available memory allows
+    _, mem_avail = get_resources()
+    coh_workers = max(min(args.cores, len(coh_list),
+                          int(mem_avail // args.coh_mem)), 1)
+
+    with Pool(coh_workers, maxtasksperchild=1) as pool:
+        coh_feats = pool.starmap(
+            setup_transfer,
+            [(coh, lvl_list, coh_dir, out_path, use_genes, trnsf_mtypes)
+             for coh in random.sample(coh_list, k=len(coh_list))],
+            chunksize=1
+            )
 
-        copy_prc = subprocess.run(['cp', coh_path,
-                                   os.path.join(out_path, coh_tag)],
-                                  check=True)
+    # find the expression features common across all cohorts
+    for feats in coh_feats:
+        use_feats &= feats
 
     with open(os.path.join(out_path, "feat-list.p"), 'wb') as f:
         pickle.dump(use_feats, f, protocol=-1)
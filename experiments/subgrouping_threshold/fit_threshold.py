@@ -1,13 +1,15 @@
 
 from ..utilities.classifiers import *
-from ..utilities.handle_input import safe_load
-from ..utilities.pipeline_setup import get_task_count
-from ..utilities.misc import transfer_model
+from ..utilities.classifiers import BatchLinear
+from ..utilities.handle_input import load_setup_cohort
+from ..utilities.pipeline_setup import get_task_assignment
+from ..utilities.misc import transfer_model, load_transfer_expr
 
 import os
 import argparse
 import dill as pickle
 import random
+import numpy as np
 from pathlib import Path
 
 
@@ -29,21 +31,27 @@ def main():
                         help='the subset of subtypes to assign to this task')
     parser.add_argument('--cv_id', type=int, default=0,
                         help='the subset of subtypes to assign to this task')
+    parser.add_argument(
+        '--batch', action='store_true',
+        help="share transformed features across subgroupings of each gene"
+        )
 
     args = parser.parse_args()
     setup_dir = os.path.join(args.use_dir, 'setup')
-    task_count = get_task_count(args.use_dir)
 
     with open(os.path.join(setup_dir, "muts-list.p"), 'rb') as muts_f:
         mtype_list = pickle.load(muts_f)
     with open(os.path.join(setup_dir, "feat-list.p"), 'rb') as fl:
         feat_list = pickle.load(fl)
 
-    coh_path = os.path.join(setup_dir, "cohort-data.p.gz")
-    cdata = safe_load(coh_path, retry_pause=41)
+    cdata = load_setup_cohort(setup_dir, retry_pause=41)
     clf = eval(args.classif)
     mut_clf = clf()
 
+    if args.batch and not isinstance(mut_clf, BatchLinear):
+        parser.error("Classifier `{}` cannot be fit in batches!".format(
+            args.classif))
+
     # figure out which cohort samples will be used for tuning and testing the
     # classifier and which samples will be used for testing
     use_seed = 9073 + 97 * args.cv_id
@@ -63,19 +71,57 @@ def main():
     out_trnsf = {mtype: {coh: None for coh in coh_dict}
                  for mtype in mtype_list}
 
+    task_dict = get_task_assignment(args.use_dir, mtype_list, shuffle=False)
+    task_genes = dict()
+
     # for each subtype, check if it has been assigned to this task
-    for i, mtype in enumerate(mtype_list):
-        if (i % task_count) == args.task_id:
-            print("Testing {} ...".format(mtype))
+    for mtype in mtype_list:
+        if task_dict[mtype] == args.task_id:
+            task_genes[mtype] = tuple(mtype.base_mtype.label_iter())[0]
+
+        else:
+            del(out_pars[mtype])
+            del(out_time[mtype])
+            del(out_acc[mtype])
+            del(out_pred[mtype])
+            del(out_trnsf[mtype])
+
+    # subgroupings associated with the same gene exclude the same features and
+    # can thus share transformed -omic data when fitting in batches
+    if args.batch:
+        gene_batches = dict()
+        for mtype, use_gene in task_genes.items():
+            gene_batches[use_gene] = gene_batches.get(use_gene, []) + [mtype]
+
+    else:
+        gene_batches = {None: list(task_genes)}
+
+    for batch_gene, batch_mtypes in gene_batches.items():
+        if args.batch:
+            print("Preparing features for {} ...".format(batch_gene))
 
             use_feats = feat_list - cdata.get_cis_genes(
-                'Chrm', cur_genes=[tuple(mtype.base_mtype.label_iter())[0]])
+                'Chrm', cur_genes=[batch_gene])
+            prep_data = mut_clf.prep_batch(cdata, include_feats=use_feats)
+
+        for mtype in batch_mtypes:
+            print("Testing {} ...".format(mtype))
 
             # tune the hyper-parameters of the classifier
-            mut_clf, cv_output = mut_clf.tune_coh(
-                cdata, mtype, include_feats=use_feats,
-                tune_splits=4, test_count=mut_clf.test_count, parallel_jobs=8
-                )
+            if args.batch:
+                fit_est, cv_output = mut_clf.tune_batch(
+                    prep_data, np.array(cdata.train_pheno(mtype)),
+                    tune_splits=4, parallel_jobs=8, random_state=use_seed
+                    )
+
+            else:
+                use_feats = feat_list - cdata.get_cis_genes(
+                    'Chrm', cur_genes=[task_genes[mtype]])
+
+                mut_clf, cv_output = mut_clf.tune_coh(
+                    cdata, mtype, include_feats=use_feats, tune_splits=4,
+                    test_count=mut_clf.test_count, parallel_jobs=8
+                    )
 
             # save the tuned values of the hyper-parameters
             clf_params = mut_clf.get_params()
@@ -88,24 +134,33 @@ def main():
             out_acc[mtype]['std'] = cv_output['std_test_score']
             out_acc[mtype]['par'] = cv_output['params']
 
-            mut_clf.fit_coh(cdata, mtype, include_feats=use_feats)
-            out_pred[mtype] = np.round(mut_clf.parse_preds(
-                mut_clf.predict_test(cdata, lbl_type='raw',
-                                     include_feats=use_feats)
-                ), 7)
-
-            out_trnsf[mtype] = {
-                coh: np.round(mut_clf.parse_preds(
-                    transfer_model(trnsf_fl, mut_clf, use_feats)), 7)
-                for coh, trnsf_fl in coh_dict.items()
-                }
-
-        else:
-            del(out_pars[mtype])
-            del(out_time[mtype])
-            del(out_acc[mtype])
-            del(out_pred[mtype])
-            del(out_trnsf[mtype])
+            # the classifiers fit in batches were already trained on the
+            # entire training subcohort during tuning
+            if args.batch:
+                out_pred[mtype] = np.round(
+                    mut_clf.predict_batch(prep_data, fit_est), 7)
+
+                out_trnsf[mtype] = {
+                    coh: np.round(mut_clf.predict_batch(
+                        prep_data, fit_est,
+                        load_transfer_expr(trnsf_fl, feat_list)
+                        ), 7)
+                    for coh, trnsf_fl in coh_dict.items()
+                    }
+
+            else:
+                mut_clf.fit_coh(cdata, mtype, include_feats=use_feats)
+                out_pred[mtype] = np.round(mut_clf.parse_preds(
+                    mut_clf.predict_test(cdata, lbl_type='raw',
+                                         include_feats=use_feats)
+                    ), 7)
+
+                out_trnsf[mtype] = {
+                    coh: np.round(mut_clf.parse_preds(
+                        transfer_model(trnsf_fl, mut_clf, use_feats,
+                                       feat_list)), 7)
+                    for coh, trnsf_fl in coh_dict.items()
+                    }
 
     with open(os.path.join(args.use_dir, 'output',
                            "out__cv-{}_task-{}.p".format(
@@ -6,9 +6,10 @@ start_time=$( date +%s )
 source activate research
 rewrite=false
 count_only=false
+batch=false
 
 # collect command line arguments
-while getopts :e:t:s:l:c:m:rn var
+while getopts :e:t:s:l:c:m:rnb var
 do
 	case "$var" in
 		t)  cohort=$OPTARG;;
@@ -16,12 +17,14 @@ do
 		m)  test_max=$OPTARG;;
 		r)  rewrite=true;;
 		n)  count_only=true;;
+		b)  batch=true;;
 		[?])  echo "Usage: $0 " \
 				"[-t] tumour cohort" \
 				"[-c] mutation classifier" \
 				"[-m] maximum number of tests per node" \
 				"[-r] rewrite existing results?" \
-				"[-n] only enumerate, don't classify?"
+				"[-n] only enumerate, don't classify?" \
+				"[-b] fit subgroupings of the same gene in batches?"
 			exit 1;;
 	esac
 done
@@ -84,7 +87,8 @@ then
 
 	eval "$( python -m dryads-research.experiments.utilities.pipeline_setup \
 		$OUTDIR $time_max --merge_max=$merge_max \
-		--task_size=$task_size --samp_exp=$samp_exp )"
+		--task_size=$task_size --samp_exp=$samp_exp \
+		--classif=$classif --cost_dir=$DATADIR/dryads-research/subgrouping_threshold )"
 fi
 
 # if we are only enumerating, we quit before classification jobs are launched
@@ -107,7 +111,11 @@ dvc run -d setup/muts-list.p -d $RUNDIR/fit_threshold.py -O out-conf.p.gz \
 	-n {cluster.ntasks} -c {cluster.cpus-per-task} \
 	--mem-per-cpu {cluster.mem-per-cpu} --exclude=$ex_nodes --no-requeue" \
 	--config cohort='"$cohort"' classif='"$classif"' \
-	time_max='"$run_time"' merge_max='"$merge_time"
+	time_max='"$run_time"' merge_max='"$merge_time"' \
+	batch='"$batch"
 
+# final cleanup duties
+rm -f $OUTDIR/setup/cohort-expr.npy $OUTDIR/setup/cohort-expr__labels.p \
+	$OUTDIR/setup/cohort-muts.p
 cp output.dvc $FINALDIR/output__${cohort}__${classif}.dvc
 
@@ -2,9 +2,10 @@
 from ..utilities.mutations import pnt_mtype, dup_mtype, loss_mtype, RandomType
 from dryadic.features.mutations import MuType
 
-from .utils import MutThresh
+from .utils import MutThresh, get_thresh_index
+from ..utilities.handle_input import save_data, write_shared_cohort
 from ..utilities.data_dirs import choose_source, vep_cache_dir, expr_sources
-from ...features.cohorts.utils import get_cohort_data, load_cohort
+from ...features.cohorts.utils import get_cached_cohort, load_cohort
 from ...features.cohorts.tcga import list_cohorts
 
 import os
@@ -124,12 +125,17 @@ def main():
     mtree_k = ('Gene', 'Scale', 'Copy')
     use_lfs = ['ref_count', 'alt_count', 'PolyPhen', 'SIFT', 'depth']
 
-    cdata = get_cohort_data(args.cohort, use_source, [mtree_k], vep_cache_dir,
-                            out_path, use_genes, leaf_annot=use_lfs)
-    with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
-        pickle.dump(cdata, f, protocol=-1)
+    cdata = get_cached_cohort(args.cohort, use_source, [mtree_k],
+                              vep_cache_dir, out_path, use_genes,
+                              leaf_annot=use_lfs)
+    save_data(cdata, os.path.join(out_path, "cohort-data.p.gz"), codec='bz2')
+    write_shared_cohort(cdata, out_path)
+
+    thresh_indx = get_thresh_index(cdata.mtrees[mtree_k])
+    max_size = len(cdata.get_samples()) - use_ctf + 1
 
     for gene, mtree in cdata.mtrees[mtree_k]:
+        gene_indx = get_thresh_index(mtree)
         base_mtypes = {MuType({('Gene', gene): pnt_mtype})}
 
         if gene in test_genes['Gain']:
@@ -141,33 +147,22 @@ def main():
             base_size = len(base_mtype.get_samples(
                 cdata.mtrees[mtree_k]))
 
-            gene_mtypes = {
-                MutThresh('VAF', vaf_val, base_mtype)
-                for vaf_val in set(
-                    max(alt_cnt / (alt_cnt + ref_cnt)
-                        for alt_cnt, ref_cnt in zip(vals['alt_count'],
-                                                    vals['ref_count']))
-                    for vals in pnt_mtype.get_leaf_annot(
-                        mtree, ['ref_count', 'alt_count']).values()
-                    )
-                }
-
-            for lf_annt in ['PolyPhen', 'SIFT', 'depth']:
-                gene_mtypes |= {
+            # tests a threshold at each of the values taken on by the gene's
+            # point mutations, counting the samples passing all of them at once
+            for lf_annt in ['VAF', 'PolyPhen', 'SIFT', 'depth']:
+                annt_vals = gene_indx.get_threshold_values(pnt_mtype, lf_annt)
+                if lf_annt != 'VAF':
+                    annt_vals = annt_vals[annt_vals > 0]
+
+                annt_cnts = thresh_indx.count_grid(base_mtype, lf_annt,
+                                                   annt_vals)
+                use_mtypes |= {
                     MutThresh(lf_annt, annt_val, base_mtype)
-                    for annt_val in set(max(vals[lf_annt])
-                                        for vals in pnt_mtype.get_leaf_annot(
-                                            mtree, [lf_annt]).values())
-                    if annt_val > 0
+                    for annt_val, annt_cnt in zip(annt_vals.tolist(),
+                                                  annt_cnts)
+                    if use_ctf <= annt_cnt < min(base_size, max_size)
                     }
 
-            use_mtypes |= {
-                mtype for mtype in gene_mtypes
-                if (use_ctf
-                    <= len(mtype.get_samples(cdata.mtrees[mtree_k]))
-                    < min(base_size, len(cdata.get_samples()) - use_ctf + 1))
-                }
-
     with open(os.path.join(out_path, "muts-list.p"), 'wb') as f:
         pickle.dump(sorted(use_mtypes), f, protocol=-1)
     with open(os.path.join(out_path, "muts-count.txt"), 'w') as fl:
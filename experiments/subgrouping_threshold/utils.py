@@ -4,10 +4,141 @@ from ..utilities.mutations import RandomType
 
 import numpy as np
 import pandas as pd
+from collections import OrderedDict
 from functools import reduce
 from operator import or_
 
 
+class ThreshIndex(object):
+    """Finds the samples passing annotation thresholds in a mutation tree.
+
+    The largest value of an annotation across the mutations of a subgrouping
+    each sample carries is extracted once per subgrouping and annotation, so
+    that the samples of any threshold on it can then be found with a single
+    vectorized comparison.
+
+    Args:
+        mtree (MuTree): The mutations of a cohort's samples.
+
+    """
+
+    def __init__(self, mtree):
+        self.mtree = mtree
+        self.annot_cache = dict()
+
+    def get_annot_vals(self, base_mtype, annot):
+        """Finds each sample's largest value of an annotation.
+
+        Args:
+            base_mtype (MuType): The subgrouping whose mutations are used.
+            annot (str): A mutation annotation field, or 'VAF' for the
+                         variant allele frequency found using read counts.
+
+        Returns:
+            samps (np.array): The samples carrying the subgrouping.
+            annt_vals (np.array)
+                The largest annotation value of each sample, with samples
+                whose mutations are all missing the annotation given a value
+                of infinity so that they pass any threshold.
+
+        """
+        cache_key = base_mtype, annot
+
+        if cache_key not in self.annot_cache:
+            if annot == 'VAF':
+                lf_annt = base_mtype.get_leaf_annot(
+                    self.mtree, ['ref_count', 'alt_count'])
+            else:
+                lf_annt = base_mtype.get_leaf_annot(self.mtree, [annot])
+
+            samps = np.array(sorted(lf_annt))
+            annt_vals = np.full(len(samps), np.inf)
+
+            for i, samp in enumerate(samps):
+                if annot == 'VAF':
+                    alt_cnts = np.array(lf_annt[samp]['alt_count'],
+                                        dtype=float)
+                    ref_cnts = np.array(lf_annt[samp]['ref_count'],
+                                        dtype=float)
+
+                    if np.isnan(alt_cnts).all():
+                        continue
+
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        samp_vals = alt_cnts / (alt_cnts + ref_cnts)
+
+                else:
+                    samp_vals = np.array(lf_annt[samp][annot], dtype=float)
+
+                    if np.isnan(samp_vals).all():
+                        continue
+
+                if np.isnan(samp_vals).all():
+                    annt_vals[i] = np.nan
+                else:
+                    annt_vals[i] = np.nanmax(samp_vals)
+
+            self.annot_cache[cache_key] = samps, annt_vals
+
+        return self.annot_cache[cache_key]
+
+    def get_threshold_values(self, base_mtype, annot):
+        """Finds the thresholds that would each select different samples."""
+        annt_vals = self.get_annot_vals(base_mtype, annot)[1]
+
+        return np.unique(annt_vals[np.isfinite(annt_vals)])
+
+    def get_samples(self, base_mtype, annot, min_val):
+        samps, annt_vals = self.get_annot_vals(base_mtype, annot)
+
+        with np.errstate(invalid='ignore'):
+            return set(samps[annt_vals >= min_val].tolist())
+
+    def get_grid_stats(self, base_mtype, annot, min_vals):
+        """Finds the samples passing each of a grid of thresholds at once.
+
+        Returns:
+            samps (np.array): The samples carrying the subgrouping.
+            grid_stat (np.array)
+                A thresholds x samples boolean matrix of which samples have
+                an annotation value of at least each threshold.
+
+        """
+        samps, annt_vals = self.get_annot_vals(base_mtype, annot)
+
+        with np.errstate(invalid='ignore'):
+            grid_stat = (annt_vals[np.newaxis, :]
+                         >= np.array(min_vals, dtype=float)[:, np.newaxis])
+
+        return samps, grid_stat
+
+    def count_grid(self, base_mtype, annot, min_vals):
+        """Finds how many samples pass each of a grid of thresholds."""
+        return self.get_grid_stats(base_mtype, annot, min_vals)[1].sum(axis=1)
+
+
+# threshold indices of the mutation trees used most recently, which are kept
+# so that the many thresholds of a subgrouping share extracted annotations
+_THRESH_INDICES = OrderedDict()
+_THRESH_INDEX_COUNT = 8
+
+
+def get_thresh_index(mtree):
+    """Gets the cached threshold index of a mutation tree."""
+    cache_key = id(mtree)
+
+    if (cache_key in _THRESH_INDICES
+            and _THRESH_INDICES[cache_key].mtree is mtree):
+        _THRESH_INDICES.move_to_end(cache_key)
+
+    else:
+        _THRESH_INDICES[cache_key] = ThreshIndex(mtree)
+        while len(_THRESH_INDICES) > _THRESH_INDEX_COUNT:
+            _THRESH_INDICES.popitem(last=False)
+
+    return _THRESH_INDICES[cache_key]
+
+
 class MutThresh(MuType):
 
     def __init__(self, annot, min_val, base_mtype):
@@ -74,28 +205,8 @@ class MutThresh(MuType):
             return self.min_val < other.min_val
 
     def get_samples(self, mtree):
-        if self.annot == 'VAF':
-            lf_annt = self.base_mtype.get_leaf_annot(
-                mtree, ['ref_count', 'alt_count'])
-
-        else:
-            lf_annt = self.base_mtype.get_leaf_annot(mtree, [self.annot])
-
-        if self.annot == 'VAF':
-            samps = {samp for samp, vals in lf_annt.items()
-                     if (all(np.isnan(alt_cnt)
-                             for alt_cnt in vals['alt_count'])
-                         or (max(alt_cnt / (alt_cnt + ref_cnt)
-                                 for alt_cnt, ref_cnt in zip(
-                                     vals['alt_count'], vals['ref_count']))
-                             >= self.min_val))}
-
-        else:
-            samps = {samp for samp, vals in lf_annt.items()
-                     if (np.isnan(vals[self.annot]).all()
-                         or (max(vals[self.annot]) >= self.min_val))}
-
-        return samps
+        return get_thresh_index(mtree).get_samples(
+            self.base_mtype, self.annot, self.min_val)
 
     def get_sorted_levels(self):
         return self.base_mtype.get_sorted_levels()
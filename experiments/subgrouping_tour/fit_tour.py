@@ -1,13 +1,15 @@
 
 from ..subgrouping_tour import cis_lbls
-from ..utilities.handle_input import safe_load
-from ..utilities.pipeline_setup import get_task_count
+from ..utilities.handle_input import load_setup_cohort
+from ..utilities.pipeline_setup import get_task_assignment
 from ..utilities.classifiers import *
+from ..utilities.classifiers import BatchLinear
 
 import os
 import argparse
 import dill as pickle
 import random
+import numpy as np
 
 
 def main():
@@ -24,19 +26,26 @@ def main():
                         help='the subset of subtypes to assign to this task')
     parser.add_argument('--cv_id', type=int, default=0,
                         help='the subset of subtypes to assign to this task')
+    parser.add_argument(
+        '--batch', action='store_true',
+        help="share transformed features across subgroupings that exclude "
+             "the same genes"
+        )
 
     args = parser.parse_args()
     setup_dir = os.path.join(args.use_dir, 'setup')
-    task_count = get_task_count(args.use_dir)
 
     with open(os.path.join(setup_dir, "muts-list.p"), 'rb') as muts_f:
         mtype_list = pickle.load(muts_f)
 
-    coh_path = os.path.join(setup_dir, "cohort-data.p.gz")
-    cdata = safe_load(coh_path, retry_pause=41)
+    cdata = load_setup_cohort(setup_dir, retry_pause=41)
     clf = eval(args.classif)
     mut_clf = clf()
 
+    if args.batch and not isinstance(mut_clf, BatchLinear):
+        parser.error("Classifier `{}` cannot be fit in batches!".format(
+            args.classif))
+
     # figure out which cohort samples will be used for tuning and testing the
     # classifier and which samples will be used for testing
     use_seed = 9073 + 97 * args.cv_id
@@ -57,47 +66,87 @@ def main():
     out_pred = {mtype: {cis_lbl: None for cis_lbl in cis_lbls}
                 for mtype in mtype_list}
 
+    task_dict = get_task_assignment(args.use_dir, mtype_list)
     random.seed(10301)
     random.shuffle(mtype_list)
 
+    task_mtypes = []
+
     # for each subtype, check if it has been assigned to this task
-    for i, mtype in enumerate(mtype_list):
-        if (i % task_count) == args.task_id:
-            print("Testing {} ...".format(mtype))
+    for mtype in mtype_list:
+        if task_dict[mtype] == args.task_id:
+            task_mtypes += [mtype]
 
+        else:
+            del(out_pars[mtype])
+            del(out_time[mtype])
+            del(out_acc[mtype])
+            del(out_pred[mtype])
+
+    # subgroupings tested with the same set of cis-genes removed can share
+    # transformed -omic data when fitting in batches
+    if args.batch:
+        feat_batches = dict()
+
+        for mtype in task_mtypes:
             for cis_lbl in cis_lbls:
+                ex_genes = frozenset(cdata.get_cis_genes(cis_lbl, mut=mtype))
+                feat_batches[ex_genes] = feat_batches.get(ex_genes, []) + [
+                    (mtype, cis_lbl)]
+
+    else:
+        feat_batches = {None: [(mtype, cis_lbl) for mtype in task_mtypes
+                               for cis_lbl in cis_lbls]}
+
+    for batch_genes, batch_tests in feat_batches.items():
+        if args.batch:
+            print("Preparing features without {} genes ...".format(
+                len(batch_genes)))
+            prep_data = mut_clf.prep_batch(cdata, exclude_feats=batch_genes)
+
+        for mtype, cis_lbl in batch_tests:
+            print("Testing {} ({}) ...".format(mtype, cis_lbl))
+
+            # tune the hyper-parameters of the classifier
+            if args.batch:
+                fit_est, cv_output = mut_clf.tune_batch(
+                    prep_data, np.array(cdata.train_pheno(mtype)),
+                    tune_splits=4, parallel_jobs=8, random_state=use_seed
+                    )
+
+            else:
                 ex_genes = cdata.get_cis_genes(cis_lbl, mut=mtype)
 
-                # tune the hyper-parameters of the classifier
                 mut_clf, cv_output = mut_clf.tune_coh(
                     cdata, mtype, exclude_feats=ex_genes,
                     tune_splits=4, test_count=mut_clf.test_count,
                     parallel_jobs=8
                     )
 
-                # save the tuned values of the hyper-parameters
-                clf_params = mut_clf.get_params()
-                for par, _ in mut_clf.tune_priors:
-                    out_pars[mtype][cis_lbl][par] = clf_params[par]
-
-                out_time[mtype][cis_lbl]['avg'] = cv_output['mean_fit_time']
-                out_time[mtype][cis_lbl]['std'] = cv_output['std_fit_time']
-                out_acc[mtype][cis_lbl]['avg'] = cv_output['mean_test_score']
-                out_acc[mtype][cis_lbl]['std'] = cv_output['std_test_score']
-                out_acc[mtype][cis_lbl]['par'] = cv_output['params']
- 
+            # save the tuned values of the hyper-parameters
+            clf_params = mut_clf.get_params()
+            for par, _ in mut_clf.tune_priors:
+                out_pars[mtype][cis_lbl][par] = clf_params[par]
+
+            out_time[mtype][cis_lbl]['avg'] = cv_output['mean_fit_time']
+            out_time[mtype][cis_lbl]['std'] = cv_output['std_fit_time']
+            out_acc[mtype][cis_lbl]['avg'] = cv_output['mean_test_score']
+            out_acc[mtype][cis_lbl]['std'] = cv_output['std_test_score']
+            out_acc[mtype][cis_lbl]['par'] = cv_output['params']
+
+            # the classifiers fit in batches were already trained on the
+            # entire training subcohort during tuning
+            if args.batch:
+                out_pred[mtype][cis_lbl] = np.round(
+                    mut_clf.predict_batch(prep_data, fit_est), 7)
+
+            else:
                 mut_clf.fit_coh(cdata, mtype, exclude_feats=ex_genes)
                 out_pred[mtype][cis_lbl] = np.round(mut_clf.parse_preds(
                     mut_clf.predict_test(cdata, lbl_type='raw',
                                          exclude_feats=ex_genes)
                     ), 7)
 
-        else:
-            del(out_pars[mtype])
-            del(out_time[mtype])
-            del(out_acc[mtype])
-            del(out_pred[mtype])
-
     with open(os.path.join(args.use_dir, 'output',
                            "out__cv-{}_task-{}.p".format(
                                args.cv_id, args.task_id)),
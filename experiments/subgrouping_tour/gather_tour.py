@@ -1,21 +1,21 @@
 
 from ..subgrouping_tour import cis_lbls
-from ..utilities.pipeline_setup import get_task_count
+from ..utilities.pipeline_setup import get_task_count, get_task_assignment
 from ..utilities.misc import compare_muts
-from ..utilities.metrics import calc_auc
+from ..utilities.metrics import calc_auc_dict
+from ..utilities.bootstrap import get_sub_inds, calc_conf_aucs
 
 import os
 import argparse
 import bz2
 from pathlib import Path
 import dill as pickle
-from joblib import Parallel, delayed
 import random
 
 import numpy as np
 import pandas as pd
 
-from itertools import cycle, product
+from itertools import product
 from itertools import combinations as combn
 
 
@@ -77,11 +77,11 @@ def main():
     out_clf = None
     out_tune = None
 
+    task_dict = get_task_assignment(args.use_dir, muts_list)
     random.seed(10301)
     random.shuffle(muts_list)
 
-    use_muts = [mut for i, mut in enumerate(muts_list)
-                if i % task_count in use_tasks]
+    use_muts = [mut for mut in muts_list if task_dict[mut] in use_tasks]
 
     for cv_id, out_fls in file_sets.items():
         out_list = []
@@ -224,72 +224,30 @@ def main():
                      'w') as fl:
         pickle.dump(pheno_dict, fl, protocol=-1)
 
-    auc_vals = {
-        cis_lbl: {
-            'all': pd.Series(dict(zip(use_muts, Parallel(
-                n_jobs=12, prefer='threads', pre_dispatch=120)(
-                delayed(calc_auc)(
-                    np.vstack(pred_df.loc[mtype][train_samps].values),
-                    pheno_dict[mtype]
-                    )
-                for mtype in use_muts
-                )
-            ))),
-
-            # ...and for each cross-validation run considered separately...
-            'CV': pd.DataFrame.from_records(
-                tuple(zip(cycle(use_muts), Parallel(
-                    n_jobs=12, prefer='threads', pre_dispatch=120)(
-                    delayed(calc_auc)(
-                        np.vstack(pred_df.loc[
-                            mtype][train_samps].values)[:, cv_id],
-                        pheno_dict[mtype]
-                        )
-                    for cv_id in range(10) for mtype in use_muts
-                    )
-                ))
-            ).pivot_table(index=0, values=1, aggfunc=list).iloc[:, 0],
-
-            # ...and finally using the average of predicted scores for each
-            # sample across CV runs
-            'mean': pd.Series(dict(zip(use_muts, Parallel(
-                n_jobs=12, prefer='threads', pre_dispatch=120)(
-                delayed(calc_auc)(
-                    np.vstack(pred_df.loc[
-                        mtype][train_samps].values).mean(axis=1),
-                    pheno_dict[mtype]
-                    )
-                for mtype in use_muts
-                )
-            )))
-            }
-
+    # calculates AUCs for prediction tasks using scores from all
+    # cross-validations concatenated together, for each cross-validation run
+    # considered separately, and using the average of predicted scores for
+    # each sample across CV runs
+    pred_mats = {
+        cis_lbl: {mtype: np.vstack(pred_df.loc[mtype][train_samps].values)
+                  for mtype in use_muts}
         for cis_lbl, pred_df in pred_dfs.items()
         }
 
+    auc_vals = {cis_lbl: calc_auc_dict(cis_mats, pheno_dict)
+                for cis_lbl, cis_mats in pred_mats.items()}
+
     with bz2.BZ2File(os.path.join(args.use_dir, 'merge',
                                   "out-aucs{}.p.gz".format(out_tag)),
                      'w') as fl:
         pickle.dump(auc_vals, fl, protocol=-1)
 
-    random.seed(7609)
-    sub_inds = [random.choices([False, True], k=len(cdata.get_samples()))
-                for _ in range(1000)]
-
+    sub_inds = get_sub_inds(len(cdata.get_samples()), 1000, seed=7609)
     conf_dict = {
-        cis_lbl: pd.DataFrame.from_records(
-            tuple(zip(cycle(use_muts), Parallel(
-                n_jobs=12, prefer='threads', pre_dispatch=120)(
-                    delayed(calc_auc)(
-                        np.vstack(pred_df.loc[mtype][
-                            train_samps[sub_indx]].values).mean(axis=1),
-                        pheno_dict[mtype][sub_indx]
-                        )
-                    for sub_indx in sub_inds for mtype in use_muts
-                    )
-                ))
-            ).pivot_table(index=0, values=1, aggfunc=list).iloc[:, 0]
-        for cis_lbl, pred_df in pred_dfs.items()
+        cis_lbl: calc_conf_aucs({mtype: pred_mat.mean(axis=1)
+                                 for mtype, pred_mat in cis_mats.items()},
+                                pheno_dict, sub_inds)
+        for cis_lbl, cis_mats in pred_mats.items()
         }
 
     with bz2.BZ2File(os.path.join(args.use_dir, 'merge',
@@ -7,9 +7,10 @@ start_time=$( date +%s )
 source activate research
 rewrite=false
 count_only=false
+batch=false
 
 # collect command line arguments
-while getopts :e:t:s:l:c:m:rn var
+while getopts :e:t:s:l:c:m:rnb var
 do
 	case "$var" in
 		e)  expr_source=$OPTARG;;
@@ -20,6 +21,7 @@ do
 		m)  test_max=$OPTARG;;
 		r)  rewrite=true;;
 		n)  count_only=true;;
+		b)  batch=true;;
 		[?])  echo "Usage: $0 " \
 				"[-e] cohort expression source" \
 				"[-t] tumour cohort" \
@@ -28,7 +30,8 @@ do
 				"[-c] mutation classifier" \
 				"[-m] maximum number of tests per node" \
 				"[-r] rewrite existing results?" \
-				"[-n] only enumerate, don't classify?"
+				"[-n] only enumerate, don't classify?" \
+				"[-b] fit subgroupings excluding the same genes in batches?"
 			exit 1;;
 	esac
 done
@@ -89,7 +92,8 @@ then
 	merge_max=$(( $time_left - $time_max - 3 ))
 
 	eval "$( python -m dryads-research.experiments.utilities.pipeline_setup \
-		$OUTDIR $time_max --merge_max=$merge_max --task_size=1.83 )"
+		$OUTDIR $time_max --merge_max=$merge_max --task_size=1.83 \
+		--classif=$classif --cost_dir=$DATADIR/dryads-research/subgrouping_tour )"
 fi
 
 # if we are only enumerating, we quit before classification jobs are launched
@@ -113,7 +117,11 @@ dvc run -d setup/muts-list.p -d $RUNDIR/fit_tour.py -O out-conf.p.gz \
 	--mem-per-cpu {cluster.mem-per-cpu} --exclude=$ex_nodes --no-requeue" \
 	--config expr_source='"$expr_source"' cohort='"$cohort"' \
 	search='"$search_params"' mut_levels='"$mut_lvls"' \
-	classif='"$classif"' time_max='"$run_time"' merge_max='"$merge_time"
+	classif='"$classif"' time_max='"$run_time"' merge_max='"$merge_time"' \
+	batch='"$batch"
 
+# final cleanup duties
+rm -f $OUTDIR/setup/cohort-expr.npy $OUTDIR/setup/cohort-expr__labels.p \
+	$OUTDIR/setup/cohort-muts.p
 cp output.dvc $FINALDIR/output__${param_tag}__${classif}.dvc
 
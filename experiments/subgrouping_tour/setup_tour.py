@@ -1,16 +1,19 @@
 
 from ..utilities.mutations import pnt_mtype
+from ..utilities.sample_sets import SampleIndex, count_samples, equal_samples
 from dryadic.features.mutations import MuType
 
 from .param_list import params, mut_lvls
+from ..utilities.handle_input import save_data, write_shared_cohort
 from ..utilities.data_dirs import vep_cache_dir, expr_sources
 from ...features.data.oncoKB import get_gene_list
-from ...features.cohorts.utils import get_cohort_data
+from ...features.cohorts.utils import get_cached_cohort
 
 import os
 import argparse
-import bz2
 import dill as pickle
+
+import numpy as np
 from itertools import product
 
 
@@ -36,14 +39,15 @@ def main():
     search_dict = params[args.search_params]
     use_genes = get_gene_list(min_sources=2)
 
-    cdata = get_cohort_data(args.cohort, args.expr_source, lvl_lists,
-                            vep_cache_dir, out_path, use_genes,
-                            use_copies=False)
-    with bz2.BZ2File(os.path.join(out_path, "cohort-data.p.gz"), 'w') as f:
-        pickle.dump(cdata, f, protocol=-1)
+    cdata = get_cached_cohort(args.cohort, args.expr_source, lvl_lists,
+                              vep_cache_dir, out_path, use_genes,
+                              use_copies=False)
+    save_data(cdata, os.path.join(out_path, "cohort-data.p.gz"), codec='bz2')
+    write_shared_cohort(cdata, out_path)
 
     total_samps = len(cdata.get_samples())
     max_samps = total_samps - search_dict['samp_cutoff']
+    samp_indx = SampleIndex(cdata.get_samples())
     test_mtypes = set()
 
     for gene in set(dict(tuple(cdata.mtrees.values())[0])):
@@ -55,7 +59,7 @@ def main():
         pnt_count = tuple(pnt_count)[0]
 
         if pnt_count >= search_dict['samp_cutoff']:
-            samp_dict = {None: cdata.mtrees[lvl_lists[0]][gene].get_samples()}
+            samp_dict = dict()
             gene_types = set()
 
             for lvls in lvl_lists:
@@ -70,22 +74,33 @@ def main():
                         )
                     }
 
-                samp_dict.update({mtype: mtype.get_samples(use_mtree)
-                                  for mtype in lvl_types})
+                samp_dict.update({
+                    mtype: samp_indx.get_bits(mtype, use_mtree)
+                    for mtype in lvl_types
+                    })
+
+                gene_types |= {
+                    mtype for mtype in lvl_types
+                    if (count_samples(samp_dict[mtype]) <= max_samps
+                        and count_samples(samp_dict[mtype]) < pnt_count)
+                    }
 
-                gene_types |= {mtype for mtype in lvl_types
-                               if (len(samp_dict[mtype]) <= max_samps
-                                   and len(samp_dict[mtype]) < pnt_count)}
+            # only subgroupings mutated in the same samples need to be
+            # compared in detail with one another
+            type_list = sorted(gene_types)
+            same_samps = equal_samples(
+                np.array([samp_dict[mtype] for mtype in type_list]))
+            np.fill_diagonal(same_samps, False)
 
             rmv_mtypes = set()
-            for rmv_mtype in sorted(gene_types):
+            for i, rmv_mtype in enumerate(type_list):
                 rmv_lvls = rmv_mtype.get_levels()
 
-                for cmp_mtype in sorted(gene_types
-                                        - {rmv_mtype} - rmv_mtypes):
+                for j in np.flatnonzero(same_samps[i]):
+                    cmp_mtype = type_list[j]
                     cmp_lvls = cmp_mtype.get_levels()
 
-                    if (samp_dict[rmv_mtype] == samp_dict[cmp_mtype]
+                    if (cmp_mtype not in rmv_mtypes
                             and (rmv_mtype.is_supertype(cmp_mtype)
                                  or (any('domain' in lvl for lvl in rmv_lvls)
                                      and all('domain' not in lvl
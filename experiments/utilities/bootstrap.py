@@ -0,0 +1,111 @@
+"""
+Down-sampled AUCs used to measure how confident we can be in the performance
+of each of an experiment's subgrouping tasks.
+
+"""
+
+import numpy as np
+import pandas as pd
+import random
+
+
+def get_sub_inds(samp_count, sub_count, seed):
+    """Creates down-sampled sets of a cohort's tumour samples.
+
+    Args:
+        samp_count (int): How many samples are in the cohort.
+        sub_count (int): How many down-sampled sets to create.
+        seed (int): Used to make the down-sampling reproducible.
+
+    Returns:
+        sub_inds (np.array)
+            A down-samplings x samples boolean matrix of which samples are
+            included in each down-sampled set.
+
+    """
+    random.seed(seed)
+
+    return np.array([random.choices([False, True], k=samp_count)
+                     for _ in range(sub_count)], dtype=bool)
+
+
+def calc_sub_aucs(vals, stat, sub_inds, block_size=250):
+    """Calculates the AUCs of one subgrouping across down-sampled cohorts.
+
+    The samples are sorted by their scores once, after which the mutated and
+    wild-type samples found in each down-sampled set are counted within
+    each run of tied scores. The number of wild-type samples scored below
+    each mutated sample then follows from a cumulative sum over these runs.
+
+    Args:
+        vals (np.array)
+            A vector of continuous predicted labels. Samples whose score is
+            missing (NaN) are left out of every down-sampled set.
+        stat (np.array): The ground truth binary class labels.
+        sub_inds (np.array): A down-samplings x samples boolean matrix.
+        block_size (int, optional)
+            How many down-sampled sets to process at once, which bounds the
+            size of the intermediate matrices created.
+
+    Returns:
+        auc_vals (np.array): An AUC for each down-sampled set.
+
+    """
+    vals = np.asarray(vals, dtype=float)
+    stat = np.asarray(stat, dtype=bool)
+    sub_inds = np.asarray(sub_inds, dtype=bool)
+
+    use_indx = np.argsort(vals, kind='mergesort')
+    use_indx = use_indx[~np.isnan(vals[use_indx])]
+    sort_vals = vals[use_indx]
+    sort_stat = stat[use_indx]
+
+    auc_vals = np.full(sub_inds.shape[0], 0.5)
+    if len(sort_vals) == 0:
+        return auc_vals
+
+    # finds where each run of tied scores begins in the sorted samples
+    tie_starts = np.flatnonzero(np.concatenate([
+        [True], sort_vals[1:] != sort_vals[:-1]]))
+
+    for i in range(0, sub_inds.shape[0], block_size):
+        sub_blk = sub_inds[i:(i + block_size), use_indx]
+
+        mut_cnts = np.add.reduceat(sub_blk & sort_stat,
+                                   tie_starts, axis=1, dtype=float)
+        wt_cnts = np.add.reduceat(sub_blk & ~sort_stat,
+                                  tie_starts, axis=1, dtype=float)
+        wt_below = np.cumsum(wt_cnts, axis=1) - wt_cnts
+
+        pair_cnts = (mut_cnts * (wt_below + 0.5 * wt_cnts)).sum(axis=1)
+        pair_tot = mut_cnts.sum(axis=1) * wt_cnts.sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            auc_vals[i:(i + block_size)] = np.where(
+                pair_tot > 0, pair_cnts / pair_tot, 0.5)
+
+    return auc_vals
+
+
+def calc_conf_aucs(mean_dict, pheno_dict, sub_inds, block_size=250):
+    """Calculates down-sampled AUCs for each of an experiment's subgroupings.
+
+    Args:
+        mean_dict (dict)
+            The average of each sample's scores across cross-validation
+            folds for each of the subgroupings tested.
+        pheno_dict (dict): The ground truth labels for each subgrouping.
+        sub_inds (np.array): A down-samplings x samples boolean matrix.
+        block_size (int, optional): See `calc_sub_aucs`.
+
+    Returns:
+        conf_vals (pd.Series)
+            A list of AUCs for each subgrouping, one for each of the
+            down-sampled sets in the order they were given.
+
+    """
+    return pd.Series({
+        mtype: calc_sub_aucs(mean_dict[mtype], pheno_dict[mtype],
+                             sub_inds, block_size).tolist()
+        for mtype in sorted(mean_dict)
+        })
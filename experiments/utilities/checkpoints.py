@@ -0,0 +1,115 @@
+"""
+Saving the output of each subgrouping a parallelized task has finished as soon
+as it is found, so that a task whose job was stopped before finishing can
+pick up where it left off instead of starting over.
+
+Checkpoints are append-only files of pickled records, each preceded by its
+length in bytes. The first record identifies how the task was being run, and
+each of the others holds the output of one subgrouping. A record that was cut
+off by the job being stopped while writing it is discarded when the
+checkpoint is next opened.
+
+"""
+
+import os
+import struct
+import dill as pickle
+
+
+# the length of each record, stored in the eight bytes preceding it
+_RECORD_HEADER = struct.Struct('>Q')
+
+
+def read_records(ckpt_path):
+    """Reads the complete records saved in a checkpoint file.
+
+    Returns:
+        records (list): The records in the order they were written.
+        ckpt_end (int): Where the last complete record ends in the file.
+
+    """
+    records = []
+    ckpt_end = 0
+
+    with open(ckpt_path, 'rb') as f:
+        while True:
+            rec_header = f.read(_RECORD_HEADER.size)
+            if len(rec_header) < _RECORD_HEADER.size:
+                break
+
+            rec_len = _RECORD_HEADER.unpack(rec_header)[0]
+            rec_bytes = f.read(rec_len)
+            if len(rec_bytes) < rec_len:
+                break
+
+            records += [pickle.loads(rec_bytes)]
+            ckpt_end = f.tell()
+
+    return records, ckpt_end
+
+
+class TaskCheckpoint(object):
+    """The subgroupings finished by a task, saved as each one is finished.
+
+    Args:
+        ckpt_path (str): Where the checkpoint file is stored.
+        task_info
+            Identifies the configuration the task is being run under. Any
+            records saved by a run of the task under another configuration
+            are discarded.
+
+    """
+
+    def __init__(self, ckpt_path, task_info):
+        self.ckpt_path = ckpt_path
+        self.records = dict()
+        ckpt_end = 0
+
+        if os.path.exists(ckpt_path):
+            ckpt_records, ckpt_end = read_records(ckpt_path)
+
+            if ckpt_records and ckpt_records[0] == task_info:
+                self.records = dict(ckpt_records[1:])
+            else:
+                ckpt_end = 0
+
+            self.ckpt_fl = open(ckpt_path, 'r+b')
+
+        else:
+            self.ckpt_fl = open(ckpt_path, 'wb')
+
+        # removes any incomplete record left at the end of the file
+        self.ckpt_fl.truncate(ckpt_end)
+        self.ckpt_fl.seek(ckpt_end)
+
+        if ckpt_end == 0:
+            self._append(task_info)
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def __getitem__(self, key):
+        return self.records[key]
+
+    def __len__(self):
+        return len(self.records)
+
+    def _append(self, record):
+        rec_bytes = pickle.dumps(record, protocol=-1)
+        self.ckpt_fl.write(_RECORD_HEADER.pack(len(rec_bytes)) + rec_bytes)
+
+        # makes sure the record is on disk before moving on to the next one
+        self.ckpt_fl.flush()
+        os.fsync(self.ckpt_fl.fileno())
+
+    def add(self, key, value):
+        """Saves the output of a finished subgrouping."""
+        self.records[key] = value
+        self._append((key, value))
+
+    def close(self, remove=False):
+        """Closes the checkpoint, removing it once it is no longer needed."""
+        self.ckpt_fl.close()
+
+        if remove:
+            os.remove(self.ckpt_path)
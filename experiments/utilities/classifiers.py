@@ -4,12 +4,244 @@ from dryadic.learning.classifiers import Base, LinearPipe, Kernel, Trees
 from dryadic.learning.selection import SelectMeanVar
 
 import numpy as np
+import time
+from joblib import Parallel, delayed
+
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+from sklearn.model_selection import GridSearchCV, StratifiedShuffleSplit
+from sklearn.metrics import roc_auc_score
 from sklearn.linear_model import LogisticRegression
 from sklearn.svm import SVC
 from sklearn.ensemble import RandomForestClassifier
 
 
-class Lasso(Base, LinearPipe):
+class PathTune(object):
+    """Tunes a classifier by fitting along its regularization path.
+
+    Rather than fitting the classifier from scratch for each of the values
+    of its regularization parameter, these values are visited in order from
+    the strongest to the weakest regularization with each fit starting from
+    the coefficients found for the previous value. This requires the
+    classifier's fitting step to support warm starts.
+
+    """
+
+    # the tuned parameter whose values form the regularization path, which
+    # for logistic regression gets weaker as the value of C increases
+    path_par = 'fit__C'
+
+    def _fit_path(self, path_steps, omic_mat, pheno, train_indx, test_indx):
+        path_pipe = Pipeline([(step_lbl, clone(step))
+                              for step_lbl, step in path_steps])
+        path_vals = sorted(dict(self.tune_priors)[self.path_par])
+
+        # the steps preceding the fitting step only need to be fit once per
+        # split; their cost is spread evenly across the path's fits
+        start_time = time.time()
+        train_mat = omic_mat[train_indx]
+        test_mat = omic_mat[test_indx]
+
+        if len(path_pipe.steps) > 1:
+            prep_pipe = Pipeline(path_pipe.steps[:-1])
+            train_mat = prep_pipe.fit_transform(train_mat)
+            test_mat = prep_pipe.transform(test_mat)
+
+        prep_time = (time.time() - start_time) / len(path_vals)
+        path_pipe.set_params(fit__warm_start=True)
+        fit_times = list()
+        test_scores = list()
+
+        for path_val in path_vals:
+            path_pipe.set_params(**{self.path_par: path_val})
+
+            start_time = time.time()
+            path_pipe.steps[-1][1].fit(train_mat, pheno[train_indx])
+            fit_times += [time.time() - start_time + prep_time]
+
+            test_scores += [roc_auc_score(
+                pheno[test_indx],
+                path_pipe.steps[-1][1].decision_function(test_mat)
+                )]
+
+        return fit_times, test_scores
+
+    def tune_path(self, omic_mat, pheno, tune_splits=2,
+                  parallel_jobs=16, random_state=None, use_prep=True):
+        """Finds the best value of the regularization parameter.
+
+        Args:
+            omic_mat (np.array): A samples x features training matrix.
+            pheno (np.array): The binary labels of the training samples.
+            use_prep (bool, optional)
+                Whether to fit the steps preceding the classifier's fitting
+                step in each tuning split, which is not necessary if the
+                training matrix has already been transformed by them.
+
+        Returns:
+            cv_output (dict)
+                The tuning results in the format of `cv_results_` produced
+                by scikit-learn's parameter searches.
+
+        """
+        pheno = np.asarray(pheno, dtype=bool)
+        tune_cvs = StratifiedShuffleSplit(n_splits=tune_splits, test_size=0.2,
+                                          random_state=random_state)
+
+        if use_prep:
+            path_steps = self.steps
+        else:
+            path_steps = self.steps[-1:]
+
+        path_outs = Parallel(n_jobs=min(parallel_jobs, tune_splits))(
+            delayed(self._fit_path)(path_steps, omic_mat, pheno,
+                                    train_indx, test_indx)
+            for train_indx, test_indx in tune_cvs.split(omic_mat, pheno)
+            )
+
+        fit_times = np.array([fit_time for fit_time, _ in path_outs])
+        test_scores = np.array([test_score for _, test_score in path_outs])
+        path_vals = sorted(dict(self.tune_priors)[self.path_par])
+
+        cv_output = {
+            'mean_fit_time': fit_times.mean(axis=0),
+            'std_fit_time': fit_times.std(axis=0),
+            'mean_test_score': test_scores.mean(axis=0),
+            'std_test_score': test_scores.std(axis=0),
+            'params': [{self.path_par: path_val} for path_val in path_vals]
+            }
+
+        # ties between parameter values are broken in favour of stronger
+        # regularization since these appear first along the path
+        self.set_params(**cv_output['params'][
+            int(np.argmax(cv_output['mean_test_score']))])
+
+        return cv_output
+
+    def tune_coh(self, cohort, pheno, tune_splits=2, test_count=None,
+                 parallel_jobs=16, include_samps=None, exclude_samps=None,
+                 include_feats=None, exclude_feats=None, verbose=False):
+        train_omics, train_pheno = cohort.train_data(
+            pheno, include_samps=include_samps, exclude_samps=exclude_samps,
+            include_feats=include_feats, exclude_feats=exclude_feats
+            )
+
+        cv_output = self.tune_path(
+            train_omics.values, np.array(train_pheno), tune_splits,
+            parallel_jobs, random_state=getattr(cohort, 'cv_seed', None)
+            )
+
+        return self, cv_output
+
+
+class BatchLinear(object):
+    """Fits the classifiers of many subgroupings using shared feature data.
+
+    The feature selection and normalization steps of these pipelines do not
+    make use of the labels being predicted, and so for a given training split
+    and set of excluded features they can be fit once and then shared by the
+    classifiers of every subgrouping tested using this split.
+
+    Note that unlike in `tune_coh`, these steps are fit on all of the
+    training samples before the tuning splits are made, so that the means
+    and variances used to select and scale features also include the
+    samples each tuning split holds out.
+
+    """
+
+    def prep_batch(self, cohort, include_feats=None, exclude_feats=None):
+        """Transforms a cohort's -omic data using the non-fitting steps.
+
+        Returns:
+            prep_data (dict)
+                The transformed training ('Train') and testing ('Test')
+                matrices, the training samples in the order of the rows of
+                the former ('Samps'), the genes of the input features
+                ('Feats') and of the features left after selection
+                ('Genes'), and the fitted steps ('Prep').
+
+        """
+        train_omics = cohort.train_data(None, include_feats=include_feats,
+                                        exclude_feats=exclude_feats)[0]
+        test_omics = cohort.test_data(None, include_feats=include_feats,
+                                      exclude_feats=exclude_feats)[0]
+
+        prep_pipe = Pipeline([(step_lbl, clone(step))
+                              for step_lbl, step in self.steps[:-1]])
+        train_mat = prep_pipe.fit_transform(train_omics.values)
+        fit_genes = train_omics.columns.get_level_values(0)
+
+        for _, step in prep_pipe.steps:
+            if hasattr(step, 'get_support'):
+                fit_genes = fit_genes[step.get_support()]
+
+        return {'Train': train_mat,
+                'Test': prep_pipe.transform(test_omics.values),
+                'Samps': train_omics.index,
+                'Feats': train_omics.columns.get_level_values(0),
+                'Genes': fit_genes,
+                'Prep': prep_pipe}
+
+    def tune_batch(self, prep_data, pheno,
+                   tune_splits=2, parallel_jobs=8, random_state=None):
+        """Tunes and fits a subgrouping's classifier on transformed data.
+
+        Returns:
+            fit_est (Pipeline): The fitting step using the best parameters.
+            cv_output (dict): The tuning results as in `tune_coh`.
+
+        """
+        if isinstance(self, PathTune):
+            cv_output = self.tune_path(prep_data['Train'], pheno, tune_splits,
+                                       parallel_jobs, random_state,
+                                       use_prep=False)
+
+            fit_est = Pipeline([('fit', clone(self.named_steps['fit']))])
+            return fit_est.fit(prep_data['Train'], pheno), cv_output
+
+        tune_grid = GridSearchCV(
+            estimator=Pipeline([('fit', clone(self.named_steps['fit']))]),
+            param_grid={par: list(tune_distr)
+                        for par, tune_distr in self.tune_priors},
+            scoring='roc_auc', n_jobs=parallel_jobs, refit=True,
+            cv=StratifiedShuffleSplit(n_splits=tune_splits, test_size=0.2,
+                                      random_state=random_state)
+            )
+
+        tune_grid.fit(prep_data['Train'], pheno)
+        self.set_params(**tune_grid.best_params_)
+
+        return tune_grid.best_estimator_, tune_grid.cv_results_
+
+    def get_batch_coef(self, prep_data, fit_est):
+        return dict(zip(prep_data['Genes'],
+                        fit_est.named_steps['fit'].coef_.ravel()))
+
+    def predict_batch(self, prep_data, fit_est, omic_data=None):
+        """Gets a batch-fit classifier's raw scores for a set of samples.
+
+        Args:
+            omic_data (pd.DataFrame, optional)
+                Another cohort's -omic data to apply the classifier to. If
+                not given, the classifier is applied to the testing samples
+                of the cohort it was trained on. Its features are matched
+                to those of the training cohort by gene, as is done in
+                `transfer_model`.
+
+        """
+        if omic_data is None:
+            omic_mat = prep_data['Test']
+
+        else:
+            use_cols = omic_data.columns.get_level_values(0).isin(
+                prep_data['Feats'])
+            omic_mat = prep_data['Prep'].transform(
+                omic_data.loc[:, use_cols].values)
+
+        return fit_est.decision_function(omic_mat)
+
+
+class Lasso(Base, LinearPipe, BatchLinear):
 
     feat_inst = SelectMeanVar(mean_perc=90, var_perc=100)
 
@@ -22,7 +254,7 @@ class Lasso(Base, LinearPipe):
                                   max_iter=200, class_weight='balanced')
 
 
-class Ridge(Base, LinearPipe):
+class Ridge(Base, LinearPipe, BatchLinear):
 
     feat_inst = SelectMeanVar(mean_perc=90, var_perc=100)
 
@@ -43,6 +275,25 @@ class RidgeMoreTune(Ridge):
     test_count = 32
 
 
+class LassoPath(PathTune, Lasso):
+
+    fit_inst = LogisticRegression(solver='saga', penalty='l1',
+                                  max_iter=200, class_weight='balanced',
+                                  warm_start=True)
+
+
+class RidgePath(PathTune, Ridge):
+
+    fit_inst = LogisticRegression(solver='lbfgs', penalty='l2',
+                                  max_iter=200, class_weight='balanced',
+                                  warm_start=True)
+
+
+class RidgeMoreTunePath(PathTune, RidgeMoreTune):
+
+    fit_inst = RidgePath.fit_inst
+
+
 class SVCrbf(Base, Kernel):
 
     feat_inst = SelectMeanVar(mean_perc=90, var_perc=100)
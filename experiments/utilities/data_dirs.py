@@ -4,6 +4,13 @@ from .data_locs import (
     oncogene_list, subtype_file, vep_cache_dir, domain_dir, expr_sources
     )
 
+# a location for the cache of processed cohorts shared across experiments can
+# optionally be given as well, otherwise cohorts are rebuilt every time
+try:
+    from .data_locs import cohort_cache_dir
+except ImportError:
+    cohort_cache_dir = None
+
 import pipes
 import argparse
 
@@ -1,25 +1,238 @@
-
+import os
 import time
 import bz2
 import dill as pickle
 
+import numpy as np
+import pandas as pd
+
+# faster codecs are used to compress datasets when they are installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+# the bytes each compressed or pickled dataset file starts with
+_FILE_MAGIC = {'zstd': b'\x28\xb5\x2f\xfd', 'lz4': b'\x04\x22\x4d\x18',
+               'bz2': b'BZh', 'pickle': b'\x80'}
+
+# datasets held on to by processes that run many tasks of the same
+# experiment one after another, see `keep_loaded`
+_LOADED_DATA = None
+
+
+def keep_loaded():
+    """Makes this process reuse the datasets it loads with `safe_load`.
+
+    Each file is then only read once by the process for as long as it is not
+    modified, with later loads returning the same object. This is thus only
+    suitable for datasets such as cohorts whose state is reset by each task
+    that uses them, for instance through `update_split`.
+
+    """
+    global _LOADED_DATA
+
+    if _LOADED_DATA is None:
+        _LOADED_DATA = dict()
+
+
+def get_codec():
+    """Finds the fastest codec available for compressing datasets."""
+    if zstandard is not None:
+        use_codec = 'zstd'
+    elif lz4 is not None:
+        use_codec = 'lz4'
+    else:
+        use_codec = 'pickle'
+
+    return use_codec
+
+
+def save_data(data, fl, codec=None):
+    """Saves a dataset so that it only appears once it is complete.
+
+    The dataset is written to a temporary file that is then renamed, which
+    means that any process that finds the file can load all of it without
+    having to wait for it to be finished.
+
+    Args:
+        data: Any object that can be pickled.
+        fl (str): Where the dataset will be saved.
+        codec (str, optional)
+            How the dataset is compressed: one of 'zstd', 'lz4', 'bz2', or
+            'pickle' for no compression. Default is to use the fastest
+            codec available; see `get_codec`.
+
+    """
+    if codec is None:
+        codec = get_codec()
+
+    data_bytes = pickle.dumps(data, protocol=-1)
+    if codec == 'zstd':
+        data_bytes = zstandard.ZstdCompressor(level=3).compress(data_bytes)
+    elif codec == 'lz4':
+        data_bytes = lz4.frame.compress(data_bytes)
+    elif codec == 'bz2':
+        data_bytes = bz2.compress(data_bytes)
+    elif codec != 'pickle':
+        raise ValueError("Unrecognized codec `{}`!".format(codec))
+
+    tmp_fl = "{}.{}.tmp".format(fl, os.getpid())
+    with open(tmp_fl, 'wb') as f:
+        f.write(data_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_fl, fl)
+
+
+def read_data(fl):
+    """Loads a dataset, finding how it was compressed from its first bytes."""
+    with open(fl, 'rb') as f:
+        data_bytes = f.read()
+
+    if data_bytes.startswith(_FILE_MAGIC['zstd']):
+        if zstandard is None:
+            raise ImportError("Package `zstandard` is needed to load the "
+                              "dataset at\n{}".format(fl))
+
+        data_bytes = zstandard.ZstdDecompressor().decompress(data_bytes)
+
+    elif data_bytes.startswith(_FILE_MAGIC['lz4']):
+        if lz4 is None:
+            raise ImportError("Package `lz4` is needed to load the dataset "
+                              "at\n{}".format(fl))
+
+        data_bytes = lz4.frame.decompress(data_bytes)
+
+    elif data_bytes.startswith(_FILE_MAGIC['bz2']):
+        data_bytes = bz2.decompress(data_bytes)
 
-def safe_load(fl, retry_pause=53):
-    load_data = None
+    elif not data_bytes.startswith(_FILE_MAGIC['pickle']):
+        raise ValueError("Unrecognized format for dataset at\n{}".format(fl))
+
+    return pickle.loads(data_bytes)
+
+
+def safe_load(fl, retry_pause=53, max_wait=3600, load_attempts=3):
+    """Loads a dataset, waiting for it to be saved if it isn't there yet.
+
+    Datasets saved using `save_data` are complete as soon as they appear, so
+    the wait between checks for the file starts short and is doubled after
+    each check. Files that can't be loaded are tried again a few times in
+    case they were still being written by a process not using `save_data`
+    before the error is raised.
+
+    Args:
+        fl (str): The dataset's file.
+        retry_pause (int, optional)
+            The longest time (in seconds) to wait between attempts.
+        max_wait (int, optional)
+            How long (in seconds) to wait for the file to appear.
+        load_attempts (int, optional)
+            How many times to try loading the file once it appears.
+
+    """
+    load_pause = 1
+    wait_start = time.time()
+
+    while not os.path.exists(fl):
+        if time.time() - wait_start > max_wait:
+            raise FileNotFoundError("Dataset at\n{}\nwas not found after "
+                                    "waiting {}s!".format(fl, max_wait))
+
+        time.sleep(load_pause)
+        load_pause = min(load_pause * 2, retry_pause)
+
+    for load_i in range(load_attempts):
+        fl_stat = os.stat(fl)
+        fl_stamp = fl_stat.st_mtime, fl_stat.st_size
+
+        if (_LOADED_DATA is not None and fl in _LOADED_DATA
+                and _LOADED_DATA[fl][0] == fl_stamp):
+            return _LOADED_DATA[fl][1]
 
-    while load_data is None:
         try:
-            if fl[-2:] == 'gz':
-                with bz2.BZ2File(fl, 'r') as data_f:
-                    load_data = pickle.load(data_f)
+            load_data = read_data(fl)
+            break
+
+        except (ImportError, MemoryError):
+            raise
 
-            else:
-                with open(fl, 'rb') as data_f:
-                    load_data = pickle.load(data_f)
+        except Exception:
+            if load_i == (load_attempts - 1):
+                raise
 
-        except:
             print("Failed to load data from\n{}\ntrying again...".format(fl))
-            time.sleep(retry_pause)
+            time.sleep(load_pause)
+            load_pause = min(load_pause * 2, retry_pause)
+
+    if _LOADED_DATA is not None:
+        _LOADED_DATA[fl] = fl_stamp, load_data
 
     return load_data
 
+
+def write_shared_cohort(cdata, setup_dir):
+    """Saves a cohort so that processes can share its expression data.
+
+    The expression matrix is saved as an uncompressed array that processes
+    on the same node map into memory read-only instead of each unpickling a
+    copy of their own, with the rest of the cohort including its mutation
+    trees pickled separately. The latter is written last, so that processes
+    loading the cohort never see the matrix partially written.
+
+    Args:
+        cdata (BaseMutationCohort)
+        setup_dir (str): Where an experiment's setup output is saved.
+
+    """
+    expr_df = cdata.omic_data
+    expr_path = os.path.join(setup_dir, "cohort-expr.npy")
+    tmp_path = "{}.{}.tmp".format(expr_path, os.getpid())
+
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(expr_df.values))
+    os.replace(tmp_path, expr_path)
+
+    save_data((expr_df.index, expr_df.columns),
+              os.path.join(setup_dir, "cohort-expr__labels.p"))
+    cdata.omic_data = expr_df.iloc[:, :0]
+
+    try:
+        save_data(cdata, os.path.join(setup_dir, "cohort-muts.p"))
+    finally:
+        cdata.omic_data = expr_df
+
+
+def load_setup_cohort(setup_dir, retry_pause=53):
+    """Loads the cohort saved during an experiment's setup stage.
+
+    The copy of the cohort saved by `write_shared_cohort` is used where it is
+    available, with the expression data mapped into memory read-only.
+
+    """
+    muts_path = os.path.join(setup_dir, "cohort-muts.p")
+
+    if os.path.exists(muts_path):
+        cdata = safe_load(muts_path, retry_pause)
+
+        expr_samps, expr_feats = read_data(
+            os.path.join(setup_dir, "cohort-expr__labels.p"))
+
+        expr_mat = np.load(os.path.join(setup_dir, "cohort-expr.npy"),
+                           mmap_mode='r')
+        cdata.omic_data = pd.DataFrame(expr_mat, index=expr_samps,
+                                       columns=expr_feats, copy=False)
+
+    else:
+        cdata = safe_load(os.path.join(setup_dir, "cohort-data.p.gz"),
+                          retry_pause)
+
+    return cdata
@@ -2,7 +2,7 @@
 from dryadic.features.mutations import MuType
 import numpy as np
 import pandas as pd
-from scipy.stats import ks_2samp, norm
+from scipy.stats import ks_2samp, norm, rankdata
 
 
 def calculate_mean_siml(wt_vals, mut_vals, other_vals,
@@ -94,30 +94,128 @@ def compare_scores(iso_df, samps, muts_dict,
     return pheno_dict, auc_df, simil_df
 
 
+def _auc_from_ranks(rank_sums, mut_n, wt_n):
+    """Turns mutated samples' rank sums into Mann-Whitney U statistics.
+
+    The average ranks assigned to tied scores make the statistic equivalent
+    to counting the mutated/wild-type pairs where the mutated sample has the
+    higher score, with ties counting as half a pair.
+
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        auc_vals = (rank_sums - mut_n * (mut_n + 1) / 2) / (mut_n * wt_n)
+
+    return np.where((mut_n == 0) | (wt_n == 0), 0.5, auc_vals)
+
+
+def calc_aucs(vals, stats):
+    """Calculates the areas under the ROC curve of many label vectors.
+
+    Args:
+        vals (np.array)
+            A vector of continuous predicted labels, or a samples x cv-folds
+            matrix of such labels, in which case the scores from all of the
+            folds are pooled together.
+        stats (np.array)
+            A label vectors x samples matrix of ground truth binary labels.
+
+    Returns:
+        auc_vals (np.array): An AUC for each of the label vectors.
+
+    """
+    vals = np.asarray(vals, dtype=float)
+    stats = np.atleast_2d(np.asarray(stats, dtype=bool))
+    fold_count = vals.size // vals.shape[0]
+
+    # ranks are found once for the scores and then shared by every label
+    # vector, with all of a sample's scores across folds pooled together
+    samp_ranks = rankdata(vals).reshape(vals.shape[0], -1).sum(axis=1)
+    mut_n = stats.sum(axis=1) * fold_count
+    wt_n = (~stats).sum(axis=1) * fold_count
+
+    return _auc_from_ranks(stats.astype(float) @ samp_ranks, mut_n, wt_n)
+
+
 def calc_auc(vals, stat):
     """Calculates the area under the ROC curve
 
     Args:
-        vals (np.array): A vector of continuous predicted labels.
+        vals (np.array)
+            A vector of continuous predicted labels, or a samples x cv-folds
+            matrix of such labels, in which case the scores from all of the
+            folds are pooled together.
         stat (np.array): The ground truth binary class labels.
 
     Returns:
         auc_val (float)
 
     """
-    if stat.all() or not stat.any():
-        auc_val = 0.5
+    return calc_aucs(vals, stat)[0]
+
+
+def calc_fold_aucs(vals, stats):
+    """Calculates the AUC of each cross-validation fold's scores separately.
+
+    Args:
+        vals (np.array): A samples x cv-folds matrix of predicted labels.
+        stats (np.array)
+            The ground truth binary class labels, or a label vectors x
+            samples matrix of such labels.
+
+    Returns:
+        auc_vals (np.array)
+            An AUC for each fold, or a label vectors x cv-folds matrix of
+            AUCs if many label vectors were given.
+
+    """
+    stats = np.asarray(stats, dtype=bool)
+    fold_ranks = rankdata(np.asarray(vals, dtype=float), axis=0)
+    mut_n = np.expand_dims(stats.sum(axis=-1), -1)
 
-    else:
-        auc_val = np.greater.outer(vals[stat], vals[~stat]).mean()
-        auc_val += 0.5 * np.equal.outer(vals[stat], vals[~stat]).mean()
+    return _auc_from_ranks(stats.astype(float) @ fold_ranks,
+                           mut_n, stats.shape[-1] - mut_n)
 
-    return auc_val
+
+def calc_auc_dict(pred_mats, pheno_dict):
+    """Calculates the AUCs summarizing each subgrouping task's performance.
+
+    Args:
+        pred_mats (dict)
+            A samples x cv-folds matrix of predicted labels for each of the
+            subgroupings tested.
+        pheno_dict (dict): The ground truth labels for each subgrouping.
+
+    Returns:
+        auc_dict (dict)
+            The AUCs calculated using the scores from all cross-validation
+            folds pooled together ('all'), using the scores from each fold
+            separately ('CV'), and using the average of each sample's scores
+            across folds ('mean').
+
+    """
+    return {
+        'all': pd.Series({mtype: calc_auc(pred_mat, pheno_dict[mtype])
+                          for mtype, pred_mat in pred_mats.items()}),
+
+        'CV': pd.Series({
+            mtype: calc_fold_aucs(pred_mats[mtype],
+                                  pheno_dict[mtype]).tolist()
+            for mtype in sorted(pred_mats)
+            }),
+
+        'mean': pd.Series({
+            mtype: calc_auc(pred_mat.mean(axis=1), pheno_dict[mtype])
+            for mtype, pred_mat in pred_mats.items()
+            })
+        }
 
 
 def calc_conf(auc_vals1, auc_vals2):
-    return (np.greater.outer(auc_vals1, auc_vals2).mean()
-            + 0.5 * np.equal.outer(auc_vals1, auc_vals2).mean())
+    auc_vals1, auc_vals2 = np.ravel(auc_vals1), np.ravel(auc_vals2)
+
+    return calc_auc(np.concatenate([auc_vals1, auc_vals2]),
+                    np.arange(auc_vals1.size + auc_vals2.size)
+                    < auc_vals1.size)
 
 
 def calc_delong(preds1, preds2, stat, auc1=None, auc2=None):
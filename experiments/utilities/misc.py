@@ -1,10 +1,19 @@
 
+import os
+import hashlib
+from pathlib import Path
 import numpy as np
+import pandas as pd
 from colorsys import hls_to_rgb
 import dill as pickle
 from importlib import import_module
 
 
+# expression data of the cohorts subgrouping classifiers are transferred to
+# that have already been loaded by this process
+_TRNSF_EXPR = dict()
+
+
 def get_label(mut):
     return next(mut.label_iter())
 
@@ -43,12 +52,87 @@ def choose_label_colour(gene, clr_seed=15707, clr_lum=0.5, clr_sat=0.8):
     return hls_to_rgb(h=np.random.uniform(size=1)[0], l=clr_lum, s=clr_sat)
 
 
-def transfer_model(trnsf_fl, clf, use_feats):
-    with open(trnsf_fl, 'rb') as f:
-        trnsf_preds = clf.predict_omic(pickle.load(f).train_data(
-            pheno=None, include_feats=use_feats)[0], lbl_type='raw')
+def load_transfer_expr(trnsf_fl, feat_list=None):
+    """Gets the expression data of a cohort classifiers are transferred to.
+
+    The pickled cohort is only read the first time the data is asked for in a
+    given process. A memory-mappable copy of the expression matrix restricted
+    to the given features is also saved next to the cohort so that the other
+    processes transferring classifiers to it don't have to unpickle it. Each
+    copy is labelled by the features it was restricted to, and records the
+    size and modification time of the cohort file it was made from so that
+    copies left over from other versions of the cohort are never used.
+
+    Args:
+        trnsf_fl (str or Path): A pickled transfer cohort.
+        feat_list (set, optional)
+            The expression features used by the experiment.
+
+    Returns:
+        trnsf_expr (pd.DataFrame)
+
+    """
+    trnsf_fl = Path(trnsf_fl)
+
+    if feat_list is None:
+        feat_lbl = 'all'
+    else:
+        feat_lbl = hashlib.sha1(repr(sorted(
+            str(feat) for feat in feat_list)).encode()).hexdigest()[:12]
+
+    trnsf_stat = trnsf_fl.stat()
+    trnsf_stamp = trnsf_stat.st_size, trnsf_stat.st_mtime_ns
+    trnsf_key = trnsf_fl, feat_lbl
+
+    if (trnsf_key not in _TRNSF_EXPR
+            or _TRNSF_EXPR[trnsf_key][0] != trnsf_stamp):
+        expr_fl = trnsf_fl.with_name("{}__{}.npy".format(
+            trnsf_fl.stem.replace('cohort-data__', 'trnsf-expr__'), feat_lbl))
+        lbls_fl = expr_fl.with_suffix('.p')
+        trnsf_lbls = None
+
+        if expr_fl.exists() and lbls_fl.exists():
+            with open(lbls_fl, 'rb') as f:
+                trnsf_lbls = pickle.load(f)
+
+            if trnsf_lbls[0] != trnsf_stamp:
+                trnsf_lbls = None
+
+        if trnsf_lbls is not None:
+            _, trnsf_samps, trnsf_feats = trnsf_lbls
+            trnsf_mat = np.load(expr_fl, mmap_mode='r')
+
+        else:
+            with open(trnsf_fl, 'rb') as f:
+                trnsf_df = pickle.load(f).train_data(
+                    pheno=None, include_feats=feat_list)[0]
+
+            trnsf_samps, trnsf_feats = trnsf_df.index, trnsf_df.columns
+            trnsf_mat = trnsf_df.values
+
+            # writes the matrix before its labels so that processes loading
+            # the cohort at the same time never see a partially written copy
+            tmp_tag = ".{}.tmp".format(os.getpid())
+            with open(str(expr_fl) + tmp_tag, 'wb') as f:
+                np.save(f, trnsf_mat)
+            with open(str(lbls_fl) + tmp_tag, 'wb') as f:
+                pickle.dump((trnsf_stamp, trnsf_samps, trnsf_feats), f,
+                            protocol=-1)
+
+            os.replace(str(expr_fl) + tmp_tag, str(expr_fl))
+            os.replace(str(lbls_fl) + tmp_tag, str(lbls_fl))
+
+        _TRNSF_EXPR[trnsf_key] = trnsf_stamp, pd.DataFrame(
+            trnsf_mat, index=trnsf_samps, columns=trnsf_feats, copy=False)
+
+    return _TRNSF_EXPR[trnsf_key][1]
+
+
+def transfer_model(trnsf_fl, clf, use_feats, feat_list=None):
+    trnsf_expr = load_transfer_expr(trnsf_fl, feat_list)
+    use_cols = trnsf_expr.columns.get_level_values(0).isin(use_feats)
 
-    return trnsf_preds
+    return clf.predict_omic(trnsf_expr.loc[:, use_cols], lbl_type='raw')
 
 
 def load_mut_clf(clf_lbl):
@@ -5,7 +5,7 @@ Novel mutation types introduced across various experiments.
 from dryadic.features.mutations import MuType, MutComb
 from functools import reduce
 from operator import or_, and_
-from scipy.stats import rv_discrete
+import numpy as np
 import random
 
 
@@ -169,37 +169,28 @@ class ExMcomb(MutComb):
 
 
 class RandomType(MuType):
+    """A random set of samples chosen from a cohort or from a subgrouping.
 
-    def __init__(self, size_dist, base_mtype=None, seed=None):
-        self.size_dist = size_dist
-        self.base_mtype = base_mtype
-        self.seed = seed
+    The size of the set is drawn from the given distribution, and then the
+    samples themselves are chosen, using the same random streams as the
+    scipy distribution and global random state previously used for this so
+    that existing seeds still produce the same sets of samples. Draws are
+    only made once a set is asked for, after which they are cached for the
+    mutation trees they were made from.
 
-        if isinstance(size_dist, int):
-            self.size_rv = rv_discrete(a=size_dist, b=size_dist,
-                                       values=([size_dist], [1]), seed=seed)
-
-        elif len(size_dist) == 2 and isinstance(size_dist[0], int):
-            self.size_rv = rv_discrete(
-                a=size_dist[0], b=size_dist[1],
-                values=([x for x in range(size_dist[0], size_dist[1] + 1)],
-                        [(size_dist[1] + 1 - size_dist[0]) ** -1
-                         for _ in range(size_dist[0], size_dist[1] + 1)]),
-                seed=seed
-                )
-
-        elif isinstance(size_dist, set):
-            self.size_rv = rv_discrete(
-                a=min(size_dist), b=max(size_dist),
-                values=(sorted(size_dist),
-                        [len(size_dist) ** -1 for _ in size_dist]),
-                seed=seed
-                )
+    """
 
-        else:
+    def __init__(self, size_dist, base_mtype=None, seed=None):
+        if not (isinstance(size_dist, (int, set))
+                or (len(size_dist) == 2 and isinstance(size_dist[0], int))):
             raise ValueError("Unrecognized size distribution "
                              "`{}` !".format(size_dist))
 
+        self.size_dist = size_dist
+        self.base_mtype = base_mtype
+        self.seed = seed
+        self._samps_cache = None
+
         super().__init__([])
 
     def __getstate__(self):
@@ -208,6 +199,25 @@ class RandomType(MuType):
     def __setstate__(self, state):
         self.__init__(state[0], base_mtype=state[1], seed=state[2])
 
+    def get_size(self):
+        """Draws the number of samples in this random set."""
+        if isinstance(self.size_dist, int):
+            size_vals = [self.size_dist]
+        elif isinstance(self.size_dist, set):
+            size_vals = sorted(self.size_dist)
+        else:
+            size_vals = list(range(self.size_dist[0], self.size_dist[1] + 1))
+
+        # replicates how a scipy discrete distribution with uniform
+        # probabilities over these values samples from them
+        if self.seed is None:
+            unif_val = np.random.uniform()
+        else:
+            unif_val = np.random.RandomState(self.seed).uniform()
+
+        size_qs = np.cumsum([len(size_vals) ** -1 for _ in size_vals])
+        return size_vals[int(np.argmax(size_qs >= unif_val))]
+
     def __hash__(self):
         value = 0x302378 ^ (hash(self.base_mtype) * hash(self.size_dist)
                             * hash(self.seed))
@@ -282,16 +292,28 @@ class RandomType(MuType):
             return NotImplemented
 
     def get_samples(self, *mtrees):
-        #TODO: having two random seed setups is not great
-        random.seed(self.seed)
-        use_size = self.size_rv.rvs(random_state=self.seed)
+        if self.seed is not None and self._samps_cache is not None:
+            cache_trees, cache_samps = self._samps_cache
+
+            if (len(cache_trees) == len(mtrees)
+                    and all(cache_tree is mtree for cache_tree, mtree
+                            in zip(cache_trees, mtrees))):
+                return set(cache_samps)
 
         if self.base_mtype:
             use_samps = self.base_mtype.get_samples(*mtrees)
         else:
             use_samps = mtrees[0].get_samples()
 
-        return set(random.sample(sorted(use_samps), k=use_size))
+        # uses a separate random state seeded the same way as the global
+        # random state used to be, which leaves the latter untouched
+        rand_samps = frozenset(random.Random(self.seed).sample(
+            sorted(use_samps), k=self.get_size()))
+
+        if self.seed is not None:
+            self._samps_cache = mtrees, rand_samps
+
+        return set(rand_samps)
 
     def get_sorted_levels(self):
         if self.base_mtype is None:
@@ -0,0 +1,259 @@
+"""
+Storing the consolidated output of an experiment as dense arrays that can be
+read one gene's or one subgrouping's worth at a time.
+
+A store is a directory with an index of the subgroupings, samples, and genes
+it covers and one chunk of arrays per gene the subgroupings are associated
+with: float32 predicted scores (subgroupings x samples x CV runs), float32
+model coefficients (subgroupings x gene features x CV folds), and bit-packed
+mutation statuses (subgroupings x samples).
+
+Example usage:
+    python -m dryads-research.experiments.utilities.output_store \
+        $DATADIR/dryads-research/subgrouping_test/Firehose__LUAD__samps-20 \
+        Consequence__Exon__Ridge
+
+"""
+
+from .mutations import RandomType
+
+import os
+import argparse
+import bz2
+import shutil
+import dill as pickle
+
+import numpy as np
+import pandas as pd
+
+
+def get_store_key(mtype):
+    """Finds the chunk of a store a subgrouping's output is saved in."""
+    if isinstance(mtype, RandomType) and mtype.base_mtype is None:
+        store_key = None
+    else:
+        store_key = '_'.join(sorted(set(mtype.label_iter())))
+
+    return store_key
+
+
+def write_output_store(store_dir, pred_df, coef_df, pheno_dict):
+    """Saves an experiment's consolidated output as an array store.
+
+    Args:
+        store_dir (str): Where the store will be created.
+        pred_df (pd.DataFrame)
+            Subgroupings x samples, with each cell containing an array of
+            scores from the CV runs the sample was tested in.
+        coef_df (pd.DataFrame)
+            Subgroupings x gene features, with a column for each feature in
+            each CV fold as produced by `gather_test`.
+        pheno_dict (dict)
+            The mutation status of each subgrouping, with samples in the same
+            order as the columns of `pred_df`.
+
+    """
+    mtype_list = sorted(pred_df.index)
+    assert sorted(coef_df.index) == mtype_list, (
+        "Subgroupings with coefficients don't match those with predictions!")
+    assert sorted(pheno_dict) == mtype_list, (
+        "Subgroupings with statuses don't match those with predictions!")
+    assert all(len(phn) == pred_df.shape[1] for phn in pheno_dict.values()), (
+        "Statuses must be given for each sample with predictions!")
+
+    # orders coefficient columns by feature while preserving fold order
+    fold_counts = coef_df.columns.value_counts()
+    assert (fold_counts == fold_counts.iloc[0]).all(), (
+        "Each feature must have a coefficient in every CV fold!")
+
+    coef_indx = np.argsort(coef_df.columns.values, kind='mergesort')
+    coef_genes = coef_df.columns[coef_indx].unique()
+    coef_mat = coef_df.iloc[:, coef_indx].values.reshape(
+        coef_df.shape[0], len(coef_genes), -1)
+    coef_mat = coef_mat[coef_df.index.get_indexer(mtype_list)]
+
+    chunk_dict = dict()
+    for i, mtype in enumerate(mtype_list):
+        store_key = get_store_key(mtype)
+        chunk_dict[store_key] = chunk_dict.get(store_key, []) + [i]
+
+    # writes to a temporary directory first so that an incomplete store is
+    # never left in the place of a complete one, clearing out any left by an
+    # earlier attempt that crashed while running under the same process ID
+    tmp_dir = "{}.{}.tmp".format(store_dir.rstrip(os.sep), os.getpid())
+    old_dir = "{}.{}.old".format(store_dir.rstrip(os.sep), os.getpid())
+
+    for stale_dir in [tmp_dir, old_dir]:
+        if os.path.exists(stale_dir):
+            shutil.rmtree(stale_dir)
+
+    os.makedirs(tmp_dir)
+    store_index = {'Muts': mtype_list, 'Samps': pred_df.columns.tolist(),
+                   'Genes': coef_genes.tolist(), 'Chunks': dict()}
+
+    for chunk_id, (store_key, mtype_indx) in enumerate(chunk_dict.items()):
+        chunk_muts = [mtype_list[i] for i in mtype_indx]
+        store_index['Chunks'][store_key] = chunk_id, chunk_muts
+
+        pred_mat = np.stack([np.stack(pred_df.loc[mtype].values)
+                             for mtype in chunk_muts]).astype(np.float32)
+        pheno_mat = np.packbits(np.stack([pheno_dict[mtype]
+                                          for mtype in chunk_muts]), axis=1)
+
+        np.save(os.path.join(tmp_dir, "pred_{}.npy".format(chunk_id)),
+                pred_mat)
+        np.save(os.path.join(tmp_dir, "coef_{}.npy".format(chunk_id)),
+                coef_mat[mtype_indx].astype(np.float32))
+        np.save(os.path.join(tmp_dir, "pheno_{}.npy".format(chunk_id)),
+                pheno_mat)
+
+    with open(os.path.join(tmp_dir, "index.p"), 'wb') as f:
+        pickle.dump(store_index, f, protocol=-1)
+
+    # any existing store is moved aside rather than deleted before the new
+    # store takes its place, so that readers only miss it between renames
+    if os.path.exists(store_dir):
+        os.rename(store_dir, old_dir)
+        os.rename(tmp_dir, store_dir)
+        shutil.rmtree(old_dir)
+
+    else:
+        os.rename(tmp_dir, store_dir)
+
+
+def load_store_index(store_dir):
+    with open(os.path.join(store_dir, "index.p"), 'rb') as f:
+        store_index = pickle.load(f)
+
+    return store_index
+
+
+def _parse_chunk(store_dir, store_index, chunk_id, mtypes, out_type, indx):
+    chunk_mat = np.load(os.path.join(store_dir, "{}_{}.npy".format(
+        out_type, chunk_id)), mmap_mode='r')[indx]
+
+    if out_type == 'pred':
+        chunk_out = pd.DataFrame(
+            {samp: list(chunk_mat[:, j]) for j, samp
+             in enumerate(store_index['Samps'])},
+            index=mtypes
+            )
+
+    elif out_type == 'coef':
+        chunk_out = {mtype: pd.DataFrame(chunk_mat[i],
+                                         index=store_index['Genes'])
+                     for i, mtype in enumerate(mtypes)}
+
+    elif out_type == 'pheno':
+        chunk_mat = np.unpackbits(chunk_mat, axis=1).astype(bool)
+        chunk_out = {mtype: chunk_mat[i, :len(store_index['Samps'])]
+                     for i, mtype in enumerate(mtypes)}
+
+    else:
+        raise ValueError("Unrecognized output type `{}`!".format(out_type))
+
+    return chunk_out
+
+
+def load_store_gene(store_dir, gene, out_type, store_index=None):
+    """Reads the output of the subgroupings associated with a gene.
+
+    Args:
+        store_dir (str): A store created by `write_output_store`.
+        gene (str or None)
+            A mutated gene, or None for the random subgroupings chosen from
+            all of the cohort's samples.
+        out_type (str): One of 'pred', 'coef', or 'pheno'.
+        store_index (dict, optional): The store's index, if already loaded.
+
+    Returns:
+        gene_out
+            A subgroupings x samples DataFrame of score arrays for 'pred',
+            a feature x CV fold DataFrame for each subgrouping for 'coef',
+            and a vector of mutation statuses for each subgrouping for
+            'pheno'. An empty DataFrame or dictionary is returned if the gene
+            is not in the store.
+
+    """
+    if store_index is None:
+        store_index = load_store_index(store_dir)
+
+    if gene not in store_index['Chunks']:
+        gene_out = pd.DataFrame() if out_type == 'pred' else dict()
+
+    else:
+        chunk_id, chunk_muts = store_index['Chunks'][gene]
+        gene_out = _parse_chunk(store_dir, store_index, chunk_id,
+                                chunk_muts, out_type, slice(None))
+
+    return gene_out
+
+
+def load_store_mtype(store_dir, mtype, out_type, store_index=None):
+    """Reads the output of a single subgrouping.
+
+    Only the part of the subgrouping's chunk corresponding to the subgrouping
+    is read from disk. See `load_store_gene` for arguments and output format.
+
+    """
+    if store_index is None:
+        store_index = load_store_index(store_dir)
+
+    chunk_id, chunk_muts = store_index['Chunks'][get_store_key(mtype)]
+    mtype_indx = chunk_muts.index(mtype)
+
+    return _parse_chunk(store_dir, store_index, chunk_id, [mtype], out_type,
+                        slice(mtype_indx, mtype_indx + 1))
+
+
+def load_store_coefs(store_dir, gene, store_index=None):
+    """Reads the coefficients of the subgroupings associated with a gene.
+
+    Returns:
+        coef_df (pd.DataFrame)
+            Subgroupings x gene features, with a column for each feature in
+            each CV fold as produced by `gather_test`.
+
+    """
+    if store_index is None:
+        store_index = load_store_index(store_dir)
+
+    coef_dict = load_store_gene(store_dir, gene, 'coef', store_index)
+    if coef_dict:
+        fold_count = tuple(coef_dict.values())[0].shape[1]
+    else:
+        fold_count = 0
+
+    return pd.DataFrame(
+        [coef_vals.values.ravel() for coef_vals in coef_dict.values()],
+        index=list(coef_dict),
+        columns=np.repeat(store_index['Genes'], fold_count)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        'output_store',
+        description="Converts pickled experiment output into an array store."
+        )
+
+    parser.add_argument('out_dir', type=str,
+                        help="a directory with an experiment's final output")
+    parser.add_argument('out_tag', type=str,
+                        help="the mutation levels and classifier used")
+    args = parser.parse_args()
+
+    out_data = dict()
+    for out_type in ['pred', 'coef', 'pheno']:
+        with bz2.BZ2File(os.path.join(args.out_dir, "out-{}__{}.p.gz".format(
+                out_type, args.out_tag)), 'r') as f:
+            out_data[out_type] = pickle.load(f)
+
+    write_output_store(
+        os.path.join(args.out_dir, "out-store__{}".format(args.out_tag)),
+        out_data['pred'], out_data['coef'], out_data['pheno']
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,20 @@ import argparse
 import bz2
 import dill as pickle
 import pipes
+from pathlib import Path
 from math import ceil
 
+import numpy as np
+import pandas as pd
+import random
+import heapq
+
 DIV_LINE = "=====\n"
 
+# how classifiers are tuned in each cross-validation fold of an experiment
+TUNE_SPLITS = 4
+PARALLEL_JOBS = 8
+
 
 def get_task_arr(out_dir):
     tasks_file = open(os.path.join(out_dir, 'setup', "tasks.txt"), 'r')
@@ -38,6 +48,288 @@ def get_task_count(out_dir):
     return task_count
 
 
+def get_task_assignment(out_dir, mtype_list, shuffle=True):
+    """Finds which task each of an experiment's subgroupings was assigned to.
+
+    Args:
+        out_dir (str): Where an experiment's intermediate output is stored.
+        mtype_list (list)
+            The subgroupings in the order they were saved during setup.
+        shuffle (bool, optional)
+            Whether the subgroupings were shuffled before being dealt out to
+            tasks by experiments set up before task manifests were saved.
+
+    Returns:
+        task_dict (dict): The task ID of each subgrouping.
+
+    """
+    manifest_path = os.path.join(out_dir, 'setup', "task-manifest.p")
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'rb') as f:
+            task_list = pickle.load(f)['Tasks']
+
+        assert len(task_list) == len(mtype_list), (
+            "Task manifest doesn't match the subgroupings enumerated "
+            "during setup!"
+            )
+
+    else:
+        task_count = get_task_count(out_dir)
+        task_list = [None for _ in mtype_list]
+        mtype_indx = list(range(len(mtype_list)))
+
+        if shuffle:
+            random.Random(10301).shuffle(mtype_indx)
+        for i, indx in enumerate(mtype_indx):
+            task_list[indx] = i % task_count
+
+    return dict(zip(mtype_list, task_list))
+
+
+def calc_fold_time(fit_times):
+    """Estimates how long it took to tune and fit a classifier in one fold.
+
+    Args:
+        fit_times (list)
+            The average time taken to fit the classifier across tuning
+            splits for each of the hyper-parameter values tested.
+
+    """
+    return (np.sum(fit_times) * TUNE_SPLITS / PARALLEL_JOBS
+            + np.mean(fit_times))
+
+
+def parse_fit_costs(tune_file, pheno_file):
+    """Finds the cost of each of a previous experiment's subgroupings."""
+    with bz2.BZ2File(tune_file, 'r') as f:
+        tune_data = pickle.load(f)
+    with bz2.BZ2File(pheno_file, 'r') as f:
+        pheno_dict = pickle.load(f)
+
+    # experiments which test subgroupings in more than one context save a
+    # set of tuning statistics for each context
+    if isinstance(tune_data[1], dict):
+        time_dfs = list(tune_data[1].values())
+    else:
+        time_dfs = [tune_data[1]]
+
+    mtype_times = sum(time_df['avg'].applymap(calc_fold_time).mean(axis=1)
+                      for time_df in time_dfs)
+    use_muts = [mtype for mtype in mtype_times.index if mtype in pheno_dict]
+
+    return pd.DataFrame({
+        'Classif': tune_data[3].__name__,
+        'Priors': len(tune_data[3].tune_priors),
+        'Tests': tune_data[3].test_count,
+        'Samps': [len(pheno_dict[mtype]) for mtype in use_muts],
+        'Muts': [np.sum(pheno_dict[mtype]) for mtype in use_muts],
+        'Time': mtype_times[use_muts].values
+        })
+
+
+def load_fit_costs(cost_dir):
+    """Collects the costs of the subgroupings tested in previous experiments.
+
+    Args:
+        cost_dir (str)
+            Where to look for the tuning statistics and mutation statuses
+            saved as the final output of previous runs of an experiment.
+
+    Returns:
+        cost_df (pd.DataFrame)
+            The classifier used, its tuning grid, the number of samples and
+            mutated samples, and the time taken to test each subgrouping.
+
+    """
+    cache_path = os.path.join(cost_dir, "fit-costs.p")
+    cost_cache = dict()
+    new_cache = dict()
+
+    # parsed costs are cached so that only new output files are read
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as f:
+            cost_cache = pickle.load(f)
+
+    for tune_file in sorted(Path(cost_dir).glob("**/out-tune_*.p.gz")):
+        pheno_file = tune_file.with_name(
+            tune_file.name.replace('out-tune', 'out-pheno', 1))
+
+        if pheno_file.exists():
+            file_stamp = (tune_file.stat().st_mtime,
+                          pheno_file.stat().st_mtime)
+
+            if (str(tune_file) in cost_cache
+                    and cost_cache[str(tune_file)][0] == file_stamp):
+                new_cache[str(tune_file)] = cost_cache[str(tune_file)]
+
+            else:
+                new_cache[str(tune_file)] = file_stamp, parse_fit_costs(
+                    tune_file, pheno_file)
+
+    if new_cache != cost_cache:
+        with open(cache_path, 'wb') as f:
+            pickle.dump(new_cache, f, protocol=-1)
+
+    if new_cache:
+        cost_df = pd.concat([fl_costs for _, fl_costs in new_cache.values()],
+                            ignore_index=True)
+    else:
+        cost_df = pd.DataFrame(columns=['Classif', 'Priors', 'Tests',
+                                        'Samps', 'Muts', 'Time'])
+
+    return cost_df
+
+
+def get_cost_features(cost_df, clf_list):
+    return np.column_stack([
+        np.ones(cost_df.shape[0]),
+        np.log(cost_df.Samps.values.astype(float)),
+        np.log1p(cost_df.Muts.values.astype(float)),
+        np.log1p((cost_df.Samps - cost_df.Muts).values.astype(float)),
+        np.log(cost_df.Tests.values.astype(float)),
+        cost_df.Priors.values.astype(float),
+        ] + [(cost_df.Classif == clf).values.astype(float)
+             for clf in clf_list])
+
+
+def fit_cost_model(cost_df, reg_val=1.):
+    """Fits a log-linear model of how long subgroupings take to test.
+
+    The time taken is modelled using the sizes of the cohort and of the
+    subgrouping and the size of the classifier's tuning grid, along with an
+    indicator for each classifier which is shrunk towards zero so that
+    classifiers with fewer past runs rely more on their tuning grids.
+
+    """
+    clf_list = sorted(set(cost_df.Classif))
+    feat_mat = get_cost_features(cost_df, clf_list)
+    time_vec = np.log(np.maximum(cost_df.Time.values.astype(float), 1e-3))
+
+    pen_mat = np.diag([0.] * 6 + [reg_val] * len(clf_list))
+    cost_coef = np.linalg.lstsq(feat_mat.T @ feat_mat + pen_mat,
+                                feat_mat.T @ time_vec, rcond=None)[0]
+
+    return {'Classifs': clf_list, 'Coef': cost_coef}
+
+
+def predict_costs(cost_model, cost_df):
+    feat_mat = get_cost_features(cost_df, cost_model['Classifs'])
+
+    return np.exp(feat_mat @ cost_model['Coef'])
+
+
+def pack_tasks(task_costs, task_count):
+    """Assigns items to tasks using the longest-processing-time-first rule.
+
+    Items are taken in order of decreasing cost, with ties broken by the
+    order they were given in, and each is added to the task with the least
+    total cost so far. Items with equal costs are thus dealt out in turn.
+
+    Returns:
+        task_list (list): The task each item was assigned to.
+        task_loads (list): The total cost of the items in each task.
+
+    """
+    task_heap = [(0., task_id) for task_id in range(task_count)]
+    task_list = [None for _ in task_costs]
+
+    for i in sorted(range(len(task_costs)), key=lambda i: -task_costs[i]):
+        task_load, task_id = heapq.heappop(task_heap)
+        task_list[i] = task_id
+        heapq.heappush(task_heap, (task_load + task_costs[i], task_id))
+
+    task_loads = [task_load for task_load, _ in sorted(
+        task_heap, key=lambda task: task[1])]
+
+    return task_list, task_loads
+
+
+def estimate_task_costs(cdata, mtype_list, classif, cost_dir,
+                        min_runs=100):
+    """Estimates how long each subgrouping will take to test in one fold.
+
+    Args:
+        cdata (BaseMutationCohort): The cohort the experiment is run on.
+        mtype_list (list): The experiment's subgroupings.
+        classif (str): The classifier used to test the subgroupings.
+        cost_dir (str): See `load_fit_costs`.
+        min_runs (int, optional)
+            How many subgroupings must have been tested in previous runs of
+            the experiment for the costs to be estimated.
+
+    Returns:
+        mtype_costs (np.array)
+            The estimated time in minutes taken by each subgrouping, or None
+            if there were not enough previous runs using the classifier.
+
+    """
+    cost_df = load_fit_costs(cost_dir)
+    mtype_costs = None
+
+    if cost_df.shape[0] >= min_runs and (cost_df.Classif == classif).any():
+        clf_info = cost_df.loc[cost_df.Classif == classif].iloc[-1]
+        cdata.update_split(test_prop=0)
+
+        mtype_df = pd.DataFrame({
+            'Classif': classif, 'Priors': clf_info.Priors,
+            'Tests': clf_info.Tests, 'Samps': len(cdata.get_samples()),
+            'Muts': [np.sum(cdata.train_pheno(mtype))
+                     for mtype in mtype_list]
+            })
+
+        mtype_costs = predict_costs(fit_cost_model(cost_df), mtype_df) / 60
+
+    return mtype_costs
+
+
+def assign_tasks(mtype_costs, task_count):
+    """Packs an experiment's subgroupings into tasks.
+
+    Subgroupings are shuffled so that ties in their estimated costs do not
+    leave similar subgroupings in the same tasks.
+
+    Args:
+        mtype_costs (list): The cost of each subgrouping in setup order.
+        task_count (int): How many tasks to create.
+
+    Returns:
+        mtype_tasks (list): The task ID of each subgrouping in setup order.
+        task_loads (list): The total cost of each task.
+
+    """
+    mtype_indx = list(range(len(mtype_costs)))
+    random.Random(10301).shuffle(mtype_indx)
+
+    task_assign, task_loads = pack_tasks(
+        [mtype_costs[indx] for indx in mtype_indx], task_count)
+    mtype_tasks = [None for _ in mtype_costs]
+
+    for indx, task_id in zip(mtype_indx, task_assign):
+        mtype_tasks[indx] = task_id
+
+    return mtype_tasks, task_loads
+
+
+def get_task_lines(task_groups, run_time, merge_time):
+    """Lays out the tasks to be gathered together in a task listing."""
+    task_lines = sorted("{}\n".format(' '.join([str(tsk)
+                                                for tsk in sorted(tasks)]))
+                        for tasks in task_groups)
+
+    return task_lines + [DIV_LINE, "run_time={}\n".format(int(run_time) + 1),
+                         "merge_time={}\n".format(int(merge_time) + 1)]
+
+
+def write_task_files(out_dir, task_lines, mtype_tasks, task_loads):
+    with open(os.path.join(out_dir, 'setup', "tasks.txt"), 'w') as f:
+        f.writelines(task_lines)
+
+    with open(os.path.join(out_dir, 'setup', "task-manifest.p"), 'wb') as f:
+        pickle.dump({'Tasks': mtype_tasks, 'Loads': task_loads},
+                    f, protocol=-1)
+
+
 def main():
     parser = argparse.ArgumentParser(
         'pipeline_setup',
@@ -51,6 +343,19 @@ def main():
     parser.add_argument('--task_size', type=float, default=1)
     parser.add_argument('--merge_size', type=float, default=1)
     parser.add_argument('--samp_exp', type=float, default=1)
+
+    parser.add_argument(
+        '--classif', type=str,
+        help="the classifier used, for estimating task costs from past runs"
+        )
+    parser.add_argument(
+        '--cost_dir', type=str,
+        help="where to look for the output of previous runs of the experiment"
+        )
+    parser.add_argument('--min_runs', type=int, default=100,
+                        help="how many past subgrouping runs are needed "
+                             "to estimate task costs")
+
     parser.add_argument('--test', action='store_true')
     args = parser.parse_args()
 
@@ -59,15 +364,43 @@ def main():
                            "muts-count.txt"), 'r') as f:
         muts_count = int(f.readline())
 
+    with open(os.path.join(args.out_dir, 'setup', "muts-list.p"), 'rb') as f:
+        muts_list = pickle.load(f)
+
     # find how large the training cohort will be
     with bz2.BZ2File(os.path.join(args.out_dir, 'setup',
                                   "cohort-data.p.gz"), 'r') as f:
-        samp_count = len(pickle.load(f).get_samples())
+        cdata = pickle.load(f)
+        samp_count = len(cdata.get_samples())
 
-    task_load = args.run_max * (607 ** args.samp_exp)
-    task_load //= args.task_size * ((1.07 * samp_count) ** args.samp_exp)
-    task_count = int((muts_count - 1) // task_load) + 2
-    task_size = muts_count // task_count
+    mtype_costs = None
+    if args.classif is not None and args.cost_dir is not None:
+        mtype_costs = estimate_task_costs(cdata, muts_list, args.classif,
+                                          args.cost_dir, args.min_runs)
+
+    # if enough runs of the same classifier have been seen before, use the
+    # estimated cost of each subgrouping to decide how many tasks to split
+    # the subgroupings into...
+    if mtype_costs is not None:
+        task_count = int(ceil(mtype_costs.sum() / args.run_max))
+        task_count = min(max(task_count, 2), muts_count)
+        mtype_tasks, task_loads = assign_tasks(mtype_costs.tolist(),
+                                               task_count)
+
+        task_size = muts_count // task_count
+        run_time = max(1.07 * max(task_loads), 47)
+
+    # ...otherwise use a rough guess of how long each subgrouping will take
+    # given the size of the cohort, under which all cost the same
+    else:
+        task_load = args.run_max * (607 ** args.samp_exp)
+        task_load //= args.task_size * ((1.07 * samp_count)
+                                        ** args.samp_exp)
+        task_count = int((muts_count - 1) // task_load) + 2
+        task_size = muts_count // task_count
+
+        mtype_tasks, task_loads = assign_tasks([1] * muts_count, task_count)
+        run_time = max(1.07 * task_size * args.run_max / task_load, 47)
 
     if args.merge_max is None:
         merge_count = 1
@@ -85,26 +418,15 @@ def main():
         task_arr[i] += [task_list.pop(tsk_indx)]
         i = (i + 1) % len(task_arr)
 
-    merge_size = 1
-    for i in range(len(task_arr)):
-        merge_size = max(merge_size, len(task_arr[i]))
-        task_arr[i] = "{}\n".format(' '.join([
-            str(tsk) for tsk in sorted(task_arr[i])]))
-
-    task_arr = sorted(task_arr) + [DIV_LINE]
-    run_time = max(1.07 * task_size * args.run_max / task_load, 47)
-    task_arr += ["run_time={}\n".format(int(run_time) + 1)]
-
+    merge_size = max(1, *[len(tasks) for tasks in task_arr])
     merge_time = max(
         1.07 * args.merge_max * task_size * merge_size / merge_load, 57)
-    task_arr += ["merge_time={}\n".format(int(merge_time) + 1)]
+    task_lines = get_task_lines(task_arr, run_time, merge_time)
 
     if args.test:
-        print(''.join(task_arr))
-
+        print(''.join(task_lines))
     else:
-        with open(os.path.join(args.out_dir, 'setup', "tasks.txt"), 'w') as f:
-            f.writelines(task_arr)
+        write_task_files(args.out_dir, task_lines, mtype_tasks, task_loads)
 
 
 if __name__ == '__main__':
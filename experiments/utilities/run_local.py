@@ -0,0 +1,389 @@
+"""
+Running every stage of an experiment on a single machine with a pool of local
+processes instead of scheduling each of its jobs on a compute cluster.
+
+The experiment's setup script is run first, after which its subgroupings are
+packed into tasks that are tested in each cross-validation fold by the
+workers of the pool. Each worker loads the experiment's cohort once and
+reuses it across the tasks it runs. The output of the tasks is then gathered
+and merged as it would be by the experiment's Snakemake pipeline, with the
+merged output left in the given output directory. Stages whose output
+already exists are skipped, so that an interrupted run can be resumed.
+
+Example usage:
+    python -m dryads-research.experiments.utilities.run_local \
+        subgrouping_test Ridge \
+        $TEMPDIR/dryads-research/subgrouping_test/local/METABRIC_LumA \
+        microarray METABRIC_LumA 20 Consequence__Exon
+
+"""
+
+import os
+
+# classifiers are tuned using parallel jobs of their own, which should not
+# each also use many threads for linear algebra
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+
+from .pipeline_setup import (PARALLEL_JOBS, estimate_task_costs,
+                             assign_tasks, get_task_lines, write_task_files)
+from .handle_input import keep_loaded
+
+import sys
+import argparse
+import shutil
+import importlib
+import traceback
+import bz2
+import dill as pickle
+from contextlib import redirect_stdout, redirect_stderr
+from multiprocessing import Process, Queue, Pipe
+from multiprocessing.connection import wait
+
+
+def append_out_dir(setup_args, classif, out_dir):
+    return setup_args + [out_dir]
+
+
+def insert_classif(setup_args, classif, out_dir):
+    return setup_args[:1] + [classif, out_dir] + setup_args[1:]
+
+
+# the scripts run at each stage of the experiments that can be run locally,
+# and how the experiments' setup arguments are passed to their setup scripts
+EXPERIMENT_STAGES = {
+    'subgrouping_test': {
+        'setup': 'subgrouping_test.setup_test',
+        'fit': 'subgrouping_test.fit_test',
+        'gather': 'subgrouping_test.gather_test',
+        'merge': 'subgrouping_test.merge_test',
+        'setup_args': append_out_dir,
+        'setup_cores': True,
+        },
+
+    'subgrouping_isolate': {
+        'setup': 'subgrouping_isolate.setup_isolate',
+        'fit': 'subgrouping_isolate.fit_isolate',
+        'gather': 'subgrouping_isolate.gather_isolate',
+        'merge': 'subgrouping_isolate.merge_isolate',
+        'setup_args': append_out_dir,
+        },
+
+    'subgrouping_tour': {
+        'setup': 'subgrouping_tour.setup_tour',
+        'fit': 'subgrouping_tour.fit_tour',
+        'gather': 'subgrouping_tour.gather_tour',
+        'merge': 'subgrouping_tour.merge_tour',
+        'setup_args': append_out_dir,
+        },
+
+    'subgrouping_threshold': {
+        'setup': 'subgrouping_threshold.setup_threshold',
+        'fit': 'subgrouping_threshold.fit_threshold',
+        'gather': 'subgrouping_threshold.gather_threshold',
+        'merge': 'subgrouping_threshold.merge_threshold',
+        'setup_args': insert_classif,
+        },
+
+    'dyad_isolate': {
+        'setup': 'dyad_isolate.setup_isolate',
+        'fit': 'dyad_isolate.fit_isolate',
+        'gather': 'dyad_isolate.gather_isolate',
+        'merge': 'subgrouping_isolate.merge_isolate',
+        'setup_args': append_out_dir,
+        'gather_cores': True,
+        },
+    }
+
+
+def get_resources():
+    """Finds how many cores and how much memory (in GB) are available."""
+    if hasattr(os, 'sched_getaffinity'):
+        core_count = len(os.sched_getaffinity(0))
+    else:
+        core_count = os.cpu_count()
+
+    mem_avail = (os.sysconf('SC_AVPHYS_PAGES')
+                 * os.sysconf('SC_PAGE_SIZE') / 2 ** 30)
+
+    return core_count, mem_avail
+
+
+def run_stage(stage_script, stage_args, log_path):
+    """Runs one of an experiment's scripts within the current process.
+
+    Args:
+        stage_script (str): The script's module, relative to `experiments`.
+        stage_args (list): The command line arguments given to the script.
+        log_path (str): Where to save anything the script prints.
+
+    """
+    stage_mod = "{}.{}".format(__package__.rsplit('.', 1)[0], stage_script)
+    sys.argv = [stage_mod] + stage_args
+
+    with open(log_path, 'w') as log_fl:
+        with redirect_stdout(log_fl), redirect_stderr(log_fl):
+            try:
+                importlib.import_module(stage_mod).main()
+
+            # scripts stopping with an error code would otherwise take down
+            # the worker process running them
+            except SystemExit as exit_err:
+                if exit_err.code not in {None, 0}:
+                    raise RuntimeError("`{}` exited with status {}".format(
+                        stage_script, exit_err.code))
+
+            except Exception:
+                traceback.print_exc()
+                raise
+
+
+def work_jobs(job_queue, result_conn, keep_data):
+    """Runs the jobs given to one of the worker processes of `run_jobs`."""
+    if keep_data:
+        keep_loaded()
+
+    for job_i, job_args in iter(job_queue.get, None):
+        try:
+            run_stage(*job_args)
+            job_err = None
+
+        except Exception as err:
+            job_err = repr(err)
+
+        result_conn.send((job_i, job_err))
+
+    result_conn.close()
+
+    # the processes joblib keeps for reuse by later jobs would otherwise keep
+    # this worker from exiting until they time out
+    if 'joblib' in sys.modules:
+        from joblib.externals.loky import get_reusable_executor
+        get_reusable_executor().shutdown(wait=True)
+
+
+def run_jobs(stage_jobs, worker_count, keep_data=False):
+    """Runs jobs on a set of worker processes and reports any that failed.
+
+    The workers are not daemonic, unlike those of a `multiprocessing.Pool`,
+    so that the jobs they run can themselves run parallel jobs as
+    classifier tuning and gathering output do; joblib would otherwise run
+    these one at a time.
+
+    Args:
+        stage_jobs (list): The arguments of `run_stage` for each job.
+        worker_count (int): How many processes to run at once.
+        keep_data (bool, optional)
+            Whether each process should hold on to the datasets it loads.
+
+    Returns:
+        failed_jobs (list): The log file of each job that failed.
+
+    """
+    job_queue = Queue()
+    for job_i, job_args in enumerate(stage_jobs):
+        job_queue.put((job_i, job_args))
+
+    worker_list = []
+    result_conns = []
+    for _ in range(worker_count):
+        job_queue.put(None)
+
+        # each worker reports back through a pipe of its own, which is
+        # closed once the worker exits even if it was killed mid-job
+        result_conn, worker_conn = Pipe(duplex=False)
+        worker = Process(target=work_jobs,
+                         args=(job_queue, worker_conn, keep_data))
+
+        worker.start()
+        worker_conn.close()
+        worker_list += [worker]
+        result_conns += [result_conn]
+
+    job_errs = dict()
+    while result_conns:
+        for result_conn in wait(result_conns):
+            try:
+                job_i, job_err = result_conn.recv()
+                job_errs[job_i] = job_err
+
+            except EOFError:
+                result_conns.remove(result_conn)
+
+    for worker in worker_list:
+        worker.join()
+
+    failed_jobs = []
+    for job_i, (_, _, log_path) in enumerate(stage_jobs):
+        if job_i not in job_errs:
+            print("Job did not finish, see\n{}".format(log_path))
+            failed_jobs += [log_path]
+
+        elif job_errs[job_i] is not None:
+            print("Job failed with `{}`, see\n{}".format(
+                job_errs[job_i], log_path))
+            failed_jobs += [log_path]
+
+    return failed_jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        'run_local',
+        description="Runs all stages of an experiment on this machine."
+        )
+
+    parser.add_argument('experiment', type=str,
+                        choices=sorted(EXPERIMENT_STAGES),
+                        help="which experiment to run")
+    parser.add_argument('classif', type=str, help="a mutation classifier")
+    parser.add_argument('out_dir', type=str,
+                        help="where the experiment's output will be stored")
+    parser.add_argument('setup_args', type=str, nargs='*',
+                        help="the arguments of the experiment's setup "
+                             "script other than the output directory "
+                             "and classifier")
+
+    parser.add_argument('--workers', type=int,
+                        help="how many tasks to run at once; default is to "
+                             "use as many as cores and memory allow")
+    parser.add_argument('--task_count', type=int,
+                        help="how many tasks to split subgroupings into; "
+                             "default is one per worker")
+    parser.add_argument('--fit_mem', type=float, default=24,
+                        help="how much memory (GB) each task needs")
+    parser.add_argument('--gather_mem', type=float, default=48,
+                        help="how much memory (GB) each gather job needs")
+
+    parser.add_argument(
+        '--cost_dir', type=str,
+        help="where to look for the output of previous runs of the experiment"
+        )
+    parser.add_argument('--rewrite', action='store_true',
+                        help="remove any existing output of the experiment?")
+
+    args = parser.parse_args()
+    stage_dict = EXPERIMENT_STAGES[args.experiment]
+    out_dir = os.path.abspath(args.out_dir)
+    log_dir = os.path.join(out_dir, 'logs')
+
+    if args.rewrite and os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    for sub_dir in ['setup', 'output', 'merge', 'logs']:
+        os.makedirs(os.path.join(out_dir, sub_dir), exist_ok=True)
+
+    core_count, mem_avail = get_resources()
+    if args.workers is None:
+        fit_workers = max(min(core_count // PARALLEL_JOBS,
+                              int(mem_avail // args.fit_mem)), 1)
+    else:
+        fit_workers = args.workers
+
+    # enumerates the subgroupings to be tested in this experiment in a new
+    # process so that the memory it uses is freed once it is finished
+    setup_dir = os.path.join(out_dir, 'setup')
+    if not os.path.exists(os.path.join(setup_dir, "muts-list.p")):
+        print("Running setup...")
+
+        setup_args = stage_dict['setup_args'](args.setup_args,
+                                              args.classif, out_dir)
+        if stage_dict.get('setup_cores', False):
+            setup_args += ['--cores', str(core_count)]
+
+        setup_log = os.path.join(log_dir, "setup.out")
+        setup_prc = Process(target=run_stage,
+                            args=(stage_dict['setup'], setup_args, setup_log))
+        setup_prc.start()
+        setup_prc.join()
+
+        if setup_prc.exitcode != 0:
+            print("Setup failed, see\n{}".format(setup_log))
+            sys.exit(1)
+
+    # packs the subgroupings into tasks using their estimated costs where
+    # these are available, keeping any packing from an earlier run
+    if not os.path.exists(os.path.join(setup_dir, "task-manifest.p")):
+        with open(os.path.join(setup_dir, "muts-list.p"), 'rb') as f:
+            muts_list = pickle.load(f)
+
+        if args.task_count is None:
+            task_count = min(fit_workers, len(muts_list))
+        else:
+            task_count = args.task_count
+
+        mtype_costs = None
+        if args.cost_dir is not None:
+            with bz2.BZ2File(os.path.join(setup_dir, "cohort-data.p.gz"),
+                             'r') as f:
+                cdata = pickle.load(f)
+
+            mtype_costs = estimate_task_costs(cdata, muts_list,
+                                              args.classif, args.cost_dir)
+            del cdata
+
+        if mtype_costs is None:
+            mtype_costs = [1] * len(muts_list)
+        else:
+            mtype_costs = mtype_costs.tolist()
+
+        mtype_tasks, task_loads = assign_tasks(mtype_costs, task_count)
+        task_lines = get_task_lines([[task_id] for task_id
+                                     in range(task_count)],
+                                    max(task_loads), 0)
+        write_task_files(out_dir, task_lines, mtype_tasks, task_loads)
+
+    with open(os.path.join(setup_dir, "task-manifest.p"), 'rb') as f:
+        task_loads = pickle.load(f)['Loads']
+    task_count = len(task_loads)
+
+    # tests each task in each cross-validation fold, starting with the
+    # tasks expected to take the longest
+    fit_jobs = [
+        (stage_dict['fit'],
+         [args.classif, out_dir,
+          '--task_id={}'.format(task_id), '--cv_id={}'.format(cv_id)],
+         os.path.join(log_dir, "fit_{}_{}.out".format(cv_id, task_id)))
+        for task_id in sorted(range(task_count),
+                              key=lambda task_id: -task_loads[task_id])
+        for cv_id in range(40)
+        if not os.path.exists(os.path.join(
+            out_dir, 'output',
+            "out__cv-{}_task-{}.p".format(cv_id, task_id)
+            ))
+        ]
+
+    print("Running {} classification jobs on {} workers...".format(
+        len(fit_jobs), fit_workers))
+    if run_jobs(fit_jobs, fit_workers, keep_data=True):
+        sys.exit(1)
+
+    # consolidates the output of the tasks in groups small enough for the
+    # memory available, and then merges the groups' output
+    gather_workers = max(min(int(mem_avail // args.gather_mem),
+                             core_count, task_count), 1)
+    task_groups = [list(range(task_count))[i::gather_workers]
+                   for i in range(gather_workers)]
+
+    gather_jobs = []
+    for i, task_group in enumerate(task_groups):
+        gather_args = [out_dir, '--task_ids'] + [str(task_id)
+                                                 for task_id in task_group]
+
+        if stage_dict.get('gather_cores', False):
+            gather_args += ['--cores',
+                            str(max(core_count // gather_workers, 1))]
+
+        gather_jobs += [(stage_dict['gather'], gather_args,
+                         os.path.join(log_dir, "gather_{}.out".format(i)))]
+
+    print("Gathering output...")
+    if run_jobs(gather_jobs, gather_workers):
+        sys.exit(1)
+
+    print("Merging output...")
+    if run_jobs([(stage_dict['merge'], [out_dir],
+                  os.path.join(log_dir, "merge.out"))], 1):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Representing the samples carrying each of a cohort's subgroupings as packed bit
+arrays, which allows subgroupings to be compared using vectorized operations
+instead of with sets of sample barcodes when enumerating them, and allows the
+mutation statuses found during setup to be reused by later stages.
+"""
+
+from .mutations import Mcomb, ExMcomb
+from dryadic.features.mutations import MuType
+
+import os
+import dill as pickle
+
+import numpy as np
+from functools import reduce
+from operator import and_, or_
+
+
+# the number of set bits in each possible value of a byte
+_BIT_COUNTS = np.array([bin(i).count('1') for i in range(256)],
+                       dtype=np.int64)
+
+
+class SampleIndex(object):
+    """Finds and caches subgroupings' samples as packed bit arrays.
+
+    Each of the given samples is mapped to a fixed position once, so that the
+    bit arrays of subgroupings retrieved from any mutation tree using the same
+    index can be compared with one another.
+
+    Args:
+        samps (:obj:`iterable` of :obj:`str`): A cohort's samples.
+
+    """
+
+    def __init__(self, samps):
+        self.samps = sorted(samps)
+        self.samp_pos = {samp: i for i, samp in enumerate(self.samps)}
+        self.bits_cache = dict()
+
+    def pack(self, samps):
+        samp_stat = np.zeros(len(self.samps), dtype=bool)
+        samp_stat[[self.samp_pos[samp] for samp in samps]] = True
+
+        return np.packbits(samp_stat)
+
+    def unpack(self, bits):
+        samp_stat = np.unpackbits(bits)[:len(self.samps)].astype(bool)
+
+        return {samp for samp, stat in zip(self.samps, samp_stat) if stat}
+
+    def get_bits(self, mtype, mtree):
+        """Finds the samples carrying a subgrouping within a mutation tree."""
+        cache_key = id(mtree), mtype
+
+        if cache_key not in self.bits_cache:
+            if isinstance(mtype, Mcomb):
+                mtype_bits = reduce(and_, [self.get_bits(sub_type, mtree)
+                                           for sub_type in mtype.mtypes])
+
+            # mirrors how samples are found by ExMcomb.get_samples()
+            elif isinstance(mtype, ExMcomb):
+                mtype_bits = reduce(and_, [self.get_bits(sub_type, mtree)
+                                           for sub_type in mtype.mtypes])
+
+                if mtype.not_mtype is not None:
+                    if mtype.cur_level == 'Gene':
+                        not_bits = [
+                            self.get_bits(MuType({('Gene', gn): sub_type}),
+                                          mtree)
+                            for gn, sub_type in mtype.not_mtype.subtype_iter()
+                            ]
+
+                        if not_bits:
+                            mtype_bits = mtype_bits & ~reduce(or_, not_bits)
+
+                    else:
+                        mtype_bits = mtype_bits & ~self.get_bits(
+                            mtype.not_mtype, mtree)
+
+            else:
+                mtype_bits = self.pack(mtype.get_samples(mtree))
+
+            self.bits_cache[cache_key] = mtype_bits
+
+        return self.bits_cache[cache_key]
+
+    def set_bits(self, mtype, mtree, bits):
+        """Records samples for a subgrouping that are already known."""
+        self.bits_cache[id(mtree), mtype] = bits
+
+
+def count_samples(bits):
+    """Finds the number of samples in a bit array or a matrix of them."""
+    return _BIT_COUNTS[bits].sum(axis=-1)
+
+
+def equal_samples(bits_mat):
+    """Finds which pairs of a matrix of bit arrays have the same samples."""
+    _, samps_indx = np.unique(bits_mat, axis=0, return_inverse=True)
+    samps_indx = np.ravel(samps_indx)
+
+    return samps_indx[:, np.newaxis] == samps_indx[np.newaxis, :]
+
+
+def superset_samples(bits_mat, block_size=2 ** 26):
+    """Finds which bit arrays' samples are supersets of the others' samples.
+
+    Args:
+        bits_mat (np.array): A subgroupings x packed samples matrix.
+        block_size (int, optional)
+            About how many bytes the intermediate arrays created are allowed
+            to take up at once.
+
+    Returns:
+        sup_mat (np.array)
+            A subgroupings x subgroupings boolean matrix whose [i, j]-th
+            entry is True if the samples of the i-th subgrouping include all
+            of the samples of the j-th subgrouping.
+
+    """
+    mtype_count = bits_mat.shape[0]
+    sup_mat = np.zeros((mtype_count, mtype_count), dtype=bool)
+    row_count = max(block_size // max(bits_mat.size, 1), 1)
+
+    for i in range(0, mtype_count, row_count):
+        sup_mat[i:(i + row_count)] = ~(
+            bits_mat[np.newaxis] & ~bits_mat[i:(i + row_count), np.newaxis]
+            ).any(axis=2)
+
+    return sup_mat
+
+
+class PhenoIndex(object):
+    """The mutation statuses of a cohort's samples for a list of subgroupings.
+
+    Statuses are stored as a subgroupings x samples matrix of packed bits,
+    which is created once when an experiment is set up so that later stages
+    do not need to search the cohort's mutation trees for each subgrouping.
+
+    Args:
+        mtype_list (list): The subgroupings whose statuses are stored.
+        samps (list): The samples the statuses are defined over.
+        pheno_bits (np.array): A subgroupings x packed samples matrix.
+
+    """
+
+    def __init__(self, mtype_list, samps, pheno_bits):
+        self.mtype_list = list(mtype_list)
+        self.mtype_pos = {mtype: i for i, mtype in enumerate(self.mtype_list)}
+
+        self.samps = list(samps)
+        self.samp_pos = {samp: j for j, samp in enumerate(self.samps)}
+        self.pheno_bits = pheno_bits
+
+    @classmethod
+    def from_cohort(cls, cdata, mtype_list):
+        """Finds statuses over the cohort's current training samples."""
+        pheno_mat = np.array([cdata.train_pheno(mtype)
+                              for mtype in mtype_list], dtype=bool)
+        pheno_mat = pheno_mat.reshape(len(mtype_list), -1)
+
+        return cls(mtype_list, cdata.get_train_samples(),
+                   np.packbits(pheno_mat, axis=1))
+
+    def __contains__(self, mtype):
+        return mtype in self.mtype_pos
+
+    def get_pheno_at(self, indx, samps=None):
+        """Gets the statuses of the subgrouping at a position in the index.
+
+        Args:
+            indx (int): The subgrouping's position in `mtype_list`.
+            samps (list, optional)
+                The samples to get statuses for, in the order they are to be
+                returned. Default is to use all samples in the index.
+
+        Returns:
+            pheno_vec (np.array): A boolean vector of mutation statuses.
+
+        """
+        pheno_vec = np.unpackbits(
+            self.pheno_bits[indx])[:len(self.samps)].astype(bool)
+
+        if samps is not None:
+            pheno_vec = pheno_vec[[self.samp_pos[samp] for samp in samps]]
+
+        return pheno_vec
+
+    def get_pheno(self, mtype, samps=None):
+        """Gets the statuses of a subgrouping; see `get_pheno_at`."""
+        return self.get_pheno_at(self.mtype_pos[mtype], samps)
+
+    def get_pheno_mat(self, mtypes=None, samps=None):
+        """Gets a subgroupings x samples matrix of statuses."""
+        if mtypes is None:
+            mtype_indx = slice(None)
+        else:
+            mtype_indx = [self.mtype_pos[mtype] for mtype in mtypes]
+
+        pheno_mat = np.unpackbits(self.pheno_bits[mtype_indx], axis=1)
+        pheno_mat = pheno_mat[:, :len(self.samps)].astype(bool)
+
+        if samps is not None:
+            pheno_mat = pheno_mat[:, [self.samp_pos[samp] for samp in samps]]
+
+        return pheno_mat
+
+
+def get_pheno_path(setup_dir, coh=None):
+    if coh is None:
+        pheno_fl = "pheno-index.p"
+    else:
+        pheno_fl = "pheno-index__{}.p".format(coh)
+
+    return os.path.join(setup_dir, pheno_fl)
+
+
+def write_pheno_index(setup_dir, cdata, mtype_list, coh=None):
+    """Saves the statuses of subgroupings in a cohort with the setup output.
+
+    Args:
+        setup_dir (str): Where the experiment's setup output is stored.
+        cdata (BaseMutationCohort)
+        mtype_list (list): The subgroupings to save statuses for.
+        coh (str, optional)
+            The name of the cohort if it is a transfer cohort rather than the
+            cohort the experiment is being run on.
+
+    """
+    pheno_indx = PhenoIndex.from_cohort(cdata, mtype_list)
+
+    with open(get_pheno_path(setup_dir, coh), 'wb') as f:
+        pickle.dump({'Muts': pheno_indx.mtype_list,
+                     'Samps': pheno_indx.samps,
+                     'Bits': pheno_indx.pheno_bits}, f, protocol=-1)
+
+
+def load_pheno_index(setup_dir, coh=None):
+    """Loads the subgrouping statuses saved by `write_pheno_index`.
+
+    Returns:
+        pheno_indx (PhenoIndex)
+            The saved statuses, or None if none were saved for the cohort,
+            as is the case for experiments set up before these were added.
+
+    """
+    pheno_path = get_pheno_path(setup_dir, coh)
+    pheno_indx = None
+
+    if os.path.exists(pheno_path):
+        with open(pheno_path, 'rb') as f:
+            pheno_data = pickle.load(f)
+
+        pheno_indx = PhenoIndex(pheno_data['Muts'], pheno_data['Samps'],
+                                pheno_data['Bits'])
+
+    return pheno_indx
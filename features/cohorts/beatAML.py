@@ -1,7 +1,7 @@
 
+from ..data.gencode import load_annot_table, get_gene_annot
 from dryadic.features.cohorts import BaseMutationCohort
-from dryadic.features.cohorts.utils import (
-    get_gencode, log_norm, drop_duplicate_genes)
+from dryadic.features.cohorts.utils import log_norm, drop_duplicate_genes
 
 import os
 import numpy as np
@@ -82,14 +82,9 @@ def process_input_datasets(baml_dir, annot_dir, syn, **data_args):
     expr = load_beat_expression(baml_dir)
 
     annot_file = os.path.join(annot_dir, "gencode.v19.annotation.gtf.gz")
-    if 'annot_fields' in data_args:
-        annot_data = get_gencode(annot_file, data_args['annot_fields'])
-    else:
-        annot_data = get_gencode(annot_file)
-
-    annot_dict = {at['gene_name']: {**{'Ens': ens}, **at}
-                  for ens, at in annot_data.items()
-                  if ens in set(expr.columns)}
+    annot_tbl = load_annot_table(annot_file, data_args.get('annot_fields'))
+    annot_dict = get_gene_annot(annot_file, expr.columns,
+                                data_args.get('annot_fields'), by_ens=True)
 
     # TODO: incorporate supplemental mutation data, eg. laboratory-based
     # data for FLT3 ITDs found here:
@@ -99,9 +94,11 @@ def process_input_datasets(baml_dir, annot_dir, syn, **data_args):
     samp_data['Sample'] = ['pid{}'.format(pid) for pid in samp_data.patientId]
     use_samps = set(expr.index) & set(samp_data.Sample)
 
-    expr = expr.loc[use_samps, expr.columns.isin(annot_data)]
+    # the expression of every annotated Ensembl ID is kept, including those
+    # that share a gene name, which are then merged by dropping duplicates
+    expr = expr.loc[use_samps, expr.columns.isin(annot_tbl.index)]
     expr_data = drop_duplicate_genes(expr.rename(
-        columns={gn: annot_data[gn]['gene_name'] for gn in expr.columns}))
+        columns=annot_tbl.gene_name.to_dict()))
 
     # duplicates need to be filtered out here as they arise from two different
     # callers (varscan and mutect) being used to produce the mutation dataset
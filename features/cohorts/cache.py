@@ -0,0 +1,296 @@
+"""Caching processed cohort objects so that they can be shared across runs.
+
+Building a cohort object is dominated by running VEP on the cohort's variant
+calls, which can take hours for the larger TCGA cohorts. Cohorts are thus
+stored in a cache directory under a hash of everything that goes into
+building them: the cohort and its expression source, the mutation levels and
+genes used, the state of the input data files, and the version of VEP along
+with its genome cache. Entries that have not been used recently are evicted
+once the cache grows past a given size.
+
+Example usages:
+    python -m dryads-research.features.cohorts.cache list
+    python -m dryads-research.features.cohorts.cache prune --max_size 50
+    python -m dryads-research.features.cohorts.cache prune \
+        --cohort BRCA --cache_dir /home/users/timmy/cohort-cache
+
+"""
+
+from ...experiments.utilities.data_dirs import cohort_cache_dir
+
+import os
+import argparse
+import hashlib
+import re
+import subprocess
+import time
+import dill as pickle
+
+
+# how big the cache can get (in gigabytes) before entries are evicted
+DEFAULT_CACHE_SIZE = 200
+
+# the directories that caches of parsed input data are kept in next to the
+# input files, see `.data.gencode`, `.data.firehose_cache`, and
+# `.data.mc3_store`, and the endings of other files derived from the inputs
+DERIVED_DIRS = {'gencode-cache', 'binary-cache', 'mc3-store'}
+DERIVED_SUFFIXES = ('.tmp', '.subtype-index.p')
+
+
+def get_vep_version(vep_cache_dir):
+    """Finds the versions of VEP and of the genome datasets it is using."""
+    try:
+        vep_out = subprocess.run(
+            ['vep', '--help'], stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, universal_newlines=True, timeout=120
+            ).stdout
+
+    except (OSError, subprocess.SubprocessError):
+        vep_out = ''
+
+    vep_vers = re.findall(r"ensembl-vep\s*:\s*(\S+)", vep_out)
+    cache_vers = []
+
+    # VEP caches are organized by species, and then by release and assembly
+    if os.path.isdir(vep_cache_dir):
+        for spc in sorted(os.listdir(vep_cache_dir)):
+            spc_dir = os.path.join(vep_cache_dir, spc)
+
+            if os.path.isdir(spc_dir):
+                cache_vers += ['/'.join([spc, cache_ver])
+                               for cache_ver in sorted(os.listdir(spc_dir))]
+
+    return vep_vers, cache_vers
+
+
+def get_input_stamp(input_paths, name_filter=None):
+    """Summarizes the state of the files a cohort is built from.
+
+    Caches of parsed input data that are kept next to the input files, as
+    well as files that are still being written, are left out of the summary
+    so that creating or updating them doesn't change the state of the inputs.
+
+    Args:
+        input_paths (:obj:`iterable` of :obj:`str`)
+            Input data files, or directories containing such files.
+        name_filter (str, optional)
+            Only files in a directory whose path within the directory contains
+            this string are considered, unless none of them do, in which case
+            all of the directory's files are used.
+
+    Returns:
+        input_stamp (list)
+            The path, size, and modification time of each input file.
+
+    """
+    input_stamp = []
+
+    for input_path in input_paths:
+        if os.path.isfile(input_path):
+            path_stat = os.stat(input_path)
+            input_stamp += [(input_path, path_stat.st_size,
+                             path_stat.st_mtime_ns)]
+
+        elif os.path.isdir(input_path):
+            dir_files = []
+
+            for root, dirs, fls in os.walk(input_path):
+                dirs[:] = [drc for drc in dirs if drc not in DERIVED_DIRS]
+                dir_files += [
+                    os.path.relpath(os.path.join(root, fl), input_path)
+                    for fl in fls if not fl.endswith(DERIVED_SUFFIXES)
+                    ]
+
+            dir_files = sorted(dir_files)
+
+            if name_filter is not None:
+                use_files = [fl for fl in dir_files if name_filter in fl]
+                if use_files:
+                    dir_files = use_files
+
+            for fl in dir_files:
+                path_stat = os.stat(os.path.join(input_path, fl))
+                input_stamp += [(os.path.join(input_path, fl),
+                                 path_stat.st_size, path_stat.st_mtime_ns)]
+
+        else:
+            input_stamp += [(input_path, None, None)]
+
+    return input_stamp
+
+
+def get_cache_key(**cache_args):
+    """Hashes the arguments a cohort was built with into a cache entry key."""
+    return hashlib.sha256(repr(sorted(
+        cache_args.items())).encode()).hexdigest()[:32]
+
+
+def _get_entry_paths(cache_dir, cache_key):
+    return (os.path.join(cache_dir, "cohort__{}.p".format(cache_key)),
+            os.path.join(cache_dir, "cohort__{}.info".format(cache_key)))
+
+
+def _atomic_dump(obj, out_path):
+    tmp_path = "{}.{}.tmp".format(out_path, os.getpid())
+
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f, protocol=-1)
+    os.replace(tmp_path, out_path)
+
+
+def load_cached_cohort(cache_dir, cache_key):
+    """Retrieves a cohort from the cache, or None if it isn't there."""
+    cdata_path, _ = _get_entry_paths(cache_dir, cache_key)
+
+    try:
+        with open(cdata_path, 'rb') as f:
+            cdata = pickle.load(f)
+
+    except (OSError, EOFError, pickle.UnpicklingError):
+        cdata = None
+
+    # marks the entry as having been used so that it is evicted last
+    else:
+        os.utime(cdata_path)
+
+    return cdata
+
+
+def store_cached_cohort(cache_dir, cache_key, cdata, cache_info,
+                        max_size=DEFAULT_CACHE_SIZE):
+    """Adds a cohort to the cache, evicting old entries if necessary.
+
+    Args:
+        cache_dir (str): Where the cache is located.
+        cache_key (str): As produced by :func:`get_cache_key`.
+        cdata (BaseMutationCohort)
+        cache_info (dict): A description of the cohort used for listing.
+        max_size (float, optional): The size of the cache in gigabytes.
+
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cdata_path, info_path = _get_entry_paths(cache_dir, cache_key)
+
+    # writes to temporary files first so that concurrent runs building the
+    # same cohort never read a partially written entry
+    _atomic_dump(dict(cache_info, Created=time.time()), info_path)
+    _atomic_dump(cdata, cdata_path)
+
+    prune_cache(cache_dir, max_size, keep_keys={cache_key})
+
+
+def list_cache(cache_dir):
+    """Finds the entries in the cache, from least to most recently used."""
+    cache_list = []
+
+    if os.path.isdir(cache_dir):
+        for fl in os.listdir(cache_dir):
+            fl_match = re.fullmatch(r"cohort__([0-9a-f]+)\.p", fl)
+
+            if fl_match:
+                cache_key = fl_match.group(1)
+                cdata_path, info_path = _get_entry_paths(cache_dir, cache_key)
+
+                # skips entries removed by other processes pruning the cache
+                # since the cache directory was listed
+                try:
+                    cdata_stat = os.stat(cdata_path)
+                except FileNotFoundError:
+                    continue
+
+                try:
+                    with open(info_path, 'rb') as f:
+                        cache_info = pickle.load(f)
+                except (OSError, EOFError, pickle.UnpicklingError):
+                    cache_info = dict()
+
+                cache_list += [dict(cache_info, Key=cache_key,
+                                    Size=cdata_stat.st_size,
+                                    Used=cdata_stat.st_mtime)]
+
+    return sorted(cache_list, key=lambda entry: entry['Used'])
+
+
+def remove_cache_entry(cache_dir, cache_key):
+    for entry_path in _get_entry_paths(cache_dir, cache_key):
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+
+
+def prune_cache(cache_dir, max_size=DEFAULT_CACHE_SIZE, keep_keys=None):
+    """Evicts the least recently used cohorts until the cache fits its size.
+
+    Args:
+        cache_dir (str): Where the cache is located.
+        max_size (float, optional): The size of the cache in gigabytes.
+        keep_keys (set, optional): Entries that are never to be evicted.
+
+    Returns:
+        pruned_keys (list): The entries that were evicted.
+
+    """
+    if keep_keys is None:
+        keep_keys = set()
+
+    cache_list = list_cache(cache_dir)
+    cache_size = sum(entry['Size'] for entry in cache_list)
+    pruned_keys = []
+
+    for entry in cache_list:
+        if cache_size <= max_size * 2 ** 30:
+            break
+
+        if entry['Key'] not in keep_keys:
+            remove_cache_entry(cache_dir, entry['Key'])
+            cache_size -= entry['Size']
+            pruned_keys += [entry['Key']]
+
+    return pruned_keys
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        'cache',
+        description="Lists or prunes the entries of the cohort cache."
+        )
+
+    parser.add_argument('action', choices=['list', 'prune'])
+    parser.add_argument('--cache_dir', type=str, default=cohort_cache_dir,
+                        help="where the cache is located")
+
+    parser.add_argument(
+        '--max_size', type=float, default=DEFAULT_CACHE_SIZE,
+        help="how big the cache can be after pruning, in gigabytes"
+        )
+    parser.add_argument('--cohort', type=str,
+                        help="prune all of the entries for this cohort")
+
+    args = parser.parse_args()
+    if args.cache_dir is None:
+        parser.error("No cohort cache location given or configured!")
+
+    if args.action == 'list':
+        for entry in list_cache(args.cache_dir):
+            print("{}  {:>8.2f}GB  {}  {}  {}  {}".format(
+                entry['Key'], entry['Size'] / 2 ** 30,
+                time.strftime('%Y-%m-%d %H:%M',
+                              time.localtime(entry['Used'])),
+                entry.get('Cohort', '?'), entry.get('Source', '?'),
+                entry.get('Levels', '?')
+                ))
+
+    elif args.cohort is not None:
+        for entry in list_cache(args.cache_dir):
+            if entry.get('Cohort') == args.cohort:
+                remove_cache_entry(args.cache_dir, entry['Key'])
+                print("Removed {}".format(entry['Key']))
+
+    else:
+        for cache_key in prune_cache(args.cache_dir, args.max_size):
+            print("Removed {}".format(cache_key))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 
 from ..data.expression import get_expr_toil
+from ..data.gencode import get_gene_annot
 from dryadic.features.cohorts import BaseMutationCohort
-from dryadic.features.cohorts.utils import get_gencode, drop_duplicate_genes
+from dryadic.features.cohorts.utils import drop_duplicate_genes
 
 import os
 import pandas as pd
@@ -98,11 +99,8 @@ def process_input_datasets(ccle_dir, annot_dir, expr_source, **coh_args):
     expr = drop_duplicate_genes(expr.loc[use_samps])
 
     annot_file = os.path.join(annot_dir, "gencode.v19.annotation.gtf.gz")
-    annot_data = get_gencode(annot_file, ['transcript', 'exon'])
-
-    annot_dict = {at['gene_name']: {**{'Ens': ens}, **at}
-                  for ens, at in annot_data.items()
-                  if at['gene_name'] in set(expr.columns)}
+    annot_dict = get_gene_annot(annot_file, expr.columns,
+                                ['transcript', 'exon'])
 
     expr = expr.loc[:, expr.columns.isin(annot_dict)]
     variants = variants.loc[variants.Sample.isin(use_samps)
@@ -1,6 +1,7 @@
 
+from ..data.gencode import get_gene_annot
 from dryadic.features.cohorts import BaseMutationCohort
-from dryadic.features.cohorts.utils import get_gencode, drop_duplicate_genes
+from dryadic.features.cohorts.utils import drop_duplicate_genes
 
 import os
 import pandas as pd
@@ -152,14 +153,8 @@ def process_input_datasets(metabric_dir, annot_dir, use_types=None,
         ]) & set(expr.index)
 
     annot_file = os.path.join(annot_dir, "gencode.v19.annotation.gtf.gz")
-    if 'annot_fields' in data_args:
-        annot_data = get_gencode(annot_file, data_args['annot_fields'])
-    else:
-        annot_data = get_gencode(annot_file)
-
-    annot_dict = {at['gene_name']: {**{'Ens': ens}, **at}
-                  for ens, at in annot_data.items()
-                  if at['gene_name'] in set(expr.columns)}
+    annot_dict = get_gene_annot(annot_file, expr.columns,
+                                data_args.get('annot_fields'))
 
     variants = load_metabric_variants(metabric_dir)
     copy_df = load_metabric_copies(metabric_dir)
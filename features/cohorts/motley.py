@@ -1,9 +1,10 @@
 
 from .tcga import get_expr_data as get_tcga_expr
+from ..data.gencode import get_gene_annot
 
 from dryadic.features.cohorts.mut import BaseMutationCohort
 from dryadic.features.cohorts.utils import (
-    match_tcga_samples, get_gencode, log_norm, drop_duplicate_genes)
+    match_tcga_samples, log_norm, drop_duplicate_genes)
 
 import pandas as pd
 from functools import reduce
@@ -68,17 +69,11 @@ class MutationConcatCohort(BaseMutationCohort):
         expr_dict = {cohort: get_expr_data(cohort, expr_source, **coh_args)
                      for cohort in cohorts}
 
-        if 'annot_fields' in coh_args:
-            annot_data = get_gencode(annot_file, coh_args['annot_fields'])
-        else:
-            annot_data = get_gencode(annot_file)
-
         # restructure annotation data around expression gene labels
-        gene_annot = {cohort: {
-            at['gene_name']: {**{'Ens': ens}, **at}
-            for ens, at in annot_data.items()
-            if at['gene_name'] in set(expr.columns.get_level_values('Gene'))
-            }
+        gene_annot = {cohort: get_gene_annot(
+            annot_file, expr.columns.get_level_values('Gene'),
+            coh_args.get('annot_fields')
+            )
             for cohort, expr in expr_dict.items()}
 
         data_dict = {cohort: add_variant_data(cohort, var_source, copy_source,
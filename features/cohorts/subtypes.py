@@ -0,0 +1,135 @@
+"""Looking up the samples belonging to the molecular subtypes of cohorts.
+
+Subtypes were found by reading and filtering the whole of the PCAWG subtype
+listing, or the METABRIC clinical sample table, each time the samples of a
+single subtype were needed, which gathering the output of an experiment did
+once per subtype for every transfer cohort in every task. Each of these
+sources is instead parsed once into an index of the samples in each
+(cohort, subtype) pair, which is held by the process and saved next to the
+source so that later processes can read it back without parsing the source.
+
+"""
+
+from .metabric import load_metabric_samps
+from .metabric import choose_subtypes as choose_metabric_subtypes
+
+import os
+import dill as pickle
+
+import numpy as np
+import pandas as pd
+
+
+# the subtypes that can be chosen for METABRIC samples
+METABRIC_SUBTYPES = ('Basal', 'LumA', 'LumB', 'Her2', 'luminal', 'nonbasal')
+
+# the subtype indices loaded by this process
+_SUBTYPE_INDICES = dict()
+
+
+def _get_stamp(type_file):
+    type_stat = os.stat(type_file)
+
+    return type_stat.st_size, type_stat.st_mtime_ns
+
+
+def parse_tcga_subtypes(type_file):
+    """Finds the samples of each subtype in the PCAWG subtype listing."""
+    type_data = pd.read_csv(type_file, sep='\t', index_col=0, comment='#')
+
+    return {(coh, subt): np.array(samps, dtype=object)
+            for (coh, subt), samps in type_data.groupby(
+                ['DISEASE', 'SUBTYPE']).groups.items()}
+
+
+def parse_metabric_subtypes(type_file):
+    """Finds the samples of each subtype in the METABRIC clinical data."""
+    samp_data = load_metabric_samps(os.path.dirname(type_file))
+
+    return {('METABRIC', subt): np.array(
+        sorted(choose_metabric_subtypes(samp_data, subt)), dtype=object)
+        for subt in METABRIC_SUBTYPES}
+
+
+# how the subtypes are parsed from each kind of source
+SUBTYPE_PARSERS = {'TCGA': parse_tcga_subtypes,
+                   'METABRIC': parse_metabric_subtypes}
+
+
+def load_subtype_index(type_file, source='TCGA'):
+    """Gets the samples in each subtype found in a source of subtypes.
+
+    Args:
+        type_file (str)
+            The PCAWG subtype listing, or METABRIC's clinical sample table.
+        source (str, optional)
+            Which of the kinds of sources in `SUBTYPE_PARSERS` it is.
+
+    Returns:
+        type_index (dict): The samples in each (cohort, subtype) pair.
+
+    """
+    type_file = os.path.abspath(type_file)
+    type_stamp = _get_stamp(type_file)
+
+    if (type_file not in _SUBTYPE_INDICES
+            or _SUBTYPE_INDICES[type_file]['Stamp'] != type_stamp):
+        indx_path = "{}.subtype-index.p".format(type_file)
+
+        try:
+            with open(indx_path, 'rb') as f:
+                type_entry = pickle.load(f)
+
+        except (IOError, EOFError):
+            type_entry = None
+
+        if type_entry is None or type_entry['Stamp'] != type_stamp:
+            type_entry = {'Stamp': type_stamp,
+                          'Index': SUBTYPE_PARSERS[source](type_file)}
+
+            # the source's directory may not be writable by every user, in
+            # which case the index is only kept for the rest of this process
+            try:
+                tmp_path = "{}.{}.tmp".format(indx_path, os.getpid())
+
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(type_entry, f, protocol=-1)
+                os.replace(tmp_path, indx_path)
+
+            except OSError:
+                pass
+
+        _SUBTYPE_INDICES[type_file] = type_entry
+
+    return _SUBTYPE_INDICES[type_file]['Index']
+
+
+def get_subtype_samples(cohort, use_types, type_file, source='TCGA'):
+    """Finds the samples of a cohort belonging to any of the given subtypes.
+
+    Args:
+        cohort (str): A cohort such as 'BRCA' or 'METABRIC'.
+        use_types (:obj:`iterable` of :obj:`str`)
+        type_file (str): The source of subtypes; see `load_subtype_index`.
+        source (str, optional)
+
+    Returns:
+        use_samps (set)
+
+    """
+    type_index = load_subtype_index(type_file, source)
+    use_samps = set()
+
+    for subt in use_types:
+        if (cohort, subt) in type_index:
+            use_samps |= set(type_index[cohort, subt])
+
+    return use_samps
+
+
+def list_subtypes(cohort, type_file, source='TCGA'):
+    """Gets the samples in each of the subtypes of a cohort."""
+    return {subt: samps
+            for (coh, subt), samps in load_subtype_index(
+                type_file, source).items()
+            if coh == cohort}
@@ -1,6 +1,10 @@
 
 from ..data.expression import get_expr_firehose, get_expr_bmeg, get_expr_toil
 from ..data.copies import get_copies_firehose
+from ..data.mc3_store import MC3_FIELDS, load_store_variants, read_maf
+from ..data.gencode import get_gene_annot
+from ..data.utils import trim_barcodes
+from .subtypes import get_subtype_samples
 from .mut_freq import BaseMutFreqCohort
 
 from dryadic.features.cohorts.mut import (
@@ -13,7 +17,6 @@ import pandas as pd
 
 import os
 from functools import reduce
-from re import sub as gsub
 import synapseclient
 from operator import and_
 from itertools import cycle, combinations
@@ -50,10 +53,7 @@ def parse_subtypes(cohort):
 
 
 def choose_subtypes(use_types, base_coh, type_file):
-    type_data = pd.read_csv(type_file, sep='\t', index_col=0, comment='#')
-    type_data = type_data[type_data.DISEASE == base_coh]
-
-    return set(type_data.index[type_data.SUBTYPE.isin(use_types)])
+    return get_subtype_samples(base_coh, use_types, type_file)
 
 
 def get_expr_data(cohort, expr_source, **expr_args):
@@ -84,55 +84,36 @@ def get_variant_data(cohort, var_source, **var_args):
     if var_source == 'mc3':
         mc3 = var_args['syn'].get('syn7824274')
 
-        field_dict = (
-            ('Gene', 0), ('Chr', 4), ('Start', 5), ('End', 6), ('Strand', 7),
-            ('Form', 8), ('RefAllele', 10), ('TumorAllele', 12),
-            ('Sample', 15), ('HGVS', 34), ('Protein', 36), ('Transcript', 37),
-            ('Exon', 38), ('depth', 39), ('ref_count', 40), ('alt_count', 41),
-            ('SIFT', 71), ('PolyPhen', 72), ('Filter', 108)
-            )
-
         if 'mut_fields' not in var_args or var_args['mut_fields'] is None:
-            use_fields, use_cols = tuple(zip(*field_dict))
+            use_fields = [name for name, _ in MC3_FIELDS]
 
         else:
-            use_fields, use_cols = tuple(zip(*[
-                (name, col) for name, col in field_dict
+            use_fields = [
+                name for name, _ in MC3_FIELDS
                 if name in {'Sample', 'Filter'} | set(var_args['mut_fields'])
-                ]))
+                ]
+
+        # loads only the samples and genes needed from the partitioned copy
+        # of the mutation data if one has been made, see `.mc3_store`
+        var_data = load_store_variants(mc3.path,
+                                       samples=var_args.get('samples'),
+                                       genes=var_args.get('genes'),
+                                       fields=use_fields)
 
-        # imports mutation data into a DataFrame, parses TCGA sample barcodes
-        # and PolyPhen scores
+        # ...otherwise imports all of the mutation data, parsing TCGA sample
+        # barcodes and PolyPhen scores
         i = 0
-        while i < 10:
+        while var_data is None and i < 10:
             #TODO: handle I/O errors on the cohort/experiment level?
             try:
-                var_data = pd.read_csv(mc3.path, engine='c', dtype='object',
-                                       sep='\t', header=None,
-                                       usecols=use_cols, names=use_fields,
-                                       comment='#', skiprows=1)
-                break
+                var_data = read_maf(mc3.path, use_fields)
+
+                #TODO: more fine-grained Filtering control?
+                var_data = var_data.loc[~var_data.Filter.str.contains(
+                    'nonpreferredpair')]
 
             except OSError:
                 i = i + 1
-
-        #TODO: more fine-grained Filtering control?
-        var_data = var_data.loc[~var_data.Filter.str.contains(
-            'nonpreferredpair')]
-
-        for annt, null_val in zip(['PolyPhen', 'SIFT'], [0, 1]):
-            if annt in var_data:
-                var_data[annt] = var_data[annt].apply(
-                    lambda val: (np.float(gsub('\)$', '',
-                                               gsub('^.*\(', '', val)))
-                                 if val != '.' else null_val)
-                    )
-
-                if annt == 'SIFT':
-                    var_data[annt] = 1 - var_data[annt]
-
-        var_data.Sample = var_data.Sample.apply(
-            lambda smp: '-'.join(smp.split('-')[:4]))
     
     elif var_source == 'Firehose':
         mut_tar = tarfile.open(glob.glob(os.path.join(
@@ -155,8 +136,7 @@ def get_variant_data(cohort, var_source, **var_args):
                 print("Skipping mutations for {}".format(mut_fl))
             
         muts = pd.concat(mut_list)
-        muts.Sample = muts.Sample.apply(
-            lambda smp: "-".join(smp.split("-")[:4]))
+        muts.Sample = trim_barcodes(muts.Sample)
         mut_tar.close()
 
     elif var_source == 'BMEG':
@@ -203,7 +183,10 @@ def add_mutations(cohort, var_source, copy_source, expr, gene_annot,
                                   Default is to only use point mutations.
 
     """
-    var_data = get_variant_data(cohort, var_source, **mut_args)
+    # variant calls are loaded for all genes so that samples whose calls all
+    # fall outside of the annotated genes are still matched to the cohort
+    var_data = get_variant_data(cohort, var_source, samples=expr.index,
+                                **mut_args)
 
     # load copy number alteration data from the given source
     if copy_source == 'Firehose':
@@ -217,31 +200,34 @@ def add_mutations(cohort, var_source, copy_source, expr, gene_annot,
     else:
         raise ValueError("Unrecognized source of copy number data!")
 
-    copy_df = pd.DataFrame(copy_data.stack()).reset_index()
-    copy_df.columns = ['Sample', 'Gene', 'Copy']
-
     expr_match, var_match, copy_match = match_tcga_samples(
-        expr.index, var_data.Sample.values, copy_df.Sample.values)
+        expr.index, var_data.Sample.unique(), copy_data.index.values)
 
     new_expr = expr.loc[
-        expr.index.isin(expr_match),
-        expr.columns.get_level_values('Gene').isin(gene_annot)
+        expr.index.isin(list(expr_match)),
+        expr.columns.get_level_values('Gene').isin(list(gene_annot))
         ]
-    new_expr.index = [expr_match[old_samp] for old_samp in new_expr.index]
-
-    new_vars = var_data[var_data.isin({
-        'Sample': var_match.keys(), 'Gene': gene_annot.keys()}).loc[
-            :, ['Gene', 'Sample']].all(axis=1)].copy()
-    new_vars.Sample = new_vars.Sample.apply(lambda samp: var_match[samp])
- 
-    new_copy = copy_df.loc[(copy_df.Copy != 0)
-                           & copy_df.Sample.isin(copy_match)
-                           & copy_df.Gene.isin(gene_annot)
-                           , :].copy()
-
-    new_copy.Sample = new_copy.Sample.apply(lambda samp: copy_match[samp])
-    new_copy.Copy = new_copy.Copy.map({-2: 'DeepDel', -1: 'ShalDel',
-                                       1: 'ShalGain', 2: 'DeepGain'})
+    new_expr.index = new_expr.index.map(expr_match)
+
+    new_vars = var_data.loc[var_data.Sample.isin(list(var_match))
+                            & var_data.Gene.isin(list(gene_annot))].copy()
+    new_vars.Sample = new_vars.Sample.map(var_match)
+
+    # only the altered genes of the matched samples are put in long format,
+    # which skips over the zeros making up most of the copy number calls
+    copy_data = copy_data.loc[copy_data.index.isin(list(copy_match)),
+                              copy_data.columns.isin(list(gene_annot))]
+    copy_vals = copy_data.values
+    samp_indx, gene_indx = np.nonzero(pd.notnull(copy_vals)
+                                      & (copy_vals != 0))
+
+    new_copy = pd.DataFrame({
+        'Sample': copy_data.index.map(copy_match).values[samp_indx],
+        'Gene': copy_data.columns.values[gene_indx],
+        'Copy': pd.Series(copy_vals[samp_indx, gene_indx]).map(
+            {-2: 'DeepDel', -1: 'ShalDel', 1: 'ShalGain', 2: 'DeepGain'}
+            ).values
+        }, columns=['Sample', 'Gene', 'Copy'])
 
     return new_expr, new_vars, new_copy
 
@@ -286,17 +272,11 @@ def process_input_datasets(cohort, expr_source, var_source, copy_source,
     expr = drop_duplicate_genes(get_expr_data(base_coh, expr_source,
                                               **data_args))
 
-    annot_file = os.path.join(annot_dir, "gencode.v19.annotation.gtf.gz")
-    if 'annot_fields' in data_args:
-        annot_data = get_gencode(annot_file, data_args['annot_fields'])
-    else:
-        annot_data = get_gencode(annot_file)
-
     # restructure annotation data around expression gene labels
-    use_genes = set(expr.columns.get_level_values('Gene'))
-    annot_dict = {at['gene_name']: {**{'Ens': ens}, **at}
-                  for ens, at in annot_data.items()
-                  if at['gene_name'] in use_genes}
+    annot_file = os.path.join(annot_dir, "gencode.v19.annotation.gtf.gz")
+    annot_dict = get_gene_annot(annot_file,
+                                expr.columns.get_level_values('Gene'),
+                                data_args.get('annot_fields'))
 
     expr, variants, copy_df = add_mutations(base_coh, var_source, copy_source,
                                             expr, annot_dict, **data_args)
@@ -386,14 +366,10 @@ class CopyCohort(BaseCopyCohort):
         # load expression and gene annotation datasets
         expr = drop_duplicate_genes(get_expr_data(cohort, expr_source,
                                                   **coh_args))
-        annot_data = get_gencode(annot_file, annot_fields)
 
         # restructure annotation data around expression gene labels
-        self.gene_annot = {
-            at['gene_name']: {**{'Ens': ens}, **at}
-            for ens, at in annot_data.items()
-            if at['gene_name'] in set(expr.columns.get_level_values('Gene'))
-            }
+        self.gene_annot = get_gene_annot(
+            annot_file, expr.columns.get_level_values('Gene'), annot_fields)
 
         if copy_source == 'Firehose':
             if 'copy_dir' not in coh_args:
@@ -478,14 +454,8 @@ class MutFreqCohort(BaseMutFreqCohort):
         self.cohort = cohort
 
         expr = get_expr_data(cohort, expr_source, **coh_args)
-        if 'annot_fields' in coh_args:
-            annot_data = get_gencode(annot_file, coh_args['annot_fields'])
-        else:
-            annot_data = get_gencode(annot_file)
-
-        self.gene_annot = {at['gene_name']: {**{'Ens': ens}, **at}
-                           for ens, at in get_gencode().items()
-                           if at['gene_name'] in expr.columns}
+        self.gene_annot = get_gene_annot(annot_file, expr.columns,
+                                         coh_args.get('annot_fields'))
 
         expr, variants = add_mutations(cohort, var_source, copy_source,
                                        expr, self.gene_annot, **coh_args)
@@ -623,18 +593,12 @@ class TransferMutationCohort(BaseTransferMutationCohort):
                                                             **coh_args))
                     for coh, expr_src in zip(cohorts, cycle(expr_sources))}
 
-        if 'annot_fields' in coh_args:
-            annot_data = get_gencode(annot_file, coh_args['annot_fields'])
-        else:
-            annot_data = get_gencode(annot_file)
-
-        self.gene_annot = {
-            at['gene_name']: {**{'Ens': ens}, **at}
-            for ens, at in annot_data.items()
-            if at['gene_name'] in reduce(
-                and_, [expr.columns.get_level_values('Gene')
-                       for expr in expr_raw.values()])
-            }
+        self.gene_annot = get_gene_annot(
+            annot_file,
+            reduce(and_, [set(expr.columns.get_level_values('Gene'))
+                          for expr in expr_raw.values()]),
+            coh_args.get('annot_fields')
+            )
 
         expr_dict = {cohort: None for cohort in cohorts}
         var_dict = {cohort: None for cohort in cohorts}
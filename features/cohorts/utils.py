@@ -2,7 +2,7 @@
 
 from ...experiments.utilities.data_dirs import (
     firehose_dir, syn_root, metabric_dir, baml_dir, ccle_dir,
-    gencode_dir, subtype_file, expr_sources
+    gencode_dir, subtype_file, expr_sources, cohort_cache_dir
     )
 
 from .beatAML import process_input_datasets as process_baml_datasets
@@ -12,12 +12,12 @@ from .tcga import choose_subtypes as choose_tcga_subtypes
 from .tcga import parse_subtypes as parse_tcga_subtypes
 
 from .metabric import process_input_datasets as process_metabric_datasets
-from .metabric import choose_subtypes as choose_metabric_subtypes
-from .metabric import list_subtypes as list_metabric_subtypes
-from .metabric import load_metabric_samps
 from .ccle import process_input_datasets as process_ccle_datasets
+from .subtypes import get_subtype_samples, list_subtypes
+from .cache import (get_vep_version, get_input_stamp, get_cache_key,
+                    load_cached_cohort, store_cached_cohort)
 
-from dryadic.features.data.vep import process_variants
+from ..data.vep_cache import annotate_variants
 from dryadic.features.cohorts.mut import BaseMutationCohort
 
 import os
@@ -255,9 +255,9 @@ def get_cohort_data(cohort, expr_source, mut_lvls, vep_cache_dir, out_path,
         raise TypeError(
             "Unrecognized <mut_lvls> argument: `{}`!".format(mut_lvls))
 
-    # run the VEP command line wrapper to obtain a standardized
-    # set of point mutation calls
-    variants = process_variants(
+    # run the VEP command line wrapper to obtain a standardized set of point
+    # mutation calls, reusing the annotations of variants seen in past runs
+    variants = annotate_variants(
         var_df, out_fields=var_fields, cache_dir=vep_cache_dir,
         temp_dir=out_path, assembly=data_dict['assembly'],
         distance=0, consequence_choose='pick', forks=4, update_cache=False
@@ -290,6 +290,83 @@ def get_cohort_data(cohort, expr_source, mut_lvls, vep_cache_dir, out_path,
                               data_dict['annot'], leaf_annot=None)
 
 
+def get_input_paths(cohort, expr_source):
+    """Finds the local files and directories a cohort's data is read from.
+
+    Datasets downloaded through Synapse (e.g. the MC3 variant calls) are
+    not included, as these are already pinned to fixed Synapse versions.
+
+    """
+    if cohort == 'beatAML':
+        input_paths = [baml_dir, gencode_dir]
+    elif cohort.split('_')[0] == 'METABRIC':
+        input_paths = [metabric_dir, gencode_dir]
+    elif cohort.split('_')[0] == 'CCLE':
+        input_paths = [ccle_dir, gencode_dir]
+
+    else:
+        input_paths = [expr_sources[expr_source.split('__')[0]],
+                       expr_sources['Firehose'], gencode_dir, subtype_file]
+
+    return input_paths
+
+
+def get_cached_cohort(cohort, expr_source, mut_lvls, vep_cache_dir, out_path,
+                      use_genes=None, use_copies=True, leaf_annot=None,
+                      cache_dir=cohort_cache_dir):
+    """Retrieves a cohort from the shared cache, building it if necessary.
+
+    See :func:`get_cohort_data` for most of the arguments. The cohort is
+    looked up using a hash of these arguments as well as of the state of the
+    input datasets and of the version of VEP, and is added to the cache if
+    it is not already there.
+
+    Args:
+        cache_dir (str, optional)
+            Where the cohort cache is located. The cache is not used if this
+            is None, which is the default when no cache has been configured.
+
+    Returns:
+        cdata (BaseMutationCohort)
+
+    """
+    if cache_dir is None:
+        return get_cohort_data(cohort, expr_source, mut_lvls, vep_cache_dir,
+                               out_path, use_genes, use_copies, leaf_annot)
+
+    # makes sure equivalent arguments given in different forms are hashed
+    # to the same cache entry
+    if isinstance(mut_lvls[0], str):
+        key_lvls = [mut_lvls]
+    else:
+        key_lvls = mut_lvls
+
+    if use_genes is not None:
+        use_genes = sorted(set(use_genes))
+    if leaf_annot is not None:
+        leaf_annot = list(leaf_annot)
+
+    cache_key = get_cache_key(
+        cohort=cohort, expr_source=expr_source,
+        mut_lvls=[tuple(lvls) for lvls in key_lvls],
+        use_genes=use_genes, use_copies=use_copies, leaf_annot=leaf_annot,
+        inputs=get_input_stamp(get_input_paths(cohort, expr_source),
+                               name_filter=cohort.split('_')[0]),
+        vep=get_vep_version(vep_cache_dir)
+        )
+
+    cdata = load_cached_cohort(cache_dir, cache_key)
+    if cdata is None:
+        cdata = get_cohort_data(cohort, expr_source, mut_lvls, vep_cache_dir,
+                                out_path, use_genes, use_copies, leaf_annot)
+
+        store_cached_cohort(cache_dir, cache_key, cdata,
+                            {'Cohort': cohort, 'Source': expr_source,
+                             'Levels': mut_lvls})
+
+    return cdata
+
+
 def load_cohort(cohort, expr_source, mut_lvls, vep_cache_dir, use_path=None,
                 temp_path=None, use_genes=None, leaf_annot=None):
     """Load a saved cohort object from file; create a new one if necessary."""
@@ -303,21 +380,21 @@ def load_cohort(cohort, expr_source, mut_lvls, vep_cache_dir, use_path=None,
                 cdata = pickle.load(f)
 
         except IOError:
-            cdata = get_cohort_data(cohort, expr_source, mut_lvls,
-                                    vep_cache_dir, temp_path, use_genes,
-                                    leaf_annot=leaf_annot)
+            cdata = get_cached_cohort(cohort, expr_source, mut_lvls,
+                                      vep_cache_dir, temp_path, use_genes,
+                                      leaf_annot=leaf_annot)
 
     else:
-        cdata = get_cohort_data(cohort, expr_source, mut_lvls,
-                                vep_cache_dir, temp_path, use_genes,
-                                leaf_annot=leaf_annot)
+        cdata = get_cached_cohort(cohort, expr_source, mut_lvls,
+                                  vep_cache_dir, temp_path, use_genes,
+                                  leaf_annot=leaf_annot)
 
     if cohort != 'CCLE' and not all(any(mtree_lvls[-(len(lvls)):] == lvls
                                         for mtree_lvls in cdata.mtrees)
                                     for lvls in mut_lvls):
-        cdata.merge(get_cohort_data(cohort, expr_source, mut_lvls,
-                                    vep_cache_dir, temp_path, use_genes,
-                                    leaf_annot=leaf_annot))
+        cdata.merge(get_cached_cohort(cohort, expr_source, mut_lvls,
+                                      vep_cache_dir, temp_path, use_genes,
+                                      leaf_annot=leaf_annot))
 
     return cdata
 
@@ -326,8 +403,9 @@ def get_cohort_subtypes(coh):
     """Gets the cohort samples associated with known molecular subtypes."""
 
     if coh == 'METABRIC':
-        metabric_samps = load_metabric_samps(metabric_dir)
-        subt_dict = {subt: choose_metabric_subtypes(metabric_samps, subt)
+        type_file = os.path.join(metabric_dir, "data_clinical_sample.txt")
+        subt_dict = {subt: get_subtype_samples(coh, [subt], type_file,
+                                               source='METABRIC')
                      for subt in ('LumA', 'luminal', 'nonbasal')}
 
     elif coh in tcga_subtypes:
@@ -346,16 +424,17 @@ def get_cohort_subtypes(coh):
 # TODO: consolidate this with the above function?
 def list_cohort_subtypes(coh):
     if coh == 'METABRIC':
-         type_dict = list_metabric_subtypes(load_metabric_samps(metabric_dir))
+        type_file = os.path.join(metabric_dir, "data_clinical_sample.txt")
+        type_dict = {subt: samps
+                     for subt, samps in list_subtypes(
+                         coh, type_file, source='METABRIC').items()
+                     if subt in {'Basal', 'LumA', 'LumB', 'Her2'}}
 
     elif coh == 'beatAML':
         type_dict = {}
 
     else:
-        tcga_types = pd.read_csv(subtype_file,
-                                 sep='\t', index_col=0, comment='#')
-        tcga_types = tcga_types.loc[tcga_types.DISEASE == coh]
-        type_dict = tcga_types.groupby('SUBTYPE').groups
+        type_dict = list_subtypes(coh, subtype_file)
 
     return type_dict
 
@@ -8,21 +8,21 @@ Author: Michal Grzadkowski <grzadkow@ohsu.edu>
 
 """
 
+from .utils import trim_barcodes
+from .firehose_cache import find_tarball, get_cache_dir, load_tables
 import pandas as pd
 
-import os
-import glob
 
-import tarfile
-from io import BytesIO
-
-
-def get_copies_firehose(cohort, data_dir, discrete=True, normalize=False):
+def get_copies_firehose(cohort, data_dir, discrete=True, normalize=False,
+                        cache_dir=None):
     """Loads gene-level copy number alteration data downloaded from Firehose.
 
     Args:
         cohort (str): A TCGA cohort available in Broad Firehose.
         data_dir (str): A local directory where the data has been downloaded.
+        cache_dir (str, optional)
+            Where the tables of Firehose tarballs are cached, see
+            `.firehose_cache`. Default is to use the data directory's cache.
 
     Returns:
         copy_data (pandas DataFrame), shape = [n_samps, n_genes]
@@ -33,54 +33,31 @@ def get_copies_firehose(cohort, data_dir, discrete=True, normalize=False):
         >>> copy_data = get_copies_firehose('STAD', '../input-data')
 
     """
-    copy_tars = glob.glob(os.path.join(
-        data_dir, "analyses__2016_01_28", cohort, "20160128",
-        "*CopyNumber_Gistic2.Level_4.*tar.gz"
-        ))
-
-    if len(copy_tars) > 1:
-        raise IOError("Multiple GISTIC copy number tarballs found "
-                      "for cohort {} in directory {} !".format(
-                          cohort, data_dir))
-
-    if len(copy_tars) == 0:
-        raise IOError("No normalized GISTIC copy number tarballs found "
-                      "for cohort {} in directory {} !".format(
-                          cohort, data_dir))
+    copy_tar = find_tarball(cohort, data_dir, 'copy')
+    if cache_dir is None:
+        cache_dir = get_cache_dir(data_dir)
 
     if discrete:
-        fl_name = "all_thresholded.by_genes.txt"
+        gene_tbl = 'gene_thresholded'
     else:
-        fl_name = "all_data_by_genes.txt"
+        gene_tbl = 'gene_data'
 
-    copy_tar = tarfile.open(copy_tars[0])
-    gene_indx = [i for i, memb in enumerate(copy_tar.getmembers())
-                 if fl_name in memb.get_info()['name']]
-
-    # ensures only one file in the tarball contains CNA data
-    if len(gene_indx) == 0:
-        raise IOError("No thresholded CNA files found in the tarball!")
-    elif len(gene_indx) > 1:
-        raise IOError("Multiple thresholded CNA files found in the tarball!")
+    use_tbls = [gene_tbl, 'lesions']
+    if normalize:
+        use_tbls += ['sample_cutoffs']
+    if not discrete:
+        use_tbls += ['arm_data']
 
-    gene_fl = copy_tar.extractfile(copy_tar.getmembers()[gene_indx[0]])
-    gene_data = pd.read_csv(BytesIO(gene_fl.read()),
-                            sep='\t', index_col=0, engine='python')
+    # reads all of the tables needed from the tarball at once
+    tbl_dict = load_tables(copy_tar, use_tbls, cache_dir)
 
-    gene_data = gene_data.iloc[:, 2:].transpose()
-    gene_data.index = ['-'.join(smp[:4])
-                       for smp in gene_data.index.str.split('-')]
+    gene_data = tbl_dict[gene_tbl].transpose()
+    gene_data.index = trim_barcodes(gene_data.index)
     gene_data.columns.name = None
 
     if normalize:
-        ctf_indx = [i for i, memb in enumerate(copy_tar.getmembers())
-                    if 'sample_cutoffs.txt' in memb.get_info()['name']]
-        ctf_fl = copy_tar.extractfile(copy_tar.getmembers()[ctf_indx[0]])
-
-        ctf_data = pd.read_csv(BytesIO(ctf_fl.read()), sep='\t',
-                               index_col=0, comment='#', engine='python')
-        ctf_data.index = ["-".join(smp[:4])
-                          for smp in ctf_data.index.str.split('-')]
+        ctf_data = tbl_dict['sample_cutoffs']
+        ctf_data.index = trim_barcodes(ctf_data.index)
 
         for smp in set(gene_data.index) & set(ctf_data.index):
             smp_vals = gene_data.loc[smp] 
@@ -88,12 +65,45 @@ def get_copies_firehose(cohort, data_dir, discrete=True, normalize=False):
             smp_vals[smp_vals > 0] /= ctf_data.loc[smp, 'High']
             gene_data.loc[smp] = smp_vals.round(3)
 
-    regn_indx = [i for i, memb in enumerate(copy_tar.getmembers())
-                 if "all_lesions.conf_" in memb.get_info()['name']]
-    regn_fl = copy_tar.extractfile(copy_tar.getmembers()[regn_indx[0]])
+    regn_mat, carm_data = process_regions(
+        tbl_dict['lesions'], tbl_dict.get('arm_data'), discrete)
 
-    regn_data = pd.read_csv(BytesIO(regn_fl.read()),
-                            sep='\t', index_col=0, engine='python')
+    return pd.concat([gene_data, regn_mat.T, carm_data.T],
+                     axis=1, join='inner')
+
+
+def get_regions_firehose(cohort, data_dir, discrete=True, cache_dir=None):
+    """Loads the GISTIC lesion and chromosome arm alterations of a cohort.
+
+    Args:
+        cohort (str): A TCGA cohort available in Broad Firehose.
+        data_dir (str): A local directory where the data has been downloaded.
+        cache_dir (str, optional)
+            Where the tables of Firehose tarballs are cached, see
+            `.firehose_cache`. Default is to use the data directory's cache.
+
+    Returns:
+        regn_mat (pandas DataFrame), shape = [n_lesions, n_samps]
+        carm_data (pandas DataFrame), shape = [n_arms, n_samps]
+            Empty unless continuous copy number values are loaded.
+
+    """
+    copy_tar = find_tarball(cohort, data_dir, 'copy')
+    if cache_dir is None:
+        cache_dir = get_cache_dir(data_dir)
+
+    use_tbls = ['lesions']
+    if not discrete:
+        use_tbls += ['arm_data']
+
+    tbl_dict = load_tables(copy_tar, use_tbls, cache_dir)
+
+    return process_regions(tbl_dict['lesions'], tbl_dict.get('arm_data'),
+                           discrete)
+
+
+def process_regions(regn_data, carm_data, discrete=True):
+    """Processes the GISTIC lesion and arm tables found in a tarball."""
     regn_data.Descriptor = regn_data.Descriptor.str.replace("\s+$", "")
     contn_indx = regn_data.index.str.match(".* - CN values$")
     regn_mat = regn_data.iloc[contn_indx ^ discrete, 8:-1]
@@ -107,29 +117,19 @@ def get_copies_firehose(cohort, data_dir, discrete=True, normalize=False):
         del_indx = regn_mat.index.str.match(".*\(Del\)$")
         regn_mat.loc[del_indx] *= -1
 
-    regn_mat.columns = ['-'.join(smp[:4])
-                        for smp in regn_mat.columns.str.split('-')]
+    regn_mat.columns = trim_barcodes(regn_mat.columns)
     regn_mat.index.name = None
 
     if discrete:
         carm_data = pd.DataFrame(columns=regn_mat.columns)
 
     else:
-        carm_indx = [i for i, memb in enumerate(copy_tar.getmembers())
-                     if "broad_values_by_arm.txt" in memb.get_info()['name']]
-        carm_fl = copy_tar.extractfile(copy_tar.getmembers()[carm_indx[0]])
-        carm_data = pd.read_csv(BytesIO(carm_fl.read()),
-                                sep='\t', index_col=0, engine='python')
-
         carm_data = carm_data.loc[carm_data.index.str.match("[0-9]+[p|q]")]
-        carm_data.columns = ['-'.join(smp[:4])
-                             for smp in carm_data.columns.str.split('-')]
+        carm_data.columns = trim_barcodes(carm_data.columns)
 
     carm_data.index.name = None
-    copy_tar.close()
 
-    return pd.concat([gene_data, regn_mat.T, carm_data.T],
-                     axis=1, join='inner')
+    return regn_mat, carm_data
 
 
 def get_copies_bmeg(cohort, gene_list):
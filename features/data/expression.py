@@ -8,15 +8,12 @@ Author: Michal Grzadkowski <grzadkow@ohsu.edu>
 
 """
 
-from .utils import choose_bmeg_server
+from .utils import choose_bmeg_server, trim_barcodes
+from .firehose_cache import find_tarball, get_cache_dir, load_tables
 import numpy as np
 import pandas as pd
 
 import os
-import glob
-
-import tarfile
-from io import BytesIO
 
 
 def get_expr_bmeg(cohort):
@@ -50,13 +47,16 @@ def get_expr_bmeg(cohort):
     return pd.DataFrame(data).transpose().fillna(0.0)
 
 
-def get_expr_firehose(cohort, data_dir):
+def get_expr_firehose(cohort, data_dir, cache_dir=None):
     """Loads RNA-seq gene-level expression data downloaded from Firehose.
 
     Args:
         cohort (str): The name of a TCGA cohort available in Broad Firehose.
         data_dir (str): The local directory where the Firehose data was
                         downloaded.
+        cache_dir (str, optional)
+            Where the tables of Firehose tarballs are cached, see
+            `.firehose_cache`. Default is to use the data directory's cache.
 
     Returns:
         expr_data (:obj:`pd.DataFrame`, shape = [n_samps, n_genes])
@@ -68,49 +68,21 @@ def get_expr_firehose(cohort, data_dir):
 
     """
 
-    # finds the tarballs containing expression data for the given cohort in
-    # the given data directory
-    expr_tars = glob.glob(os.path.join(
-        data_dir, "stddata__*", cohort, "*",
-        ("*.Merge_rnaseqv2__illuminahiseq_rnaseqv2__unc_edu__Level_3__"
-         "RSEM_genes_normalized__data.Level_3.*.tar.gz")
-        ))
-
-    # ensures only one tarball matches the file name pattern
-    if len(expr_tars) > 1:
-        raise IOError("Multiple normalized gene expression tarballs found "
-                      "for cohort {} in directory {} !".format(
-                          cohort, data_dir))
-
-    elif len(expr_tars) == 0:
-        raise IOError("No normalized gene expression tarballs found "
-                      "for cohort {} in directory {} !".format(
-                          cohort, data_dir))
-
-    # opens the tarball and locates the expression data within it
-    expr_tar = tarfile.open(expr_tars[0])
-    expr_indx = [i for i, memb in enumerate(expr_tar.getmembers())
-                 if 'data.txt' in memb.get_info()['name']]
-  
-    # ensures only one file in the tarball contains expression data
-    if len(expr_indx) == 0:
-        raise IOError("No expression files found in the tarball!")
-    elif len(expr_indx) > 1:
-        raise IOError("Multiple expression files found in the tarball!")
-
-    expr_fl = expr_tar.extractfile(expr_tar.getmembers()[expr_indx[0]])
-    expr_data = pd.read_csv(BytesIO(expr_fl.read()),
-                            sep='\t', skiprows=[1], index_col=0,
-                            engine='python').transpose()
-    expr_tar.close()
+    # finds the tarball containing expression data for the given cohort in
+    # the given data directory, and reads the expression data within it
+    expr_tar = find_tarball(cohort, data_dir, 'expr')
+    if cache_dir is None:
+        cache_dir = get_cache_dir(data_dir)
+
+    expr_data = load_tables(expr_tar, ['expr_data'],
+                            cache_dir)['expr_data'].transpose()
 
     expr_data.columns = [gn.split('|')[0] if isinstance(gn, str) else gn
                          for gn in expr_data.columns]
     expr_data.columns.name = 'Gene'
 
     expr_data = expr_data.iloc[:, expr_data.columns != '?']
-    expr_data.index = ["-".join(x[:4])
-                       for x in expr_data.index.str.split('-')]
+    expr_data.index = trim_barcodes(expr_data.index)
 
     return expr_data
 
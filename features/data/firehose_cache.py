@@ -0,0 +1,322 @@
+"""Storing the tables parsed from Firehose tarballs in a binary format.
+
+Loading a TCGA cohort's expression or copy number calls from Firehose means
+decompressing the cohort's tarballs and parsing the text files within them,
+which takes minutes for the larger cohorts and is repeated for every cohort
+each time transfer cohorts are set up. The tables read from each tarball can
+thus be ingested once into a cache directory, with numeric matrices stored as
+uncompressed arrays of the dtype they were parsed as, so that they are loaded
+with exactly the same values as when they are read from the tarball, and the
+smaller GISTIC tables stored as pickled data frames. Each cache entry records
+the size, modification time, and checksum of the tarball it was made from,
+and is only used by the loaders in `.expression` and `.copies` while the
+tarball hasn't changed.
+
+Example usages:
+    python -m dryads-research.features.data.firehose_cache \
+        /home/users/timmy/input-data/firehose
+    python -m dryads-research.features.data.firehose_cache \
+        /home/users/timmy/input-data/firehose --cohorts BRCA STAD
+
+"""
+
+import os
+import argparse
+import glob
+import hashlib
+import tarfile
+import dill as pickle
+
+import numpy as np
+import pandas as pd
+
+
+# where each kind of Firehose tarball is found for a cohort, and what kind of
+# data it holds
+FIREHOSE_TARBALLS = {
+    'expr': (os.path.join(
+        "stddata__*", "{cohort}", "*",
+        ("*.Merge_rnaseqv2__illuminahiseq_rnaseqv2__unc_edu__Level_3__"
+         "RSEM_genes_normalized__data.Level_3.*.tar.gz")
+        ), "normalized gene expression"),
+
+    'copy': (os.path.join("analyses__2016_01_28", "{cohort}", "20160128",
+                          "*CopyNumber_Gistic2.Level_4.*tar.gz"),
+             "GISTIC copy number"),
+    }
+
+# the tables parsed from the tarballs: the kind of tarball each one is found
+# in, the name of the file it is parsed from, any further arguments used to
+# parse it, and the first of its columns that form a numeric matrix, or None
+# if the table is instead stored as a data frame
+FIREHOSE_TABLES = {
+    'expr_data': ('expr', "data.txt", {'skiprows': [1]}, 0),
+    'gene_thresholded': ('copy', "all_thresholded.by_genes.txt", {}, 2),
+    'gene_data': ('copy', "all_data_by_genes.txt", {}, 2),
+    'sample_cutoffs': ('copy', "sample_cutoffs.txt", {'comment': '#'}, None),
+    'lesions': ('copy', "all_lesions.conf_", {}, None),
+    'arm_data': ('copy', "broad_values_by_arm.txt", {}, None),
+    }
+
+# the version of the cache entries' layout; entries made with an earlier
+# version, such as those that stored matrices as float32, are ingested again
+CACHE_FORMAT = 2
+
+
+def get_cache_dir(data_dir):
+    """Finds where the tables of a Firehose download are cached by default."""
+    return os.path.join(data_dir, "binary-cache")
+
+
+def find_tarball(cohort, data_dir, tar_kind):
+    """Finds the Firehose tarball of a given kind for a cohort.
+
+    Args:
+        cohort (str): A TCGA cohort available in Broad Firehose.
+        data_dir (str): A local directory where the data has been downloaded.
+        tar_kind (str): One of the kinds of tarballs in `FIREHOSE_TARBALLS`.
+
+    """
+    tar_pattern, tar_desc = FIREHOSE_TARBALLS[tar_kind]
+    tar_files = glob.glob(os.path.join(data_dir,
+                                       tar_pattern.format(cohort=cohort)))
+
+    # ensures only one tarball matches the file name pattern
+    if len(tar_files) > 1:
+        raise IOError("Multiple {} tarballs found for cohort {} in "
+                      "directory {} !".format(tar_desc, cohort, data_dir))
+
+    elif len(tar_files) == 0:
+        raise IOError("No {} tarballs found for cohort {} in "
+                      "directory {} !".format(tar_desc, cohort, data_dir))
+
+    return tar_files[0]
+
+
+def _get_entry_dir(tar_path, cache_dir):
+    return os.path.join(cache_dir,
+                        os.path.basename(tar_path).split('.tar.gz')[0])
+
+
+def _get_stamp(tar_path):
+    tar_stat = os.stat(tar_path)
+
+    return tar_stat.st_size, tar_stat.st_mtime_ns
+
+
+def get_checksum(tar_path):
+    """Finds the SHA-256 checksum of a tarball's contents."""
+    tar_hash = hashlib.sha256()
+
+    with open(tar_path, 'rb') as f:
+        for tar_chunk in iter(lambda: f.read(2 ** 20), b''):
+            tar_hash.update(tar_chunk)
+
+    return tar_hash.hexdigest()
+
+
+def _read_entry(entry_dir):
+    try:
+        with open(os.path.join(entry_dir, "entry.p"), 'rb') as f:
+            entry = pickle.load(f)
+
+    except (IOError, EOFError):
+        entry = None
+
+    return entry
+
+
+def _is_current(entry, tar_stamp):
+    return (entry is not None and entry.get('Format') == CACHE_FORMAT
+            and entry['Stamp'] == tar_stamp)
+
+
+def _parse_tables(tar_path, tables):
+    tbl_dict = dict()
+
+    with tarfile.open(tar_path) as tar_fl:
+        tar_membs = tar_fl.getmembers()
+
+        for tbl in tables:
+            _, tbl_name, read_args, _ = FIREHOSE_TABLES[tbl]
+            tbl_membs = [memb for memb in tar_membs if tbl_name in memb.name]
+
+            # ensures only one file in the tarball contains the table
+            if len(tbl_membs) == 0:
+                raise IOError("No `{}` files found in the tarball!".format(
+                    tbl_name))
+            elif len(tbl_membs) > 1:
+                raise IOError("Multiple `{}` files found in the "
+                              "tarball!".format(tbl_name))
+
+            tbl_dict[tbl] = pd.read_csv(tar_fl.extractfile(tbl_membs[0]),
+                                        sep='\t', index_col=0,
+                                        engine='python', **read_args)
+
+    return tbl_dict
+
+
+def load_tables(tar_path, tables, cache_dir=None):
+    """Gets tables from a Firehose tarball, using the cache where possible.
+
+    Args:
+        tar_path (str): A Firehose tarball.
+        tables (:obj:`iterable` of :obj:`str`)
+            Tables from `FIREHOSE_TABLES` found in the tarball.
+        cache_dir (str, optional)
+            Where tables are cached. Tables are read from the tarball if this
+            is not given, or if their cache entry is missing or out of date.
+
+    Returns:
+        tbl_dict (dict): Each table, with any leading columns of its numeric
+                         matrix dropped.
+
+    """
+    tbl_dict = dict()
+    tables = list(tables)
+
+    if cache_dir is not None:
+        entry_dir = _get_entry_dir(tar_path, cache_dir)
+        entry = _read_entry(entry_dir)
+
+        if _is_current(entry, _get_stamp(tar_path)):
+            for tbl in tables:
+                if tbl in entry['Tables']:
+                    tbl_info = entry['Tables'][tbl]
+
+                    if isinstance(tbl_info, pd.DataFrame):
+                        tbl_dict[tbl] = tbl_info
+
+                    else:
+                        tbl_vals = np.load(
+                            os.path.join(entry_dir, "{}.npy".format(tbl)))
+
+                        tbl_dict[tbl] = pd.DataFrame(
+                            tbl_vals, index=tbl_info['Index'],
+                            columns=tbl_info['Columns']
+                            )
+
+    new_tbls = [tbl for tbl in tables if tbl not in tbl_dict]
+    if new_tbls:
+        for tbl, tbl_data in _parse_tables(tar_path, new_tbls).items():
+            data_start = FIREHOSE_TABLES[tbl][3]
+
+            if data_start is None:
+                tbl_dict[tbl] = tbl_data
+            else:
+                tbl_dict[tbl] = tbl_data.iloc[:, data_start:]
+
+    return tbl_dict
+
+
+def ingest_tarball(tar_path, tar_kind, cache_dir):
+    """Stores the tables found in a Firehose tarball in the cache.
+
+    Args:
+        tar_path (str): A Firehose tarball.
+        tar_kind (str): Which of the kinds in `FIREHOSE_TARBALLS` it is.
+        cache_dir (str): Where tables are cached.
+
+    Returns:
+        ingested (bool): Whether the tarball's tables had to be parsed, as
+                         opposed to being found in an up-to-date entry.
+
+    """
+    entry_dir = _get_entry_dir(tar_path, cache_dir)
+    entry = _read_entry(entry_dir)
+    tar_stamp = _get_stamp(tar_path)
+
+    if _is_current(entry, tar_stamp):
+        return False
+
+    # tarballs that were downloaded again without changing only need to
+    # have their entry's stamp updated
+    tar_checksum = get_checksum(tar_path)
+    ingested = (entry is None or entry.get('Format') != CACHE_FORMAT
+                or entry['Checksum'] != tar_checksum)
+
+    if ingested:
+        os.makedirs(entry_dir, exist_ok=True)
+        if entry is not None:
+            os.remove(os.path.join(entry_dir, "entry.p"))
+
+        with tarfile.open(tar_path) as tar_fl:
+            tar_names = [memb.name for memb in tar_fl.getmembers()]
+
+        tbl_list = [tbl for tbl, (kind, tbl_name, _, _)
+                    in FIREHOSE_TABLES.items()
+                    if kind == tar_kind and any(tbl_name in name
+                                                for name in tar_names)]
+
+        entry = {'Tables': dict()}
+        for tbl, tbl_data in _parse_tables(tar_path, tbl_list).items():
+            data_start = FIREHOSE_TABLES[tbl][3]
+
+            if data_start is None:
+                entry['Tables'][tbl] = tbl_data
+
+            else:
+                tbl_data = tbl_data.iloc[:, data_start:]
+                tbl_dtype = np.result_type(*tbl_data.dtypes)
+                tbl_path = os.path.join(entry_dir, "{}.npy".format(tbl))
+                tmp_path = "{}.{}.tmp".format(tbl_path, os.getpid())
+
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, tbl_data.values.astype(tbl_dtype))
+                os.replace(tmp_path, tbl_path)
+
+                entry['Tables'][tbl] = {
+                    'Index': tbl_data.index, 'Columns': tbl_data.columns,
+                    'Dtype': tbl_dtype
+                    }
+
+    entry.update({'Format': CACHE_FORMAT, 'Source': tar_path,
+                  'Stamp': tar_stamp, 'Checksum': tar_checksum})
+
+    # the entry is written last so that it only refers to finished tables
+    entry_path = os.path.join(entry_dir, "entry.p")
+    tmp_path = "{}.{}.tmp".format(entry_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(entry, f, protocol=-1)
+    os.replace(tmp_path, entry_path)
+
+    return ingested
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        'firehose_cache',
+        description="Caches the tables of downloaded Firehose tarballs."
+        )
+
+    parser.add_argument('data_dir', type=str,
+                        help="where the Firehose data has been downloaded")
+    parser.add_argument('--cohorts', type=str, nargs='+',
+                        help="which cohorts to cache; default is all of "
+                             "the cohorts that have been downloaded")
+
+    args = parser.parse_args()
+    cache_dir = get_cache_dir(args.data_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    for tar_kind, (tar_pattern, _) in sorted(FIREHOSE_TARBALLS.items()):
+        if args.cohorts is None:
+            tar_files = sorted(glob.glob(os.path.join(
+                args.data_dir, tar_pattern.format(cohort='*'))))
+
+        else:
+            tar_files = []
+
+            for coh in args.cohorts:
+                try:
+                    tar_files += [find_tarball(coh, args.data_dir, tar_kind)]
+                except IOError as err:
+                    print(err)
+
+        for tar_path in tar_files:
+            if ingest_tarball(tar_path, tar_kind, cache_dir):
+                print("Cached {}".format(os.path.basename(tar_path)))
+
+
+if __name__ == '__main__':
+    main()
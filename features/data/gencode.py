@@ -0,0 +1,198 @@
+"""Caching the gene annotations parsed from GENCODE GTFs.
+
+Every cohort loader needs the annotation of the genes in its expression data,
+which was found by parsing the whole of the gzipped GENCODE GTF each time a
+cohort was built; setting up transfer cohorts thus parsed the same GTF dozens
+of times. The annotation parsed from a GTF for a given set of fields is
+instead kept as a table of Ensembl genes, held by each process once it is
+loaded and saved next to the GTF under the GTF's checksum so that later
+processes can read it back without parsing. Loaders then get the annotation
+of their genes by matching them against the table's columns.
+
+Example usage:
+    python -m dryads-research.features.data.gencode \
+        /home/users/timmy/input-data/gencode.v19.annotation.gtf.gz \
+        --annot_fields transcript exon
+
+"""
+
+from dryadic.features.cohorts.utils import get_gencode
+
+import os
+import argparse
+import hashlib
+import pickle as std_pickle
+import dill as pickle
+
+import pandas as pd
+
+
+# the annotation tables loaded by this process, and the checksums of the
+# GTFs they were parsed from
+_ANNOT_TABLES = dict()
+_GTF_CHECKSUMS = dict()
+
+
+def get_cache_dir(annot_file):
+    """Finds where the annotation parsed from a GTF is cached by default."""
+    return os.path.join(os.path.dirname(annot_file), "gencode-cache")
+
+
+def get_checksum(annot_file):
+    """Finds the SHA-256 checksum of a GTF's contents."""
+    gtf_stat = os.stat(annot_file)
+    gtf_stamp = (os.path.abspath(annot_file),
+                 gtf_stat.st_size, gtf_stat.st_mtime_ns)
+
+    if gtf_stamp not in _GTF_CHECKSUMS:
+        gtf_hash = hashlib.sha256()
+
+        with open(annot_file, 'rb') as f:
+            for gtf_chunk in iter(lambda: f.read(2 ** 20), b''):
+                gtf_hash.update(gtf_chunk)
+
+        _GTF_CHECKSUMS[gtf_stamp] = gtf_hash.hexdigest()
+
+    return _GTF_CHECKSUMS[gtf_stamp]
+
+
+def _get_fields_lbl(annot_fields):
+    if annot_fields is None:
+        fields_lbl = 'default'
+    else:
+        fields_lbl = '+'.join(sorted(annot_fields))
+
+    return fields_lbl
+
+
+def load_annot_table(annot_file, annot_fields=None, cache_dir=None):
+    """Gets the annotation parsed from a GTF, using the cache where possible.
+
+    Args:
+        annot_file (str): A GENCODE GTF.
+        annot_fields (:obj:`list` of :obj:`str`, optional)
+            Which fields to parse for each gene, as given to `get_gencode`;
+            default is to use the fields it parses by default.
+        cache_dir (str, optional)
+            Where annotation is cached, if not in the default location.
+
+    Returns:
+        annot_tbl (pd.DataFrame)
+            The name and the parsed annotation of each gene, indexed by
+            Ensembl ID in the order the genes appear in the GTF.
+
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir(annot_file)
+
+    gtf_checksum = get_checksum(annot_file)
+    fields_lbl = _get_fields_lbl(annot_fields)
+    annot_key = gtf_checksum, fields_lbl
+
+    if annot_key not in _ANNOT_TABLES:
+        annot_path = os.path.join(cache_dir, "{}__{}.p".format(
+            gtf_checksum[:16], fields_lbl))
+
+        try:
+            with open(annot_path, 'rb') as f:
+                annot_tbl = pickle.load(f)
+
+        except (IOError, EOFError, std_pickle.UnpicklingError):
+            annot_tbl = None
+
+        if annot_tbl is None:
+            if annot_fields is None:
+                annot_data = get_gencode(annot_file)
+            else:
+                annot_data = get_gencode(annot_file, annot_fields)
+
+            annot_tbl = pd.DataFrame(
+                {'gene_name': [at['gene_name'] for at in annot_data.values()],
+                 'Annot': list(annot_data.values())},
+                index=pd.Index(list(annot_data), name='Ens'),
+                columns=['gene_name', 'Annot']
+                )
+
+            # the GTF's directory may not be writable by every user, in which
+            # case the annotation is only kept for the rest of this process
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = "{}.{}.tmp".format(annot_path, os.getpid())
+
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(annot_tbl, f, protocol=-1)
+                os.replace(tmp_path, annot_path)
+
+            except OSError:
+                pass
+
+        _ANNOT_TABLES[annot_key] = annot_tbl
+
+    return _ANNOT_TABLES[annot_key]
+
+
+def get_gene_annot(annot_file, genes=None, annot_fields=None, by_ens=False,
+                   cache_dir=None):
+    """Gets the annotation of a set of genes, keyed by gene name.
+
+    Args:
+        annot_file (str): A GENCODE GTF.
+        genes (:obj:`iterable` of :obj:`str`, optional)
+            Which genes to get the annotation of; default is to get the
+            annotation of all the genes in the GTF.
+        annot_fields (:obj:`list` of :obj:`str`, optional)
+            Which fields to parse for each gene; see `load_annot_table`.
+        by_ens (bool, optional)
+            Whether `genes` are given as Ensembl IDs instead of gene names.
+        cache_dir (str, optional)
+            Where annotation is cached, if not in the default location.
+
+    Returns:
+        gene_annot (dict): The parsed annotation of each gene, along with
+                           its Ensembl ID under `Ens`.
+
+    """
+    annot_tbl = load_annot_table(annot_file, annot_fields, cache_dir)
+
+    if genes is not None:
+        if by_ens:
+            match_vals = annot_tbl.index
+        else:
+            match_vals = annot_tbl.gene_name
+
+        annot_tbl = annot_tbl.loc[match_vals.isin(list(set(genes)))]
+
+    # the last of the Ensembl genes sharing a name is used, as would be the
+    # case when building the annotation dictionary one gene at a time
+    annot_tbl = annot_tbl.loc[~annot_tbl.gene_name.duplicated(keep='last')]
+
+    return dict(zip(annot_tbl.gene_name.values,
+                    [{**{'Ens': ens}, **at}
+                     for ens, at in zip(annot_tbl.index,
+                                        annot_tbl.Annot.values)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        'gencode',
+        description="Caches the gene annotation parsed from a GENCODE GTF."
+        )
+
+    parser.add_argument('annot_file', type=str,
+                        help="a GENCODE GTF such as gencode.v19")
+    parser.add_argument('--annot_fields', type=str, nargs='+',
+                        help="which fields to parse for each gene; default "
+                             "is to use the fields parsed by default")
+    parser.add_argument('--cache_dir', type=str,
+                        help="where to save the annotation; default is to "
+                             "save it next to the GTF, where loaders look "
+                             "for it")
+
+    args = parser.parse_args()
+    annot_tbl = load_annot_table(args.annot_file, args.annot_fields,
+                                 args.cache_dir)
+    print("Cached the annotation of {} genes".format(annot_tbl.shape[0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""Storing the MC3 variant calls in partitions that can be loaded separately.
+
+The MC3 MAF holds the variant calls of every TCGA cohort in one text file of
+several gigabytes, which had to be read in full and have its annotations
+parsed each time any one cohort was loaded. The calls can thus be ingested
+once into a store with a partition for each tissue source site, which is
+given by the prefix of a sample's TCGA barcode such as `TCGA-A1`. Within a
+partition, calls are sorted by gene so that each gene's calls are found
+through their range of rows. Numeric fields are stored as typed arrays with
+PolyPhen and SIFT scores already parsed, and the remaining fields are stored
+as codes into each partition's labels. Loading the calls of a cohort then
+only reads the partitions of its samples, the rows of the genes asked for,
+and the fields asked for.
+
+Example usage:
+    python -m dryads-research.features.data.mc3_store \
+        /home/users/timmy/synapse/123/456/mc3.v0.2.8.PUBLIC.maf.gz
+
+"""
+
+import os
+import argparse
+import dill as pickle
+
+import numpy as np
+import pandas as pd
+
+from .utils import trim_barcodes
+
+
+# the MAF columns of the fields that can be loaded for each variant call
+MC3_FIELDS = (
+    ('Gene', 0), ('Chr', 4), ('Start', 5), ('End', 6), ('Strand', 7),
+    ('Form', 8), ('RefAllele', 10), ('TumorAllele', 12),
+    ('Sample', 15), ('HGVS', 34), ('Protein', 36), ('Transcript', 37),
+    ('Exon', 38), ('depth', 39), ('ref_count', 40), ('alt_count', 41),
+    ('SIFT', 71), ('PolyPhen', 72), ('Filter', 108)
+    )
+
+# the fields whose values are numbers rather than labels
+NUMERIC_FIELDS = {'Start', 'End', 'depth', 'ref_count', 'alt_count',
+                  'SIFT', 'PolyPhen'}
+
+
+def get_store_dir(maf_path):
+    """Finds where the store made from an MC3 MAF is kept by default."""
+    return os.path.join(os.path.dirname(maf_path), "mc3-store")
+
+
+def _get_stamp(maf_path):
+    maf_stat = os.stat(maf_path)
+
+    return os.path.basename(maf_path), maf_stat.st_size, maf_stat.st_mtime_ns
+
+
+def get_sample_prefix(samps):
+    """Finds the tissue source site partition each TCGA sample belongs to."""
+    return trim_barcodes(samps, barcode_parts=2)
+
+
+def parse_scores(annt_vals, null_val):
+    """Gets the numeric scores within PolyPhen or SIFT annotations."""
+    annt_scores = pd.to_numeric(annt_vals.str.replace(
+        r'^.*\(', '', regex=True).str.replace(r'\)$', '', regex=True),
+        errors='coerce')
+
+    return annt_scores.where(annt_vals != '.', null_val)
+
+
+def read_maf(maf_path, fields=None):
+    """Reads and parses the fields of the variant calls in a MAF.
+
+    Args:
+        maf_path (str): An MC3 MAF.
+        fields (:obj:`iterable` of :obj:`str`, optional)
+            Which of the fields in `MC3_FIELDS` to read; default is to read
+            all of them.
+
+    Returns:
+        var_data (pd.DataFrame)
+
+    """
+    if fields is None:
+        use_fields, use_cols = tuple(zip(*MC3_FIELDS))
+    else:
+        use_fields, use_cols = tuple(zip(*[(fld, col)
+                                           for fld, col in MC3_FIELDS
+                                           if fld in set(fields)]))
+
+    # labels are read as categories, which take up far less memory while the
+    # file is being parsed than strings do
+    var_data = pd.read_csv(
+        maf_path, engine='c', sep='\t', header=None, comment='#', skiprows=1,
+        usecols=use_cols, names=use_fields,
+        dtype={fld: ('category' if fld not in NUMERIC_FIELDS else 'object')
+               for fld in use_fields}
+        )
+
+    for fld in use_fields:
+        if fld in {'PolyPhen', 'SIFT'}:
+            var_data[fld] = parse_scores(var_data[fld],
+                                         null_val=int(fld == 'SIFT'))
+
+            if fld == 'SIFT':
+                var_data[fld] = 1 - var_data[fld]
+
+        elif fld in NUMERIC_FIELDS:
+            var_data[fld] = pd.to_numeric(var_data[fld])
+
+        elif fld == 'Sample':
+            var_data[fld] = trim_barcodes(var_data[fld].astype(str))
+
+        else:
+            var_data[fld] = var_data[fld].astype(object)
+
+    return var_data
+
+
+def write_store(maf_path, store_dir=None):
+    """Ingests the variant calls of an MC3 MAF into a partitioned store."""
+    if store_dir is None:
+        store_dir = get_store_dir(maf_path)
+
+    os.makedirs(store_dir, exist_ok=True)
+    var_data = read_maf(maf_path)
+
+    var_data['Prefix'] = get_sample_prefix(var_data.Sample)
+    var_data = var_data.sort_values(['Prefix', 'Gene'], kind='mergesort')
+    store_index = {'Source': _get_stamp(maf_path), 'Partitions': dict()}
+
+    for prfx, prfx_data in var_data.groupby('Prefix', sort=False):
+        prfx_arrs = dict()
+
+        for fld, _ in MC3_FIELDS:
+            if fld in NUMERIC_FIELDS:
+                prfx_arrs[fld] = prfx_data[fld].values
+
+            else:
+                fld_codes, fld_lbls = pd.factorize(
+                    prfx_data[fld].astype(object))
+
+                prfx_arrs[fld] = fld_codes.astype(np.int32)
+                prfx_arrs['{}__labels'.format(fld)] = np.array(fld_lbls,
+                                                               dtype=str)
+
+        prfx_path = os.path.join(store_dir, "{}.npz".format(prfx))
+        tmp_path = "{}.{}.tmp".format(prfx_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **prfx_arrs)
+        os.replace(tmp_path, prfx_path)
+
+        # finds the range of rows holding the calls of each gene
+        gene_vals = prfx_data.Gene.astype(str).values
+        gene_bounds = np.flatnonzero(gene_vals[1:] != gene_vals[:-1]) + 1
+        gene_starts = np.concatenate([[0], gene_bounds])
+        gene_stops = np.concatenate([gene_bounds, [len(gene_vals)]])
+
+        store_index['Partitions'][prfx] = {
+            gene_vals[start]: (start, stop)
+            for start, stop in zip(gene_starts, gene_stops)
+            }
+
+    # the index is written last so that it only refers to finished partitions
+    indx_path = os.path.join(store_dir, "index.p")
+    tmp_path = "{}.{}.tmp".format(indx_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(store_index, f, protocol=-1)
+    os.replace(tmp_path, indx_path)
+
+
+def load_store_variants(maf_path, samples=None, genes=None, fields=None,
+                        drop_nonpreferred=True, store_dir=None):
+    """Loads variant calls from the store made from an MC3 MAF.
+
+    Args:
+        maf_path (str): The MAF the store was made from.
+        samples (:obj:`iterable` of :obj:`str`, optional)
+            TCGA barcodes; only the partitions these samples belong to are
+            loaded. Default is to load all of the partitions.
+        genes (:obj:`iterable` of :obj:`str`, optional)
+            Which genes to load calls for. Default is to load all genes.
+        fields (:obj:`iterable` of :obj:`str`, optional)
+            Which of the fields in `MC3_FIELDS` to load, along with the
+            sample and filter of each call. Default is to load all fields.
+        drop_nonpreferred (bool, optional)
+            Whether to remove calls made using non-preferred pairs of tumour
+            and normal samples, as is done by default.
+        store_dir (str, optional)
+            Where the store is located, if not in the default location.
+
+    Returns:
+        var_data (pd.DataFrame)
+            The variant calls, or None if no store was made from the MAF in
+            its current state.
+
+    """
+    if store_dir is None:
+        store_dir = get_store_dir(maf_path)
+
+    try:
+        with open(os.path.join(store_dir, "index.p"), 'rb') as f:
+            store_index = pickle.load(f)
+
+    except (IOError, EOFError):
+        return None
+
+    if store_index['Source'] != _get_stamp(maf_path):
+        return None
+
+    if fields is None:
+        use_fields = [fld for fld, _ in MC3_FIELDS]
+    else:
+        use_fields = [fld for fld, _ in MC3_FIELDS
+                      if fld in {'Sample', 'Filter'} | set(fields)]
+
+    if samples is None:
+        use_prfxs = sorted(store_index['Partitions'])
+    else:
+        use_prfxs = sorted(set(get_sample_prefix(samples))
+                           & set(store_index['Partitions']))
+
+    prfx_list = []
+    for prfx in use_prfxs:
+        gene_rows = store_index['Partitions'][prfx]
+
+        if genes is None:
+            use_rows = slice(None)
+
+        else:
+            gene_ranges = [np.arange(*gene_rows[gene])
+                           for gene in sorted(set(genes) & set(gene_rows))]
+
+            if not gene_ranges:
+                continue
+            use_rows = np.concatenate(gene_ranges)
+
+        prfx_arrs = np.load(os.path.join(store_dir, "{}.npz".format(prfx)))
+        prfx_data = dict()
+
+        for fld in use_fields:
+            if fld in NUMERIC_FIELDS:
+                prfx_data[fld] = prfx_arrs[fld][use_rows]
+
+            # missing labels have a code of -1, and thus map to the NaN that
+            # is appended to the partition's labels
+            else:
+                fld_lbls = np.append(
+                    prfx_arrs['{}__labels'.format(fld)].astype(object),
+                    np.nan
+                    )
+                prfx_data[fld] = fld_lbls[prfx_arrs[fld][use_rows]]
+
+        prfx_list += [pd.DataFrame(prfx_data, columns=use_fields)]
+
+    if prfx_list:
+        var_data = pd.concat(prfx_list, ignore_index=True, sort=False)
+    else:
+        var_data = pd.DataFrame(columns=use_fields)
+
+    if drop_nonpreferred:
+        var_data = var_data.loc[~var_data.Filter.astype(str).str.contains(
+            'nonpreferredpair')]
+
+    return var_data.reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        'mc3_store',
+        description="Ingests the MC3 variant calls into a partitioned store."
+        )
+
+    parser.add_argument('maf_path', type=str,
+                        help="the MC3 MAF downloaded from Synapse")
+    parser.add_argument('--store_dir', type=str,
+                        help="where to save the store; default is to save "
+                             "it next to the MAF, where loaders look for it")
+
+    args = parser.parse_args()
+    write_store(args.maf_path, args.store_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,7 @@
+import numpy as np
+import pandas as pd
+
+
 
 def choose_bmeg_server(server_list=('http://bmeg.compbio.ohsu.edu',
                                     'http://bmeg.io'),
@@ -45,3 +49,27 @@ def choose_bmeg_server(server_list=('http://bmeg.compbio.ohsu.edu',
         raise RuntimeError("No BMEG server available!")
 
     return bmeg_server
+
+
+def trim_barcodes(samps, barcode_parts=4):
+    """Shortens TCGA barcodes to their leading fields.
+
+    Barcodes such as `TCGA-A1-A0SB-01A-11R-A144-07` are cut down to their
+    first few dash-separated fields, with each distinct barcode only being
+    processed once no matter how many times it appears.
+
+    Args:
+        samps (:obj:`iterable` of :obj:`str`)
+        barcode_parts (int, optional)
+            How many fields to keep; default is to keep those identifying
+            the sample, e.g. `TCGA-A1-A0SB-01A`.
+
+    Returns:
+        trim_samps (np.array): The shortened barcodes, in the given order.
+
+    """
+    samp_codes, samp_lbls = pd.factorize(np.asarray(samps, dtype=object))
+    trim_lbls = pd.Index(samp_lbls, dtype=object).str.split('-').str[
+        :barcode_parts].str.join('-')
+
+    return np.asarray(trim_lbls, dtype=object)[samp_codes]
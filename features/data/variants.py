@@ -13,7 +13,9 @@ Author: Michal Grzadkowski <grzadkow@ohsu.edu>
 
 """
 
-import numpy as np
+from .utils import trim_barcodes
+from .mc3_store import load_store_variants, read_maf
+
 import pandas as pd
 
 import tarfile
@@ -23,7 +25,6 @@ import glob
 from io import BytesIO
 import json
 
-from re import sub as gsub
 from functools import reduce
 
 
@@ -47,34 +48,26 @@ def get_variants_mc3(syn):
 
     """
     mc3 = syn.get('syn7824274')
-
-    # defines which mutation annotation MAF columns to use
-    use_cols = [0, 8, 15, 36, 37, 38, 39, 40, 41, 71, 72]
     use_names = ['Gene', 'Form', 'Sample', 'Protein', 'Transcript', 'Exon',
                  'depth', 'ref_count', 'alt_count', 'SIFT', 'PolyPhen']
 
-    # imports mutation data into a DataFrame, parses TCGA sample barcodes
-    # and PolyPhen scores
+    # uses the partitioned copy of the mutation data if one has been made,
+    # see `.mc3_store`
+    muts = load_store_variants(mc3.path, fields=use_names,
+                               drop_nonpreferred=False)
+    if muts is not None:
+        muts = muts.drop(columns='Filter')
+
+    # ...otherwise imports mutation data into a DataFrame, parses TCGA sample
+    # barcodes and PolyPhen scores
     i = 0
-    while i < 10:
+    while muts is None and i < 10:
         try:
-            muts = pd.read_csv(mc3.path, engine='python',
-                               usecols=use_cols, sep='\t', header=None,
-                               names=use_names, comment='#', skiprows=1)
-            break
+            muts = read_maf(mc3.path, use_names)
 
         except OSError:
             i = i + 1
 
-    for annt, null_val in zip(['PolyPhen', 'SIFT'], [0, 1]):
-        muts[annt] = muts[annt].apply(
-            lambda val: (np.float(gsub('\)$', '', gsub('^.*\(', '', val)))
-                         if val != '.' else null_val)
-            )
-
-    muts.Sample = muts.Sample.apply(lambda smp: '-'.join(smp.split('-')[:4]))
-    muts.SIFT = 1 - muts.SIFT
-
     return muts
 
 
@@ -110,7 +103,7 @@ def get_variants_firehose(cohort, data_dir):
             print("Skipping mutations for {}".format(mut_fl))
         
     muts = pd.concat(mut_list)
-    muts.Sample = muts.Sample.apply(lambda smp: "-".join(smp.split("-")[:4]))
+    muts.Sample = trim_barcodes(muts.Sample)
     mut_tar.close()
 
     return mut_data
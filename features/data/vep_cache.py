@@ -0,0 +1,254 @@
+"""Storing the annotations VEP produces for each variant across runs.
+
+Variant calls change little between the runs of an experiment and overlap
+heavily across the combinations of mutation attributes used, but annotating
+them with VEP is the slowest step of setting up a cohort. The annotations
+are thus stored in a SQLite database keyed by each variant's location and
+alleles, the genome assembly, and the list of VEP annotation fields
+requested, so that only variants not seen before with the same fields are
+sent to VEP. Annotations found using different lists of fields are kept
+apart, as the columns and the rows VEP output depend on all of the fields
+asked for at once. The store is cleared whenever the version of VEP or of
+its genome cache changes, or when VEP is run with different options.
+
+See Also:
+    :module:`..cohorts.utils`: Where cohorts' variants are annotated.
+
+"""
+
+from ..cohorts.cache import get_vep_version
+from dryadic.features.data.vep import process_variants
+
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+
+# the columns of a variant table identifying each unique variant
+VAR_COLS = ['Chr', 'Start', 'End', 'RefAllele', 'VarAllele']
+
+# the tables making up the store
+STORE_TABLES = ['variants', 'field_sets', 'set_cols', 'set_vars',
+                'set_annots']
+
+
+def _connect_store(store_path, vep_version):
+    conn = sqlite3.connect(store_path, timeout=600)
+
+    with conn:
+        conn.executescript("""
+            DROP TABLE IF EXISTS fields;
+            DROP TABLE IF EXISTS field_cols;
+            DROP TABLE IF EXISTS annots;
+
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY, value TEXT);
+
+            CREATE TABLE IF NOT EXISTS variants (
+                var_id INTEGER PRIMARY KEY, assembly TEXT, chrom INTEGER,
+                pos_start INTEGER, pos_end INTEGER,
+                ref_allele TEXT, var_allele TEXT,
+                UNIQUE (assembly, chrom, pos_start, pos_end,
+                        ref_allele, var_allele)
+                );
+
+            CREATE TABLE IF NOT EXISTS field_sets (
+                set_id INTEGER PRIMARY KEY, fields TEXT UNIQUE);
+            CREATE TABLE IF NOT EXISTS set_cols (
+                set_id INTEGER, pos INTEGER, col TEXT,
+                PRIMARY KEY (set_id, col)
+                );
+            CREATE TABLE IF NOT EXISTS set_vars (
+                set_id INTEGER, var_id INTEGER, PRIMARY KEY (set_id, var_id));
+
+            CREATE TABLE IF NOT EXISTS set_annots (
+                set_id INTEGER, var_id INTEGER, row INTEGER, col TEXT, value,
+                PRIMARY KEY (set_id, var_id, row, col)
+                );
+            """)
+
+        # annotations made using another version of VEP are discarded
+        store_version = conn.execute(
+            "SELECT value FROM meta WHERE key = 'vep'").fetchone()
+
+        if store_version is None or store_version[0] != vep_version:
+            for tbl in STORE_TABLES:
+                conn.execute("DELETE FROM {}".format(tbl))
+
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('vep', ?)",
+                         (vep_version, ))
+
+    return conn
+
+
+def _to_sql(val):
+    if isinstance(val, np.generic):
+        val = val.item()
+
+    if isinstance(val, float) and np.isnan(val):
+        val = None
+
+    return val
+
+
+def annotate_variants(var_df, out_fields, cache_dir, temp_dir, assembly,
+                      store_path=None, **vep_args):
+    """Annotates variants with VEP, reusing previously stored annotations.
+
+    Args:
+        var_df (pd.DataFrame)
+            Variant calls with the `VAR_COLS` columns along with the sample
+            each variant was found in, as passed to `process_variants`.
+        out_fields (:obj:`iterable` of :obj:`str`)
+            The VEP annotation fields to get for each variant.
+        cache_dir (str): Where VEP is storing genome assembly datasets.
+        temp_dir (str): Where to store intermediate VEP output files.
+        assembly (str): The genome assembly the variants were called on.
+        store_path (str, optional)
+            The database storing the annotations. Default is to use a file in
+            the VEP cache directory.
+        **vep_args: Other arguments passed on to `process_variants`.
+
+    Returns:
+        variants (pd.DataFrame)
+            The annotations of each variant, with a row for each variant
+            appearing in an individual sample as in `process_variants`.
+
+    Raises:
+        ValueError: If any of the variants are missing their chromosome or
+                    their start or end position.
+
+    """
+    if store_path is None:
+        store_path = os.path.join(cache_dir, "variant-annots.db")
+
+    # annotations also depend on the VEP options that affect its output
+    vep_opts = sorted((k, v) for k, v in vep_args.items()
+                      if k not in {'forks', 'update_cache'})
+    conn = _connect_store(store_path,
+                          repr((get_vep_version(cache_dir), vep_opts)))
+
+    # variants can only be matched to their stored annotations using their
+    # location, and missing alleles are given VEP's notation for no allele
+    if var_df[VAR_COLS[:3]].isnull().values.any():
+        raise ValueError("Variants must have a chromosome as well as start "
+                         "and end positions to be annotated!")
+
+    var_df = var_df.copy()
+    for col in VAR_COLS[3:]:
+        if var_df[col].isnull().any():
+            var_df[col] = var_df[col].astype(object).fillna('-')
+
+    out_fields = list(out_fields)
+    uniq_vars = var_df[VAR_COLS].drop_duplicates()
+
+    # finds the ID of each unique variant, adding to the store the variants
+    # that haven't been seen before
+    with conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS req_vars "
+                     "(chrom, pos_start, pos_end, ref_allele, var_allele)")
+        conn.execute("DELETE FROM req_vars")
+
+        conn.executemany("INSERT INTO req_vars VALUES (?, ?, ?, ?, ?)",
+                         [tuple(_to_sql(val) for val in var_vals)
+                          for var_vals in uniq_vars.itertuples(index=False)])
+        conn.execute(
+            "INSERT OR IGNORE INTO variants (assembly, chrom, pos_start, "
+            "pos_end, ref_allele, var_allele) SELECT ?, * FROM req_vars",
+            (assembly, )
+            )
+
+    var_ids = pd.read_sql_query(
+        "SELECT v.var_id, r.* FROM req_vars r JOIN variants v "
+        "ON v.assembly = ? AND v.chrom = r.chrom "
+        "AND v.pos_start = r.pos_start AND v.pos_end = r.pos_end "
+        "AND v.ref_allele = r.ref_allele AND v.var_allele = r.var_allele",
+        conn, params=(assembly, )
+        )
+    var_ids.columns = ['var_id'] + VAR_COLS
+
+    with conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS req_ids "
+                     "(var_id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM req_ids")
+        conn.executemany("INSERT INTO req_ids VALUES (?)",
+                         [(int(var_id), ) for var_id in var_ids.var_id])
+
+    # finds the ID of the list of fields requested, and which variants still
+    # need to be annotated using these fields
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO field_sets (fields) VALUES (?)",
+                     ('\t'.join(out_fields), ))
+
+    set_id = conn.execute("SELECT set_id FROM field_sets WHERE fields = ?",
+                          ('\t'.join(out_fields), )).fetchone()[0]
+    done_ids = pd.read_sql_query(
+        "SELECT s.var_id FROM set_vars s JOIN req_ids r "
+        "ON s.var_id = r.var_id WHERE s.set_id = ?",
+        conn, params=(set_id, )
+        ).var_id
+
+    new_ids = var_ids.var_id[~var_ids.var_id.isin(done_ids)]
+
+    # only the variants missing from the store are sent to VEP
+    if len(new_ids) > 0:
+        new_vars = var_ids.loc[var_ids.var_id.isin(new_ids)]
+
+        # each variant is annotated once, using its ID in place of a sample
+        vep_out = process_variants(
+            new_vars[VAR_COLS].assign(
+                Sample=["var{}".format(var_id)
+                        for var_id in new_vars.var_id]
+                ),
+            out_fields=out_fields, cache_dir=cache_dir, temp_dir=temp_dir,
+            assembly=assembly, **vep_args
+            )
+
+        annot_cols = [col for col in vep_out.columns if col != 'Sample']
+        vep_ids = vep_out.Sample.str.slice(3).astype(int).values
+        vep_rows = vep_out.groupby('Sample').cumcount().values
+
+        with conn:
+            set_cols = [col for col, in conn.execute(
+                "SELECT col FROM set_cols WHERE set_id = ?", (set_id, ))]
+
+            conn.executemany(
+                "INSERT OR IGNORE INTO set_cols VALUES (?, ?, ?)",
+                [(set_id, len(set_cols) + i, col) for i, col in enumerate(
+                    col for col in annot_cols if col not in set_cols)]
+                )
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO set_annots VALUES (?, ?, ?, ?, ?)",
+                [(set_id, int(var_id), int(row), col, _to_sql(val))
+                 for col in annot_cols
+                 for var_id, row, val in zip(vep_ids, vep_rows,
+                                             vep_out[col].values)]
+                )
+
+            conn.executemany("INSERT OR IGNORE INTO set_vars VALUES (?, ?)",
+                             [(set_id, int(var_id)) for var_id in new_ids])
+
+    # reads the annotations of the requested variants from the store
+    use_cols = [col for col, in conn.execute(
+        "SELECT col FROM set_cols WHERE set_id = ? ORDER BY pos",
+        (set_id, )
+        )]
+
+    annot_df = pd.read_sql_query(
+        "SELECT a.var_id, a.row, a.col, a.value FROM set_annots a "
+        "JOIN req_ids r ON a.var_id = r.var_id WHERE a.set_id = ?",
+        conn, params=(set_id, )
+        )
+    conn.close()
+
+    annot_df = annot_df.set_index(['var_id', 'row', 'col']).value.unstack(
+        'col').reindex(columns=use_cols).infer_objects().reset_index()
+
+    # variants that VEP could not annotate are dropped, as they are by VEP
+    variants = var_df.merge(var_ids, on=VAR_COLS)[['Sample', 'var_id']]
+    variants = variants.merge(annot_df, on='var_id', how='inner')
+
+    return variants.drop(columns=['var_id', 'row']).reset_index(drop=True)